@@ -0,0 +1,58 @@
+"""
+Compare the rows per second of fetching a large result row by row with read_sql and in bulk with COPY, against the
+configured warehouse.
+
+Run from the repository root:
+
+    python -m src.benchmarks.bulk_fetch --query "SELECT * FROM fct_collaboration"
+"""
+import argparse
+import time
+
+import pandas as pd
+from sqlalchemy import Engine
+
+from src.util.postgres import pooled_connection, query, query_polars
+
+
+def measure(engine: Engine, query_str: str, repeat: int = 3) -> list:
+    """
+    Measure every fetch mode on the same query, keeping the best of a few runs.
+    :param engine: SQLAlchemy engine
+    :param query_str: SQL query
+    :param repeat: Number of runs per mode.
+    :return: The measurements.
+    """
+    modes = {
+        'pandas read_sql': lambda conn: query(conn=conn, query_str=query_str, bulk=False),
+        'pandas copy': lambda conn: query(conn=conn, query_str=query_str, bulk=True),
+        'polars read_database': lambda conn: query_polars(conn=conn, query_str=query_str, bulk=False),
+        'polars copy': lambda conn: query_polars(conn=conn, query_str=query_str, bulk=True),
+    }
+
+    results = []
+    for mode, fetch in modes.items():
+        seconds = float('inf')
+        for _ in range(repeat):
+            with pooled_connection(engine=engine) as conn:
+                start = time.perf_counter()
+                df = fetch(conn)
+                seconds = min(seconds, time.perf_counter() - start)
+        results.append(dict(mode=mode, rows=len(df), seconds=seconds, rows_per_second=len(df) / seconds))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bulk fetch against read_sql.')
+    parser.add_argument('--query', default='SELECT * FROM fct_collaboration', help='The query to fetch.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per mode.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+
+    results = measure(engine=app_config.pg_engine, query_str=args.query, repeat=args.repeat)
+    print(pd.DataFrame(results).to_string(index=False, float_format='%.2f'))
+
+
+if __name__ == '__main__':
+    main()
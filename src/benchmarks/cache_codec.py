@@ -0,0 +1,92 @@
+"""
+Compare encode/decode time and payload size of the cache codecs on synthetic query results.
+
+Run from the repository root:
+
+    python -m src.benchmarks.cache_codec
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.util.cache.codec import ArrowCodec, CacheCodec, JsonCodec
+
+
+def metrics_frame(n_rows: int) -> pd.DataFrame:
+    """
+    Create a narrow result similar to the overview aggregates.
+    :param n_rows: Number of rows.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'year': rng.integers(2000, 2025, n_rows).astype(float),
+        'institution': rng.choice(['UL', 'VUB', 'CYU', 'UNIWA', 'UNS', 'BBU'], n_rows),
+        'articles': rng.integers(0, 10_000, n_rows),
+        'is_eutopia_collaboration': rng.random(n_rows) > 0.5,
+        'collaboration_novelty_index': rng.random(n_rows),
+    })
+
+
+def embedding_frame(n_rows: int, dim: int) -> pd.DataFrame:
+    """
+    Create a wide result similar to the co-author embeddings.
+    :param n_rows: Number of rows.
+    :param dim: Embedding dimension.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'author_id': [f'author-{i}' for i in range(n_rows)],
+        'author_name': [f'Author Name {i}' for i in range(n_rows)],
+        'embedding_tensor_data': rng.standard_normal((n_rows, dim)).tolist(),
+    })
+
+
+def measure(codec: CacheCodec, df: pd.DataFrame, repeat: int) -> dict:
+    """
+    Measure the codec on a DataFrame.
+    :param codec: The codec.
+    :param df: The DataFrame.
+    :param repeat: Number of repetitions, the best time is reported.
+    :return: The measurements.
+    """
+    encode_times, decode_times = [], []
+    payload = b''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = codec.encode(df)
+        encode_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        codec.decode(payload)
+        decode_times.append(time.perf_counter() - start)
+
+    return dict(encode_ms=min(encode_times) * 1000,
+                decode_ms=min(decode_times) * 1000,
+                kilobytes=len(payload) / 1024)
+
+
+def main(repeat: int = 5):
+    codecs = {
+        'json': JsonCodec(),
+        'arrow (uncompressed)': ArrowCodec(compression=None),
+        'arrow (lz4)': ArrowCodec(compression='lz4'),
+        'arrow (zstd)': ArrowCodec(compression='zstd'),
+    }
+    frames = {
+        'metrics 10k rows': metrics_frame(n_rows=10_000),
+        'embeddings 2k x 256': embedding_frame(n_rows=2_000, dim=256),
+    }
+
+    results = []
+    for frame_name, df in frames.items():
+        for codec_name, codec in codecs.items():
+            results.append(dict(frame=frame_name, codec=codec_name, **measure(codec=codec, df=df, repeat=repeat)))
+
+    print(pd.DataFrame(results).to_string(index=False, float_format='%.2f'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare wall time and trustworthiness of the co-author layout methods on synthetic clustered embeddings.
+
+Run from the repository root:
+
+    python -m src.benchmarks.projection
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.manifold import trustworthiness
+
+from src.util.dash_author.projection import available_layout_methods, choose_layout_method, project
+
+
+def clustered_embeddings(n_points: int, dim: int = 256, n_clusters: int = 12) -> np.ndarray:
+    """
+    Create embeddings grouped around a few centres, similar to co-authors of a few research areas.
+    :param n_points: Number of points.
+    :param dim: Embedding dimension.
+    :param n_clusters: Number of clusters.
+    :return: The embedding matrix.
+    """
+    rng = np.random.default_rng(42)
+    centres = rng.standard_normal((n_clusters, dim)) * 4
+    return centres[rng.integers(0, n_clusters, n_points)] + rng.standard_normal((n_points, dim))
+
+
+def measure(X: np.ndarray, method: str, budget: float) -> dict:
+    """
+    Measure a layout method with the interactive settings.
+    :param X: The embedding matrix.
+    :param method: The layout method.
+    :param budget: Latency budget in seconds.
+    :return: The measurements.
+    """
+    start = time.perf_counter()
+    coords = project(X, method=method, budget=budget)
+    seconds = time.perf_counter() - start
+    return dict(seconds=seconds, trustworthiness=trustworthiness(X, coords, n_neighbors=min(10, (X.shape[0] - 1) // 2)))
+
+
+def main(sizes: tuple = (20, 200, 1000, 4000), budget: float = 2.0):
+    results = []
+    for n_points in sizes:
+        X = clustered_embeddings(n_points=n_points)
+        auto = choose_layout_method(n_points=n_points, budget=budget)
+        for method in available_layout_methods():
+            results.append(dict(points=n_points, method=method, auto=method == auto, **measure(X=X, method=method, budget=budget)))
+
+    print(pd.DataFrame(results).to_string(index=False, float_format='%.3f'))
+
+
+if __name__ == '__main__':
+    main()
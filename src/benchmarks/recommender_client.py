@@ -0,0 +1,128 @@
+"""
+Check the recommender client against local stub servers that answer normally, slowly and with failures: timeouts,
+retries, opening of the circuit breaker, recovery through the half-open trial call and cache hits. Exits with a non-zero
+status if any check fails.
+
+Run from the repository root:
+
+    python -m src.benchmarks.recommender_client
+"""
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from src.benchmarks.recommender_stub import handler, recommendations
+from src.util.recommender import CircuitBreaker, RecommenderClient, RecommenderUnavailable
+
+RETRIES = 2
+READ_TIMEOUT = 0.2
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 0.5
+
+
+def start_stub(delay: float = 0.0, fail_rate: float = 0.0) -> tuple:
+    """
+    Start a stub server on a free port in a background thread.
+    :param delay: Seconds to wait before answering.
+    :param fail_rate: Fraction of requests answered with a 503.
+    :return: The server, its handler class counting the calls and the URL of its predict endpoint.
+    """
+    stub_handler = handler(delay=delay, fail_rate=fail_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub_handler, f'http://127.0.0.1:{server.server_address[1]}/predict/'
+
+
+def new_client(url: str) -> RecommenderClient:
+    """
+    Create a client with short timeouts, so the checks run quickly.
+    :param url: The predict endpoint.
+    :return: The client.
+    """
+    return RecommenderClient(url=url,
+                             connect_timeout=0.5,
+                             read_timeout=READ_TIMEOUT,
+                             retries=RETRIES,
+                             breaker=CircuitBreaker(failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT))
+
+
+def failed_call(client: RecommenderClient, author_id: str) -> tuple:
+    """
+    Call the client, expecting it to fail.
+    :param client: The client.
+    :param author_id: The author id.
+    :return: Whether the call raised RecommenderUnavailable and the seconds it took.
+    """
+    start = time.perf_counter()
+    try:
+        client.predict(author_id=author_id)
+        return False, time.perf_counter() - start
+    except RecommenderUnavailable:
+        return True, time.perf_counter() - start
+
+
+def run_checks() -> list:
+    """
+    Run every check against fresh stub servers.
+    :return: Pairs of check name and whether it passed.
+    """
+    checks = list()
+    normal, normal_handler, normal_url = start_stub()
+    slow, slow_handler, slow_url = start_stub(delay=READ_TIMEOUT * 5)
+    failing, failing_handler, failing_url = start_stub(fail_rate=1.0)
+
+    try:
+        # Normal: the first call reaches the service, the second one is a cache hit
+        client = new_client(url=normal_url)
+        result = client.predict(author_id='author-1')
+        checks.append(('normal: returns the recommendations', result == recommendations(author_id='author-1')))
+        calls = normal_handler.calls
+        checks.append(('normal: repeated call is a cache hit',
+                       client.predict(author_id='author-1') == result and normal_handler.calls == calls))
+
+        # Slow: every attempt times out, the call fails after the retries instead of waiting for the service
+        client = new_client(url=slow_url)
+        raised, seconds = failed_call(client=client, author_id='author-2')
+        checks.append(('slow: times out and raises', raised))
+        checks.append(('slow: retried after the timeout', slow_handler.calls == RETRIES + 1))
+        checks.append(('slow: gives up before one slow answer per attempt', seconds < READ_TIMEOUT * 5 * (RETRIES + 1)))
+
+        # Failing: 503s are retried, consecutive failures open the breaker, which then fails fast
+        client = new_client(url=failing_url)
+        raised, _ = failed_call(client=client, author_id='author-3')
+        checks.append(('failing: 503 is retried and raises', raised and failing_handler.calls == RETRIES + 1))
+        for i in range(FAILURE_THRESHOLD - 1):
+            failed_call(client=client, author_id=f'author-3-{i}')
+        checks.append(('failing: breaker opens after the threshold', client.breaker.state() == 'open'))
+        calls = failing_handler.calls
+        raised, seconds = failed_call(client=client, author_id='author-4')
+        checks.append(('failing: open breaker fails fast without calling the service',
+                       raised and failing_handler.calls == calls and seconds < READ_TIMEOUT))
+
+        # Half-open: a failed trial call opens the breaker again, a successful one closes it
+        time.sleep(RESET_TIMEOUT * 1.2)
+        raised, _ = failed_call(client=client, author_id='author-5')
+        checks.append(('half-open: failed trial call reopens the breaker', raised and client.breaker.state() == 'open'))
+        time.sleep(RESET_TIMEOUT * 1.2)
+        client.url = normal_url
+        result = client.predict(author_id='author-6')
+        checks.append(('half-open: successful trial call closes the breaker',
+                       result == recommendations(author_id='author-6') and client.breaker.state() == 'closed'))
+    finally:
+        for server in (normal, slow, failing):
+            server.shutdown()
+            server.server_close()
+    return checks
+
+
+def main():
+    checks = run_checks()
+    for name, passed in checks:
+        print(f"{'ok  ' if passed else 'FAIL'} {name}")
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
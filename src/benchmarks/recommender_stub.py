@@ -0,0 +1,86 @@
+"""
+Local stand-in for the recommendation engine, to try the recommender client without the real service. It answers
+POST /predict/ with a deterministic list of author ids and can be made slow or flaky.
+
+Run from the repository root and point DASHBOARD.RECOMMENDER_URL to it:
+
+    python -m src.benchmarks.recommender_stub --port 8080 --delay 0.5 --fail-rate 0.2
+
+The behaviour of the client against it is checked with:
+
+    python -m src.benchmarks.recommender_client
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def recommendations(author_id: str, k: int = 10) -> list:
+    """
+    Derive stable fake recommendations from an author id.
+    :param author_id: The author id.
+    :param k: Number of recommendations.
+    :return: The recommended author ids.
+    """
+    seed = hashlib.sha256(author_id.encode('utf-8')).hexdigest()
+    return [f'{seed[i:i + 8]}' for i in range(k)]
+
+
+def handler(delay: float, fail_rate: float) -> type:
+    """
+    Create the request handler.
+    :param delay: Seconds to wait before answering.
+    :param fail_rate: Fraction of requests answered with a 503.
+    :return: The handler class.
+    """
+    class PredictHandler(BaseHTTPRequestHandler):
+        # Number of received requests, to see the retries of the client
+        calls = 0
+
+        def do_POST(self):
+            PredictHandler.calls += 1
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(delay)
+
+            if self.path.rstrip('/') != '/predict' or 'author_id' not in body:
+                self.send_error(404)
+                return
+            if random.random() < fail_rate:
+                self.send_error(503)
+                return
+
+            payload = json.dumps(recommendations(author_id=str(body['author_id']))).encode('utf-8')
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up waiting
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake recommendations.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering.')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of requests failing with a 503.')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('0.0.0.0', args.port), handler(delay=args.delay, fail_rate=args.fail_rate))
+    print(f'Serving fake recommendations on port {args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
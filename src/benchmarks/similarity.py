@@ -0,0 +1,78 @@
+"""
+Compare recall and query latency of the author similarity index against an exact brute force cosine search on
+synthetic clustered embeddings, leaving out a random co-author set of every queried author.
+
+Run from the repository root:
+
+    python -m src.benchmarks.similarity
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.util.dash_author.similarity import SimilarityIndex, hnswlib
+
+
+def clustered_embeddings(n_points: int, dim: int = 128, n_clusters: int = 50) -> np.ndarray:
+    """
+    Create embeddings grouped around many centres, similar to authors of many research areas.
+    :param n_points: Number of points.
+    :param dim: Embedding dimension.
+    :param n_clusters: Number of clusters.
+    :return: The embedding matrix.
+    """
+    rng = np.random.default_rng(42)
+    centres = rng.standard_normal((n_clusters, dim)) * 2
+    return (centres[rng.integers(0, n_clusters, n_points)] + rng.standard_normal((n_points, dim))).astype(np.float32)
+
+
+def measure(index: SimilarityIndex, exact: SimilarityIndex, queries: list, k: int) -> dict:
+    """
+    Measure an index against the exact search.
+    :param index: The index.
+    :param exact: The brute force index over the same authors.
+    :param queries: Pairs of author id and the co-author ids to leave out.
+    :param k: Number of similar authors.
+    :return: The measurements.
+    """
+    latencies, hits = list(), 0
+    for author_id, co_author_ids in queries:
+        start = time.perf_counter()
+        result = index.similar_authors(author_id=author_id, k=k, exclude=co_author_ids)
+        latencies.append(time.perf_counter() - start)
+        truth = exact.similar_authors(author_id=author_id, k=k, exclude=co_author_ids)
+        hits += len({similar_id for similar_id, _ in result} & {similar_id for similar_id, _ in truth})
+
+    latencies = np.array(latencies) * 1000
+    return dict(recall=hits / (k * len(queries)),
+                p50_ms=np.percentile(latencies, 50),
+                p95_ms=np.percentile(latencies, 95))
+
+
+def main(sizes: tuple = (10000, 100000), k: int = 10, n_queries: int = 200, n_co_authors: int = 100):
+    rng = np.random.default_rng(0)
+    results = []
+    for n_points in sizes:
+        X = clustered_embeddings(n_points=n_points)
+        author_ids = np.array([f'author-{i}' for i in range(n_points)])
+        queries = [(author_ids[i], set(rng.choice(author_ids, n_co_authors, replace=False)))
+                   for i in rng.choice(n_points, n_queries, replace=False)]
+
+        exact = SimilarityIndex(author_ids=author_ids, X=X, method='brute')
+        results.append(dict(authors=n_points, method='brute', build_s=0.0, **measure(exact, exact, queries, k)))
+        if hnswlib is None:
+            continue
+
+        start = time.perf_counter()
+        # Build from two batches, the second one added incrementally like new authors after a warehouse load
+        index = SimilarityIndex(author_ids=author_ids[:n_points // 2], X=X[:n_points // 2], method='hnsw')
+        index.add(author_ids=author_ids[n_points // 2:], X=X[n_points // 2:])
+        build = time.perf_counter() - start
+        results.append(dict(authors=n_points, method='hnsw', build_s=build, **measure(index, exact, queries, k)))
+
+    print(pd.DataFrame(results).to_string(index=False, float_format='%.3f'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare the row-wise post-processing the dashboard used to do with the vectorized transformations on large results.
+
+Run from the repository root:
+
+    python -m src.benchmarks.transform
+"""
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.util.dash_common.transform import dropdown_options, markdown_links, round_columns
+
+
+def authors_frame(n_rows: int) -> pd.DataFrame:
+    """
+    Create a result similar to the author filter data.
+    :param n_rows: Number of rows.
+    :return: The DataFrame.
+    """
+    return pd.DataFrame({
+        'Author Id': [f'{i:012d}' for i in range(n_rows)],
+        'Author Name': [f'Author "{i}" Müller' if i % 100 == 0 else f'Author {i}' for i in range(n_rows)],
+    })
+
+
+def articles_frame(n_rows: int) -> pd.DataFrame:
+    """
+    Create a result similar to the published articles.
+    :param n_rows: Number of rows.
+    :return: The DataFrame.
+    """
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'Article Doi': [f'10.1000/{i}' for i in range(n_rows)],
+        'Article Title': [f'Article title {i}' for i in range(n_rows)],
+        'Citations': rng.random(n_rows) * 100,
+        'Collaboration Novelty Index': rng.random(n_rows),
+    })
+
+
+def options_rowwise(df: pd.DataFrame) -> list:
+    return [
+        {'label': row['Author Name'],
+         'value': json.dumps({'filter-name': 'author_id', 'filter-value': row['Author Id']})}
+        for index, row in df.iterrows()
+    ]
+
+
+def options_vectorized(df: pd.DataFrame) -> list:
+    return dropdown_options(df=df, label_column='Author Name', value_column='Author Id', filter_name='author_id')
+
+
+def articles_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['Article Title'] = df.apply(lambda row: f"[{row['Article Title']}](https://doi.org/{row['Article Doi']})", axis=1)
+    df['Collaboration Novelty Index'] = df['Collaboration Novelty Index'].apply(lambda x: round(x, 2))
+    df['Citations'] = df['Citations'].apply(lambda x: round(x, 5))
+    return df
+
+
+def articles_vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['Article Title'] = markdown_links(text=df['Article Title'], url_prefix='https://doi.org/',
+                                         url_suffix=df['Article Doi'])
+    return round_columns(df, decimals={'Collaboration Novelty Index': 2, 'Citations': 5})
+
+
+def best_time(func: callable, df: pd.DataFrame, repeat: int) -> float:
+    """
+    Measure a function.
+    :param func: The function.
+    :param df: The input.
+    :param repeat: Number of repetitions, the best time is reported.
+    :return: The best time in milliseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main(n_rows: int = 100_000, repeat: int = 3):
+    cases = {
+        'dropdown options': (authors_frame(n_rows=n_rows), options_rowwise, options_vectorized),
+        'published articles': (articles_frame(n_rows=n_rows), articles_rowwise, articles_vectorized),
+    }
+
+    results = []
+    for name, (df, rowwise, vectorized) in cases.items():
+        # Both implementations have to produce the same output
+        expected, actual = rowwise(df), vectorized(df)
+        same = expected == actual if isinstance(expected, list) else expected.equals(actual)
+
+        rowwise_ms = best_time(func=rowwise, df=df, repeat=repeat)
+        vectorized_ms = best_time(func=vectorized, df=df, repeat=repeat)
+        results.append(dict(case=name, rows=n_rows, same_output=same, rowwise_ms=rowwise_ms,
+                            vectorized_ms=vectorized_ms, speedup=rowwise_ms / vectorized_ms))
+
+    print(pd.DataFrame(results).to_string(index=False, float_format='%.1f'))
+
+
+if __name__ == '__main__':
+    main()
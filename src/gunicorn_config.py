@@ -1,2 +1,66 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
 bind = '0.0.0.0:8085'
 workers = 2
+
+# Restart delays of a crashed job worker, doubled after every crash up to the maximum
+JOB_WORKER_BACKOFF = 1
+JOB_WORKER_MAX_BACKOFF = 60
+# Seconds given to the side processes to exit before they are killed
+SHUTDOWN_TIMEOUT = 10
+
+_processes: dict = dict()
+_stopping = threading.Event()
+
+
+def supervise_job_worker(server):
+    """
+    Run the background job worker and restart it whenever it exits, until the server shuts down.
+    """
+    backoff = JOB_WORKER_BACKOFF
+    while not _stopping.is_set():
+        started = time.monotonic()
+        process = subprocess.Popen([sys.executable, '-m', 'src.util.jobs'])
+        _processes['job_worker'] = process
+        returncode = process.wait()
+        if _stopping.is_set():
+            return
+        # A worker that ran for a while crashed on its own, restart it right away the next time
+        if time.monotonic() - started > JOB_WORKER_MAX_BACKOFF:
+            backoff = JOB_WORKER_BACKOFF
+        server.log.warning(f'Job worker exited with code {returncode}, restarting in {backoff} seconds.')
+        if _stopping.wait(backoff):
+            return
+        backoff = min(backoff * 2, JOB_WORKER_MAX_BACKOFF)
+
+
+def when_ready(server):
+    """
+    Warm the cache in a separate process once the server is ready, so the first visitors do not wait for cold queries,
+    and start the background job worker. Set DASHBOARD_WARMUP=0 or DASHBOARD_JOB_WORKER=0 to skip them.
+    """
+    if os.environ.get('DASHBOARD_WARMUP', '1') == '1':
+        _processes['warmup'] = subprocess.Popen([sys.executable, '-m', 'src.util.dash_common.warmup'])
+    # Heavy author page computations run in a job worker instead of the web workers
+    if os.environ.get('DASHBOARD_JOB_WORKER', '1') == '1':
+        threading.Thread(target=supervise_job_worker, args=(server,), daemon=True).start()
+
+
+def on_exit(server):
+    """
+    Stop the warmup and the job worker together with the server, so they are not left running without it.
+    """
+    _stopping.set()
+    processes = [process for process in _processes.values() if process.poll() is None]
+    for process in processes:
+        process.terminate()
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for process in processes:
+        try:
+            process.wait(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -2,14 +2,19 @@ import re
 import dash
 import dash_bootstrap_components as dbc
 
-from dash import ALL, callback, dcc, html, Input, Output
+from dash import ALL, callback, ctx, dcc, html, Input, Output, State
+from dash.exceptions import PreventUpdate
 
-from src.util.dash_common.filter import filter_author, filter_publication_date
-from src.util.dash_author.visual import articles_by_breakdown, author_recommendations, cards_base_metrics, \
-    co_author_clustering, \
-    published_articles
+# Registers the author page jobs, so they can also run inline when no job worker is alive
+import src.util.dash_author.jobs  # noqa: F401
+from src.util.cache.key import scope_params
+from src.util.dash_common.filter import filter_author, filter_publication_date, search_author_options
+from src.util.dash_author.visual import articles_by_breakdown, cards_base_metrics, published_articles, \
+    published_articles_page
 from src.util.dash_common.app_config import app_config
 from src.util.dash_common.common import parse_filters
+from src.util.dash_common.panel import job_panel, run_panel
+from src.util.jobs import status, submit
 
 
 # -------------------- PAGE LAYOUT HELPERS --------------------
@@ -45,7 +50,32 @@ def page_header():
     )
 
 
+def job_poller(name: str) -> list:
+    """
+    Get the components tracking the background job of a panel.
+    :param name: The id of the panel.
+    :return: The job id store and the polling interval.
+    """
+    return [
+        dcc.Store(id=f'{name}-job'),
+        dcc.Interval(id=f'{name}-poll',
+                     interval=app_config.config.DASHBOARD.get('JOB_POLL_INTERVAL', 500),
+                     disabled=True)
+    ]
+
+
 # -------------------- CALLBACKS --------------------
+@callback(Output({'type': 'filter-author', 'index': 'author_id'}, 'options'),
+          Input({'type': 'filter-author', 'index': 'author_id'}, 'search_value'),
+          State({'type': 'filter-author', 'index': 'author_id'}, 'value'))
+def search_author(search_value: str, value: str):
+    # Keep the options while nothing is typed
+    if not search_value:
+        raise PreventUpdate
+
+    return search_author_options(app_config=app_config, search_value=search_value, selected=value)
+
+
 @callback(Output('author-page', 'children'),
           Input({'type': 'filter-author', 'index': ALL}, 'value'),
           Input({'type': 'filter-author', 'index': ALL}, 'id'))
@@ -56,9 +86,6 @@ def page_author(filters: list, filter_ids: list) -> dbc.Container:
     :param filters: The filters.
     :return: The layout.
     """
-    # Get the filter values
-    filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
-
     if filters is None or len(filters) == 0:
         return dbc.Container(children=[
             dbc.Row(
@@ -76,8 +103,10 @@ def page_author(filters: list, filter_ids: list) -> dbc.Container:
 
     return dbc.Container(children=[
         # Some space between the title and the cards
-        dbc.Row(children=cards_base_metrics(app_config=app_config, filter_scope=filter_scope),
-                className="gray-background-custom m-1"),
+        # Every panel is filled by its own callback, so the cards do not wait for the slower panels
+        dcc.Loading(
+            dbc.Row(children=[], id='author-cards', className="gray-background-custom m-1")
+        ),
         dbc.Row(children=[
             dbc.Col(
                 [
@@ -121,19 +150,21 @@ def page_author(filters: list, filter_ids: list) -> dbc.Container:
         ], className="m-1"),
         dbc.Row(children=[
             dbc.Col(children=[
-                dbc.Row(children=[], id='research-streams-clustering')
+                dbc.Row(children=[], id='research-streams-clustering'),
+                *job_poller(name='research-streams-clustering')
             ], width=5, className="gray-background-custom border-white"),
             dbc.Col(children=[
-                dbc.Row(children=[], id='author-research-direction')
+                dcc.Loading(dbc.Row(children=[], id='author-research-direction'))
             ], width=4, className="gray-background-custom border-white"),
             dbc.Col(children=[
-                dbc.Row(children=author_recommendations(app_config=app_config, filter_scope=filter_scope),
-                        id='author-recommendations')
+                dbc.Row(children=[], id='author-recommendations'),
+                *job_poller(name='author-recommendations')
             ], width=3, className="gray-background-custom border-white")
         ], className="m-1 mb-2"),
         dbc.Row(children=[
             html.H6("PUBLISHED ARTICLES", className="text-left p-2 font-italic"),
-            published_articles(app_config=app_config, filter_scope=filter_scope)
+            dcc.Loading(html.Div(children=published_articles(app_config=app_config), id='published-articles')),
+            dcc.Store(id='published-articles-cursor')
         ],
             className="gray-background-custom m-1"
         )
@@ -143,21 +174,105 @@ def page_author(filters: list, filter_ids: list) -> dbc.Container:
     )
 
 
-@callback(Output('research-streams-clustering', 'children'),
+@callback(Output('author-cards', 'children'),
+          Input({'type': 'filter-author', 'index': ALL}, 'value'),
+          Input({'type': 'filter-author', 'index': ALL}, 'id'))
+def author_cards(filters: list, filter_ids: list):
+    # Get the filter values
+    filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
+
+    return run_panel(app_config=app_config, panel_func=cards_base_metrics, filter_scope=filter_scope)
+
+
+@callback(Output('published-articles-table', 'data'),
+          Output('published-articles-table', 'tooltip_data'),
+          Output('published-articles-table', 'page_count'),
+          Output('published-articles-table', 'page_current'),
+          Output('published-articles-cursor', 'data'),
           Input({'type': 'filter-author', 'index': ALL}, 'value'),
           Input({'type': 'filter-author', 'index': ALL}, 'id'),
-          Input('filter-min-samples', 'value'),
-          Input('filter-min-cluster-size', 'value'))
-def research_streams_clustering(filters: list, filter_ids: list, min_samples: int, min_cluster_size: int):
+          Input('published-articles-table', 'page_current'),
+          Input('published-articles-table', 'page_size'),
+          Input('published-articles-table', 'sort_by'),
+          Input('published-articles-table', 'filter_query'),
+          State('published-articles-cursor', 'data'))
+def author_published_articles(filters: list,
+                              filter_ids: list,
+                              page_current: int,
+                              page_size: int,
+                              sort_by: list,
+                              filter_query: str,
+                              cursor: dict | None):
     # Get the filter values
     filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
 
-    return co_author_clustering(
-        app_config=app_config,
-        filter_scope=filter_scope,
-        min_samples=min_samples,
-        min_cluster_size=min_cluster_size
-    )
+    # A changed sort or filter starts again from the first page
+    page_current = page_current or 0
+    if ctx.triggered_id == 'published-articles-table' and \
+            not any(trigger['prop_id'].endswith('.page_current') for trigger in ctx.triggered):
+        page_current = 0
+
+    try:
+        records, tooltip_data, page_count, page_cursor = published_articles_page(app_config=app_config,
+                                                                                 filter_scope=filter_scope,
+                                                                                 page_current=page_current,
+                                                                                 page_size=page_size,
+                                                                                 sort_by=sort_by,
+                                                                                 filter_query=filter_query,
+                                                                                 cursor=cursor)
+    except Exception as e:
+        app_config.logger.exception(f"Failed to load the published articles: {e}")
+        return [], [], 1, 0, None
+    return records, tooltip_data, page_count, page_current, page_cursor
+
+
+@callback(Output('research-streams-clustering', 'children'),
+          Output('research-streams-clustering-job', 'data'),
+          Output('research-streams-clustering-poll', 'disabled'),
+          Input({'type': 'filter-author', 'index': ALL}, 'value'),
+          Input({'type': 'filter-author', 'index': ALL}, 'id'),
+          Input('filter-min-samples', 'value'),
+          Input('filter-min-cluster-size', 'value'),
+          Input('research-streams-clustering-poll', 'n_intervals'),
+          State('research-streams-clustering-job', 'data'))
+def research_streams_clustering(filters: list,
+                                filter_ids: list,
+                                min_samples: int,
+                                min_cluster_size: int,
+                                n_intervals: int,
+                                current_job: str | None):
+    if ctx.triggered_id == 'research-streams-clustering-poll' and current_job:
+        state = status(app_config=app_config, current_id=current_job)
+    else:
+        # Get the filter values
+        filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
+        state = submit(app_config=app_config,
+                       name='author.co_author_clustering',
+                       params=dict(filter_params=scope_params(filter_scope),
+                                   min_samples=min_samples,
+                                   min_cluster_size=min_cluster_size))
+
+    return job_panel(title='Research streams clustering', state=state)
+
+
+@callback(Output('author-recommendations', 'children'),
+          Output('author-recommendations-job', 'data'),
+          Output('author-recommendations-poll', 'disabled'),
+          Input({'type': 'filter-author', 'index': ALL}, 'value'),
+          Input({'type': 'filter-author', 'index': ALL}, 'id'),
+          Input('author-recommendations-poll', 'n_intervals'),
+          State('author-recommendations-job', 'data'))
+def author_recommendations_panel(filters: list, filter_ids: list, n_intervals: int, current_job: str | None):
+    if ctx.triggered_id == 'author-recommendations-poll' and current_job:
+        state = status(app_config=app_config, current_id=current_job)
+    else:
+        # Get the filter values
+        filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
+        state = submit(app_config=app_config,
+                       name='author.recommendations',
+                       params=dict(filter_params=scope_params(filter_scope)))
+
+    return job_panel(title='Recommended new collaborations', state=state)
 
 
 @callback(Output('author-research-direction', 'children'),
@@ -168,8 +283,9 @@ def author_research_direction(filters: list, filter_ids: list, grouping: str):
     # Get the filter values
     filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
 
-    return articles_by_breakdown(
+    return run_panel(
         app_config=app_config,
+        panel_func=articles_by_breakdown,
         filter_scope=filter_scope,
         grouping=grouping,
     )
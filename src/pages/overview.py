@@ -6,6 +6,7 @@ import dash_bootstrap_components as dbc
 
 from src.util.dash_common.app_config import app_config
 from src.util.dash_common.common import parse_filters
+from src.util.dash_common.panel import run_panels
 from src.util.dash_common.filter import (
     filter_publication_date,
     filter_research_area,
@@ -69,19 +70,41 @@ def page_header():
 def page_overview(filters: list, filter_ids: int) -> list:
     # Get the filter values
     filter_scope = parse_filters(filters=filters, filter_ids=filter_ids)
+
+    # Build the independent panels concurrently, in layout order
+    (cards,
+     articles_by_collaboration_type,
+     publications_by_institution,
+     eutopia_collaboration,
+     collaboration_funnel,
+     new_collaborations,
+     novelty_index_distribution) = run_panels(
+        app_config=app_config,
+        panel_funcs=[
+            cards_base_metrics,
+            trend_articles_by_collaboration_type,
+            breakdown_publications_by_institution,
+            trend_eutopia_collaboration,
+            eutopia_collaboration_funnel,
+            trend_new_collaborations,
+            collaboration_novelty_index_distribution
+        ],
+        filter_scope=filter_scope
+    )
+
     return [
         # Some space between the title and the cards
-        dbc.Row(children=cards_base_metrics(app_config=app_config, filter_scope=filter_scope),
+        dbc.Row(children=cards,
                 className="gray-background-custom m-1"),
         dbc.Row(
             children=[
                 dbc.Col(children=[
-                    dbc.Row(trend_articles_by_collaboration_type(app_config=app_config, filter_scope=filter_scope),
+                    dbc.Row(articles_by_collaboration_type,
                             className="mt-4 m-1")
                 ], width=6
                 ),
                 dbc.Col(children=[
-                    dbc.Row(breakdown_publications_by_institution(app_config=app_config, filter_scope=filter_scope),
+                    dbc.Row(publications_by_institution,
                             className="mt-4 m-1")
                 ], width=6
                 )
@@ -90,12 +113,12 @@ def page_overview(filters: list, filter_ids: int) -> list:
         dbc.Row(
             children=[
                 dbc.Col(children=[
-                    dbc.Row(trend_eutopia_collaboration(app_config=app_config, filter_scope=filter_scope),
+                    dbc.Row(eutopia_collaboration,
                             className="mt-4 m-1")
                 ], width=6
                 ),
                 dbc.Col(children=[
-                    dbc.Row(eutopia_collaboration_funnel(app_config=app_config, filter_scope=filter_scope),
+                    dbc.Row(collaboration_funnel,
                             className="mt-4 m-1")
                 ], width=6
                 )
@@ -104,12 +127,12 @@ def page_overview(filters: list, filter_ids: int) -> list:
         dbc.Row(
             children=[
                 dbc.Col(children=[
-                    dbc.Row(trend_new_collaborations(app_config=app_config, filter_scope=filter_scope),
+                    dbc.Row(new_collaborations,
                             className="mt-4 m-1")
                 ], width=6
                 ),
                 dbc.Col(children=[
-                    dbc.Row(collaboration_novelty_index_distribution(app_config=app_config, filter_scope=filter_scope),
+                    dbc.Row(novelty_index_distribution,
                             className="mt-4 m-1")
                 ], width=6
                 )
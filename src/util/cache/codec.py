@@ -0,0 +1,149 @@
+import io
+import json
+
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+
+
+class CacheCodec:
+    """
+    Serializes query results to bytes stored in the cache and back. Every codec prefixes its payload with a magic
+    header, so entries written by a different codec can still be decoded.
+    """
+    name: str = None
+    header: bytes = None
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        """
+        Encode a DataFrame.
+        :param df: The DataFrame.
+        :return: The encoded payload.
+        """
+        raise NotImplementedError
+
+    def decode(self, payload: bytes) -> pd.DataFrame:
+        """
+        Decode a payload into a Pandas DataFrame.
+        :param payload: The encoded payload.
+        :return: The DataFrame.
+        """
+        raise NotImplementedError
+
+    def decode_polars(self, payload: bytes) -> pl.DataFrame:
+        """
+        Decode a payload into a Polars DataFrame.
+        :param payload: The encoded payload.
+        :return: The DataFrame.
+        """
+        return pl.from_pandas(self.decode(payload))
+
+
+class JsonCodec(CacheCodec):
+    """
+    Stores the results as a list of JSON records. This is the original cache format, so its header is empty.
+    """
+    name = 'json'
+    header = b''
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        return json.dumps(df.to_dict('records')).encode('utf-8')
+
+    def decode(self, payload: bytes) -> pd.DataFrame:
+        return pd.DataFrame(json.loads(payload[len(self.header):]))
+
+
+class ArrowCodec(CacheCodec):
+    """
+    Stores the results as a compressed Arrow IPC stream, which keeps the schema (dates, booleans, list columns) and
+    decodes without parsing every value.
+    """
+    name = 'arrow'
+    header = b'ARW1'
+
+    def __init__(self, compression: str | None = 'zstd'):
+        """
+        :param compression: The IPC buffer compression, either 'zstd', 'lz4' or None.
+        """
+        self.compression = compression
+        self.write_options = pa.ipc.IpcWriteOptions(compression=compression)
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        sink.write(self.header)
+        with pa.ipc.new_stream(sink, table.schema, options=self.write_options) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+    def read_table(self, payload: bytes) -> pa.Table:
+        """
+        Read the Arrow table from a payload without copying the buffers.
+        :param payload: The encoded payload.
+        :return: The Arrow table.
+        """
+        buffer = pa.py_buffer(payload)[len(self.header):]
+        return pa.ipc.open_stream(buffer).read_all()
+
+    def decode(self, payload: bytes) -> pd.DataFrame:
+        # Split blocks and release the Arrow buffers as soon as they are converted to avoid holding two copies
+        return self.read_table(payload).to_pandas(split_blocks=True, self_destruct=True)
+
+    def decode_polars(self, payload: bytes) -> pl.DataFrame:
+        return pl.from_arrow(self.read_table(payload))
+
+
+def get_codec(name: str, compression: str | None = 'zstd') -> CacheCodec:
+    """
+    Get the cache codec by name.
+    :param name: The codec name, either 'arrow' or 'json'.
+    :param compression: The compression used by the Arrow codec.
+    :return: The cache codec.
+    """
+    if name == ArrowCodec.name:
+        return ArrowCodec(compression=compression)
+    if name == JsonCodec.name:
+        return JsonCodec()
+    raise ValueError(f"Unknown cache codec: {name}")
+
+
+def encode(codec: CacheCodec, df: pd.DataFrame) -> bytes:
+    """
+    Encode a DataFrame, falling back to JSON if the codec can not represent its columns (e.g. mixed object types).
+    :param codec: The preferred codec.
+    :param df: The DataFrame.
+    :return: The encoded payload.
+    """
+    try:
+        return codec.encode(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return JsonCodec().encode(df)
+
+
+def detect_codec(payload: bytes) -> CacheCodec:
+    """
+    Get the codec that wrote a payload based on its header.
+    :param payload: The encoded payload.
+    :return: The cache codec.
+    """
+    if payload[:len(ArrowCodec.header)] == ArrowCodec.header:
+        return ArrowCodec()
+    return JsonCodec()
+
+
+def decode(payload: bytes) -> pd.DataFrame:
+    """
+    Decode a payload into a Pandas DataFrame regardless of the codec that wrote it.
+    :param payload: The encoded payload.
+    :return: The DataFrame.
+    """
+    return detect_codec(payload).decode(payload)
+
+
+def decode_polars(payload: bytes) -> pl.DataFrame:
+    """
+    Decode a payload into a Polars DataFrame regardless of the codec that wrote it.
+    :param payload: The encoded payload.
+    :return: The DataFrame.
+    """
+    return detect_codec(payload).decode_polars(payload)
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import re
+
+CACHE_PREFIX = 'postgres_cache'
+# Redis channel used to drop stale entries from the in-process cache of every worker
+INVALIDATION_CHANNEL = f'{CACHE_PREFIX}:invalidate'
+
+
+def scope_params(filter_scope: dict) -> dict:
+    """
+    Get the structured filter values of a filter scope. Scopes built by parse_filters keep them next to the SQL
+    conditions, plain dictionaries of conditions are used as they are.
+    :param filter_scope: The filter scope.
+    :return: The structured filter values.
+    """
+    return getattr(filter_scope, 'params', filter_scope)
+
+
+def digest(value) -> str:
+    """
+    Hash a JSON serializable value to a fixed size, independently of the order of dictionary keys.
+    :param value: The value.
+    :return: The hex digest.
+    """
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def template_cache_key(template_id: str,
+                       params: dict,
+                       version: str) -> str:
+    """
+    Build the cache key of a query template run with the given parameters.
+    :param template_id: The id of the query template, e.g. 'overview.aggregate'.
+    :param params: The parameters of the query, e.g. the structured filter scope.
+    :param version: The cache version, bumping it makes every existing key unreachable.
+    :return: The cache key.
+    """
+    return f"{CACHE_PREFIX}:{version}:{template_id}:{digest(params)}"
+
+
+def query_cache_key(query_str: str,
+                    version: str) -> str:
+    """
+    Build the cache key of an ad-hoc query, ignoring differences in whitespace.
+    :param query_str: The query.
+    :param version: The cache version.
+    :return: The cache key.
+    """
+    normalized = re.sub(r'\s+', ' ', query_str).strip()
+    return template_cache_key(template_id='sql', params={'query': normalized}, version=version)
+
+
+def template_pattern(template_id: str) -> str:
+    """
+    Get the pattern matching every cache key of a query template, across versions.
+    :param template_id: The id of the query template.
+    :return: The key pattern.
+    """
+    return f"{CACHE_PREFIX}:*:{template_id}:*"
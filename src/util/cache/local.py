@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def frame_size(df: pd.DataFrame) -> int:
+    """
+    Estimate the memory used by a DataFrame.
+    :param df: The DataFrame.
+    :return: The size in bytes.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class LocalCache:
+    """
+    In-process LRU cache bounded in bytes, with a time to live per entry. Values are kept already decoded, so a hit
+    costs neither a network round trip nor a parse.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float | None = None):
+        """
+        :param max_bytes: Maximum total size of the cached values in bytes.
+        :param ttl: Seconds after which an entry expires, None keeps entries until they are evicted.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """
+        Get a value and mark it as recently used.
+        :param key: The key.
+        :return: The value or None if it is missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] < time.monotonic()):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value, size: int, ttl: float | None = None) -> None:
+        """
+        Store a value, evicting the least recently used entries to stay within the size bound.
+        :param key: The key.
+        :param value: The value.
+        :param size: The size of the value in bytes.
+        :param ttl: Seconds after which the entry expires, defaults to the cache TTL.
+        """
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, expires_at)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, key: str | None = None) -> None:
+        """
+        Drop an entry or, without a key, every entry.
+        :param key: The key.
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+                self.size = 0
+            elif key in self.entries:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """
+        Get the cache statistics.
+        :return: The cache statistics.
+        """
+        with self.lock:
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        evictions=self.evictions,
+                        entries=len(self.entries),
+                        bytes=self.size)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
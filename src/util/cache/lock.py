@@ -0,0 +1,30 @@
+import threading
+from contextlib import contextmanager
+
+
+class KeyedLock:
+    """
+    In-process locks created on demand per key and dropped once no thread holds or waits for them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: dict = dict()
+
+    @contextmanager
+    def acquire(self, key: str):
+        """
+        Hold the lock of a key for the duration of the block.
+        :param key: The key.
+        """
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
@@ -0,0 +1,197 @@
+import argparse
+import threading
+import time
+
+import redis
+from sqlalchemy import Engine, text
+
+from src.util.cache.key import CACHE_PREFIX, INVALIDATION_CHANNEL, digest
+
+DATA_VERSION_KEY = f'{CACHE_PREFIX}:data_version'
+WAREHOUSE_VERSION_KEY = f'{CACHE_PREFIX}:warehouse_version'
+
+# Tables read by the dashboard, a load into any of them changes the data version
+WAREHOUSE_TABLES = [
+    'fct_collaboration',
+    'fct_article',
+    'fct_article_keyword',
+    'dim_article',
+    'dim_author',
+    'dim_research_area',
+    'dim_eutopia_institution',
+    'author_embedding'
+]
+
+
+class DataVersion:
+    """
+    The data version stamped on every cache entry. It is stored in Redis and kept in-process for a few seconds, so
+    reading it does not cost a round trip per query.
+    """
+
+    def __init__(self, redis_client: redis.Redis, refresh_interval: float = 10):
+        """
+        :param redis_client: The Redis client.
+        :param refresh_interval: Seconds for which the version is reused before reading it from Redis again.
+        """
+        self.redis_client = redis_client
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.version = '0'
+        self.read_at = None
+
+    def get(self) -> str:
+        """
+        Get the current data version.
+        :return: The data version.
+        """
+        with self.lock:
+            if self.read_at is not None and time.monotonic() - self.read_at < self.refresh_interval:
+                return self.version
+            try:
+                version = self.redis_client.get(DATA_VERSION_KEY)
+                self.version = version.decode('utf-8') if version else '0'
+            except redis.ConnectionError:
+                # Keep the last known version while Redis is down
+                pass
+            self.read_at = time.monotonic()
+            return self.version
+
+    def reset(self) -> None:
+        """
+        Read the data version from Redis on the next access.
+        """
+        with self.lock:
+            self.read_at = None
+
+
+def warehouse_version(engine: Engine, tables: list = None) -> str:
+    """
+    Derive a version token from the write counters Postgres keeps for the warehouse tables. The token changes whenever
+    rows are inserted, updated or deleted in any of the tables.
+    :param engine: SQLAlchemy engine
+    :param tables: The tables to watch, defaults to the tables read by the dashboard.
+    :return: The version token.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+            FROM pg_stat_user_tables
+            WHERE schemaname = current_schema()
+              AND relname = ANY(:tables)
+            ORDER BY relname
+        """), {'tables': tables or WAREHOUSE_TABLES}).fetchall()
+    return digest([list(row) for row in rows])
+
+
+def bump_data_version(redis_client: redis.Redis, token: str | None = None) -> str:
+    """
+    Set a new data version, which makes every cached result unreachable, and tell every worker to drop its
+    in-process cache.
+    :param redis_client: The Redis client.
+    :param token: The new version, defaults to the current timestamp.
+    :return: The new version.
+    """
+    version = token or str(int(time.time() * 1000))
+    redis_client.set(DATA_VERSION_KEY, version)
+    redis_client.publish(INVALIDATION_CHANNEL, '*')
+    return version
+
+
+def purge_versions(redis_client: redis.Redis, keep: str) -> int:
+    """
+    Delete the cached results of every version except one. Unreachable entries expire on their own, this only frees
+    the memory earlier.
+    :param redis_client: The Redis client.
+    :param keep: The version prefix of the keys to keep, e.g. 'v1.1718000000000'.
+    :return: The number of deleted keys.
+    """
+    deleted = 0
+    keys = list()
+    for key in redis_client.scan_iter(match=f'{CACHE_PREFIX}:*:*:*', count=1000):
+        if key.decode('utf-8').split(':')[1] == keep:
+            continue
+        keys.append(key)
+        if len(keys) == 1000:
+            deleted += redis_client.delete(*keys)
+            keys = list()
+    if keys:
+        deleted += redis_client.delete(*keys)
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the data version of the dashboard cache.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('show', help='Print the current data version.')
+    bump_parser = subparsers.add_parser('bump', help='Set a new data version after a warehouse load.')
+    bump_parser.add_argument('--token', default=None, help='The new version, defaults to the current timestamp.')
+    bump_parser.add_argument('--from-warehouse', action='store_true',
+                             help='Derive the version from the write counters of the warehouse tables and only bump '
+                                  'it if they changed since the last bump.')
+    bump_parser.add_argument('--refresh-rollups', action='store_true',
+                             help='Refresh the rollup views of the overview page before bumping the version.')
+    bump_parser.add_argument('--export-embeddings', action='store_true',
+                             help='Export the author embeddings into the embedding store and add the new authors to '
+                                  'the similarity index before bumping the version.')
+    bump_parser.add_argument('--purge', action='store_true', help='Delete the cached results of older versions.')
+    bump_parser.add_argument('--warmup', action='store_true', help='Warm the cache for the new version.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+
+    if args.command == 'show':
+        print(DataVersion(redis_client=app_config.redis_client).get())
+        return
+
+    token = args.token
+    if args.from_warehouse:
+        token = warehouse_version(engine=app_config.pg_engine)
+        previous = app_config.redis_client.get(WAREHOUSE_VERSION_KEY)
+        if previous is not None and previous.decode('utf-8') == token:
+            print('Warehouse did not change, keeping the current data version.')
+            return
+
+    if args.refresh_rollups:
+        from src.util.dash_overview.rollup import refresh_rollups
+
+        # The new version must not be served from rollups of the previous load
+        refresh_rollups(engine=app_config.pg_engine)
+        print('Rollup views refreshed.')
+
+    if args.export_embeddings:
+        from src.util.dash_author.embedding import EmbeddingStore, embedding_store_path, export_embeddings
+        from src.util.dash_author.similarity import save_index, similarity_index_path
+
+        manifest = export_embeddings(engine=app_config.pg_engine, path=embedding_store_path(app_config=app_config))
+        print(f"Exported {manifest['authors']} author embeddings.")
+        # Built here once, the dashboard workers only load the saved index
+        _, added = save_index(store=EmbeddingStore(path=embedding_store_path(app_config=app_config)),
+                              path=similarity_index_path(app_config=app_config))
+        print(f"Added {added} authors to the similarity index.")
+
+    version = bump_data_version(redis_client=app_config.redis_client, token=token)
+    if args.from_warehouse:
+        # Only recorded once the version is bumped, so a failed step above is retried by the next bump
+        app_config.redis_client.set(WAREHOUSE_VERSION_KEY, token)
+    print(f'Data version bumped to {version}.')
+    if args.purge:
+        from src.util.dash_author.projection import projection_store
+
+        deleted = purge_versions(redis_client=app_config.redis_client, keep=f'{app_config.cache_version}.{version}')
+        print(f'Deleted {deleted} cached results of older versions.')
+        deleted = projection_store(app_config=app_config, version=f'{app_config.cache_version}.{version}').purge()
+        print(f'Deleted {deleted} co-author projections of older versions.')
+    if args.warmup:
+        from src.util.dash_common.warmup import warmup
+        from src.util.dash_overview.bitmap import disable_bitmaps
+
+        # The process exits after the warmup, the web workers build the bitmaps
+        disable_bitmaps()
+        # Read the new version right away instead of waiting for the in-process copy to refresh
+        app_config.data_version.reset()
+        print(warmup(app_config=app_config))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import threading
+import warnings
+
+import hdbscan
+import numpy as np
+import pandas as pd
+
+from src.util.cache.key import digest, scope_params
+from src.util.cache.local import LocalCache, frame_size
+from src.util.cache.lock import KeyedLock
+from src.util.dash_author.embedding import co_author_embeddings
+from src.util.dash_author.projection import layout_settings, project, projection_store
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.filter import publication_period
+from src.util.redis import cache_version
+
+try:
+    # Cluster extraction from a single linkage tree, exposed by the hdbscan package but not part of its public API,
+    # hdbscan is pinned in requirements.txt for it
+    from hdbscan.hdbscan_ import _tree_to_labels
+except ImportError:
+    _tree_to_labels = None
+    warnings.warn('hdbscan does not expose _tree_to_labels, changing min_cluster_size refits HDBSCAN')
+
+
+class ClusteringSession:
+    """
+    Everything needed to cluster the co-authors of an author for one publication period: the embedding matrix, the
+    2D layout and the single linkage tree per min_samples value. The tree only depends on min_samples, so changing
+    min_cluster_size only re-extracts the clusters from the cached tree.
+    """
+
+    def __init__(self, co_authors: pd.DataFrame, X: np.ndarray, layout: np.ndarray):
+        """
+        :param co_authors: The co-authors, one row per row of the embedding matrix.
+        :param X: The embedding matrix.
+        :param layout: The 2D coordinates of the co-authors.
+        """
+        self.co_authors = co_authors
+        self.X = X
+        self.layout = layout
+        self.trees: dict = dict()
+        self.lock = threading.Lock()
+
+    def labels(self, min_samples: int, min_cluster_size: int) -> np.ndarray:
+        """
+        Get the HDBSCAN cluster labels.
+        :param min_samples: HDBSCAN min_samples.
+        :param min_cluster_size: HDBSCAN min_cluster_size.
+        :return: The cluster label of every co-author, -1 for noise.
+        """
+        with self.lock:
+            tree = self.trees.get(min_samples)
+        if tree is not None:
+            try:
+                return _tree_to_labels(self.X, tree, min_cluster_size=min_cluster_size)[0]
+            except TypeError as e:
+                warnings.warn(f'Could not re-label the cached single linkage tree, refitting HDBSCAN: {e}')
+
+        hdb = hdbscan.HDBSCAN(
+            min_cluster_size=min_cluster_size,
+            min_samples=min_samples
+        )
+        labels = hdb.fit_predict(self.X)
+        tree = getattr(hdb, '_single_linkage_tree', None)
+        if tree is not None and _tree_to_labels is not None:
+            with self.lock:
+                self.trees[min_samples] = tree
+        return labels
+
+    def nbytes(self) -> int:
+        """
+        Estimate the memory used by the session, trees for a few min_samples values included.
+        :return: The size in bytes.
+        """
+        # Every single linkage tree has 4 values per co-author
+        tree_bytes = 5 * self.X.shape[0] * 4 * 8
+        return frame_size(self.co_authors) + self.X.nbytes + self.layout.nbytes + tree_bytes
+
+
+_sessions: LocalCache | None = None
+_sessions_lock = threading.Lock()
+_session_build_locks = KeyedLock()
+
+
+def sessions(app_config: AppConfig) -> LocalCache:
+    """
+    Get the in-process cache of clustering sessions.
+    :param app_config: The app_config.
+    :return: The session cache.
+    """
+    global _sessions
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = LocalCache(
+                max_bytes=app_config.config.DASHBOARD.get('CLUSTERING_SESSION_MAX_BYTES', 256 * 1024 * 1024),
+                ttl=app_config.config.DASHBOARD.get('CLUSTERING_SESSION_TTL', 1800))
+        return _sessions
+
+
+def build_session(app_config: AppConfig, filter_scope: dict, progress: callable = None) -> ClusteringSession:
+    """
+    Build the clustering session of a filter scope.
+    :param app_config: The app_config.
+    :param filter_scope: The filter scope.
+    :param progress: Callback receiving the progress as a fraction and a message.
+    :return: The clustering session.
+    """
+    progress = progress or (lambda fraction, message: None)
+
+    # Query the co-author embedding data
+    progress(0.1, 'Loading the co-author embeddings')
+    co_authors, X = co_author_embeddings(app_config=app_config, filter_scope=filter_scope)
+
+    # 2D layout, precomputed in bulk for popular authors
+    params = scope_params(filter_scope)
+    author_id, period = params['author_id'][0], params['article_publication_dt']
+    store = projection_store(app_config=app_config)
+    layout = store.load(author_id=author_id,
+                        period=period,
+                        co_author_ids=co_authors['Author Id'].values)
+    if layout is None:
+        progress(0.3, 'Computing the co-author layout')
+        layout = project(X, **layout_settings(app_config=app_config))
+        # Only the default period built in bulk is persisted, the layouts of other periods live with the session
+        if [int(year) for year in period] == [int(year) for year in publication_period()]:
+            try:
+                store.save(author_id=author_id,
+                           period=period,
+                           co_author_ids=co_authors['Author Id'].values,
+                           coords=layout)
+            except OSError as e:
+                app_config.logger.warning(f"Could not save the projection of author {author_id}: {e}")
+
+    return ClusteringSession(co_authors=co_authors, X=X, layout=layout)
+
+
+def clustering_session(app_config: AppConfig, filter_scope: dict, progress: callable = None) -> ClusteringSession:
+    """
+    Get the clustering session of a filter scope, building it once per worker.
+    :param app_config: The app_config.
+    :param filter_scope: The filter scope.
+    :param progress: Callback receiving the progress as a fraction and a message.
+    :return: The clustering session.
+    """
+    params = scope_params(filter_scope)
+    key = digest([cache_version(app_config=app_config), params['author_id'], params['article_publication_dt']])
+    cache = sessions(app_config=app_config)
+
+    session = cache.get(key)
+    if session is not None:
+        return session
+
+    with _session_build_locks.acquire(key):
+        # Another thread might have built the session while we were waiting for the lock
+        session = cache.get(key)
+        if session is None:
+            session = build_session(app_config=app_config, filter_scope=filter_scope, progress=progress)
+            cache.put(key, session, size=session.nbytes())
+    return session
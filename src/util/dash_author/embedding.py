@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import Engine, text
+
+from src.util.dash_author.query import query_co_author_embeddings, query_co_authors
+from src.util.dash_common.app_config import AppConfig
+from src.util.postgres import pooled_connection, query_iter
+from src.util.redis import cache_version
+
+# Points to the files of the latest export, replaced last so readers never see a partial export
+MANIFEST = 'manifest.json'
+
+# Byte order collation, the same order as sorting the ids with NumPy
+EMBEDDINGS_SQL = """
+    SELECT author_id,
+           embedding_tensor_data::float8[] AS embedding_tensor_data
+    FROM author_embedding
+    ORDER BY author_id COLLATE "C"
+"""
+EMBEDDINGS_SHAPE_SQL = """
+    SELECT COUNT(*)                                              AS authors,
+           MAX(CARDINALITY(embedding_tensor_data::float8[]))     AS dimensions
+    FROM author_embedding
+"""
+
+
+class EmbeddingStore:
+    """
+    Author embeddings exported into one contiguous float32 matrix, memory mapped from a .npy file, with the sorted
+    author ids of its rows next to it. The pages of the matrix are shared by every worker through the OS page cache
+    and looking up the embeddings of a set of authors is a binary search and a single gather.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The directory holding the export.
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.author_ids = np.load(os.path.join(path, self.manifest['author_ids']))
+        self.embeddings = np.load(os.path.join(path, self.manifest['embeddings']), mmap_mode='r')
+
+    def positions(self, author_ids: np.ndarray) -> np.ndarray | None:
+        """
+        Get the rows of the given authors.
+        :param author_ids: The author ids.
+        :return: The row of every author or None if any author is missing from the export.
+        """
+        author_ids = np.asarray(author_ids).astype(str)
+        if len(self.author_ids) == 0:
+            return None if len(author_ids) else np.empty(0, dtype=np.int64)
+        positions = np.clip(np.searchsorted(self.author_ids, author_ids), 0, len(self.author_ids) - 1)
+        if not np.array_equal(self.author_ids[positions], author_ids):
+            return None
+        return positions
+
+    def get(self, author_ids: np.ndarray) -> np.ndarray | None:
+        """
+        Get the embeddings of the given authors.
+        :param author_ids: The author ids.
+        :return: The embedding matrix in the order of the author ids or None if any author is missing from the export.
+        """
+        positions = self.positions(author_ids=author_ids)
+        if positions is None:
+            return None
+        # Gather in file order, so the reads are sequential, and put the rows back in the order of the author ids
+        order = np.argsort(positions, kind='stable')
+        X = np.empty((len(positions), self.embeddings.shape[1]), dtype=np.float32)
+        X[order] = self.embeddings[positions[order]]
+        return X
+
+    @staticmethod
+    def write(path: str, chunks, n_rows: int, dimensions: int) -> dict:
+        """
+        Write an export and point the manifest to it, deleting the files of older exports.
+        :param path: The directory holding the export.
+        :param chunks: Iterable of (author ids, embedding matrix) pairs in order of the author ids.
+        :param n_rows: Number of authors.
+        :param dimensions: Number of embedding dimensions.
+        :return: The manifest of the export.
+        """
+        os.makedirs(path, exist_ok=True)
+        stamp = f"{time.strftime('%Y%m%d%H%M%S')}-{time.time_ns() % 10 ** 9:09d}"
+        manifest = dict(embeddings=f'embeddings-{stamp}.npy', author_ids=f'author_ids-{stamp}.npy',
+                        authors=n_rows, dimensions=dimensions)
+
+        embeddings = np.lib.format.open_memmap(os.path.join(path, manifest['embeddings']), mode='w+',
+                                               dtype=np.float32, shape=(n_rows, dimensions))
+        author_ids, row = list(), 0
+        for chunk_ids, chunk in chunks:
+            embeddings[row:row + len(chunk_ids)] = chunk
+            author_ids += list(chunk_ids)
+            row += len(chunk_ids)
+        embeddings.flush()
+        del embeddings
+
+        author_ids = np.array(author_ids, dtype=str)
+        if row != n_rows or np.any(author_ids[1:] <= author_ids[:-1]):
+            raise ValueError('The exported author ids are not unique and sorted')
+        np.save(os.path.join(path, manifest['author_ids']), author_ids)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(path, MANIFEST))
+
+        # Workers still mapping an older export keep reading it until they reopen the store
+        for file_name in os.listdir(path):
+            if file_name.startswith(('embeddings-', 'author_ids-')) \
+                    and file_name not in (manifest['embeddings'], manifest['author_ids']):
+                os.remove(os.path.join(path, file_name))
+        return manifest
+
+
+def export_embeddings(engine: Engine, path: str, chunk_size: int = 10000) -> dict:
+    """
+    Export every author embedding into the embedding store, streaming them from Postgres in chunks.
+    :param engine: SQLAlchemy engine
+    :param path: The directory holding the export.
+    :param chunk_size: Number of authors fetched at once.
+    :return: The manifest of the export.
+    """
+    with pooled_connection(engine=engine) as conn:
+        # The shape and the rows must come from the same snapshot
+        conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        with conn.begin():
+            n_rows, dimensions = conn.execute(text(EMBEDDINGS_SHAPE_SQL)).one()
+            chunks = ((batch['author_id'].tolist(), np.array(batch['embedding_tensor_data'].tolist(), dtype=np.float32))
+                      for batch in query_iter(conn=conn, query_str=EMBEDDINGS_SQL, batch_size=chunk_size))
+            return EmbeddingStore.write(path=path, chunks=chunks, n_rows=n_rows, dimensions=dimensions or 0)
+
+
+_store: dict = dict(version=None, store=None)
+_store_lock = threading.Lock()
+
+
+def embedding_store_path(app_config: AppConfig) -> str:
+    """
+    Get the directory of the embedding store.
+    :param app_config: The app_config.
+    :return: The directory.
+    """
+    return app_config.config.DASHBOARD.get('EMBEDDING_STORE_PATH', 'data/embeddings')
+
+
+def embedding_store(app_config: AppConfig) -> EmbeddingStore | None:
+    """
+    Get the embedding store, reopened when the data version changes so a new export is picked up.
+    :param app_config: The app_config.
+    :return: The embedding store or None if nothing was exported.
+    """
+    version = cache_version(app_config=app_config)
+    with _store_lock:
+        if _store['version'] != version:
+            path = embedding_store_path(app_config=app_config)
+            store = None
+            if os.path.exists(os.path.join(path, MANIFEST)):
+                try:
+                    store = EmbeddingStore(path=path)
+                except (OSError, ValueError, KeyError) as e:
+                    app_config.logger.warning(f"Could not open the embedding store: {e}")
+            _store.update(version=version, store=store)
+        return _store['store']
+
+
+def co_author_embeddings(app_config: AppConfig, filter_scope: dict) -> tuple:
+    """
+    Get the co-authors and their embeddings, gathered from the embedding store when every co-author was exported,
+    otherwise queried from Postgres.
+    :param app_config: The app_config.
+    :param filter_scope: The filter scope.
+    :return: The co-authors and the embedding matrix, one row per co-author.
+    """
+    store = embedding_store(app_config=app_config)
+    if store is not None:
+        co_authors = query_co_authors(app_config=app_config, filter_scope=filter_scope)
+        X = store.get(author_ids=co_authors['Author Id'].values)
+        if X is not None:
+            return co_authors, X
+
+    co_author_embedding_df = query_co_author_embeddings(app_config=app_config, filter_scope=filter_scope)
+    X = np.array(co_author_embedding_df['Embedding Tensor Data'].tolist())
+    return co_author_embedding_df.drop(columns=['Embedding Tensor Data']), X
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the author embedding store of the dashboard.')
+    parser.add_argument('command', choices=['export', 'show'])
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Number of authors fetched at once.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+
+    path = embedding_store_path(app_config=app_config)
+    if args.command == 'export':
+        manifest = export_embeddings(engine=app_config.pg_engine, path=path, chunk_size=args.chunk_size)
+        print(f"Exported {manifest['authors']} author embeddings to {path}.")
+    else:
+        store = EmbeddingStore(path=path)
+        print(json.dumps(store.manifest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from src.util.dash_author.visual import author_recommendations, co_author_clustering
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.common import build_filter_scope
+from src.util.jobs import job
+
+
+@job('author.co_author_clustering')
+def co_author_clustering_job(app_config: AppConfig,
+                             progress: callable,
+                             filter_params: dict,
+                             min_samples: int,
+                             min_cluster_size: int):
+    """
+    Cluster the co-authors of an author.
+    :param app_config: The app_config.
+    :param progress: Callback receiving the progress as a fraction and a message.
+    :param filter_params: The structured filter values.
+    :param min_samples: HDBSCAN min_samples.
+    :param min_cluster_size: HDBSCAN min_cluster_size.
+    :return: The clustering graph.
+    """
+    return co_author_clustering(app_config=app_config,
+                                filter_scope=build_filter_scope(params=filter_params),
+                                min_samples=min_samples,
+                                min_cluster_size=min_cluster_size,
+                                progress=progress)
+
+
+@job('author.recommendations')
+def author_recommendations_job(app_config: AppConfig,
+                               progress: callable,
+                               filter_params: dict):
+    """
+    Request new collaboration recommendations for an author.
+    :param app_config: The app_config.
+    :param progress: Callback receiving the progress as a fraction and a message.
+    :param filter_params: The structured filter values.
+    :return: The recommendations table.
+    """
+    progress(0.1, 'Requesting recommendations')
+    return author_recommendations(app_config=app_config, filter_scope=build_filter_scope(params=filter_params))
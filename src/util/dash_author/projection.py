@@ -0,0 +1,330 @@
+import argparse
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+
+from src.util.cache.key import digest
+from src.util.dash_author.embedding import co_author_embeddings
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.common import build_filter_scope
+from src.util.dash_common.filter import publication_period
+from src.util.dash_common.query import query_authors
+from src.util.redis import cache_version
+
+
+try:
+    import openTSNE
+except ImportError:
+    openTSNE = None
+
+try:
+    import umap
+except ImportError:
+    umap = None
+
+# Methods the layout engine picks from, in order of preference
+LAYOUT_METHODS = ['opentsne', 'tsne', 'umap', 'pca']
+
+# Rough wall time per point of every method on 256-dimensional embeddings, used to stay within the latency budget
+LAYOUT_SECONDS_PER_POINT = {
+    'opentsne': 4e-4,
+    'tsne': 3e-3,
+    'umap': 6e-4,
+    'pca': 1e-6,
+}
+
+# t-SNE settings tuned for interactive use: the early exaggeration phase shapes the clusters, the remaining
+# iterations mostly refine their position
+PERPLEXITY = 30
+EARLY_EXAGGERATION_ITER = 125
+N_ITER = 500
+
+
+def perplexity(n_points: int) -> float:
+    """
+    Clamp the t-SNE perplexity to the number of points, it has to stay below the number of neighbours available.
+    :param n_points: Number of points.
+    :return: The perplexity.
+    """
+    return float(max(1, min(PERPLEXITY, (n_points - 1) // 3)))
+
+
+def project_pca(X: np.ndarray) -> np.ndarray:
+    """
+    Project the embeddings to 2D using PCA.
+    :param X: The embedding matrix, one row per author.
+    :return: The 2D coordinates.
+    """
+    coords = np.zeros((X.shape[0], 2), dtype=np.float32)
+    n_components = min(2, X.shape[0], X.shape[1])
+    if X.shape[0] > 1:
+        coords[:, :n_components] = PCA(n_components=n_components, random_state=42).fit_transform(X)
+    return coords
+
+
+def project_tsne(X: np.ndarray, max_iter: int = 1000) -> np.ndarray:
+    """
+    Project the embeddings to 2D using the Barnes-Hut t-SNE of scikit-learn.
+    :param X: The embedding matrix, one row per author.
+    :param max_iter: Number of iterations.
+    :return: The 2D coordinates.
+    """
+    if X.shape[0] < 4:
+        return project_pca(X)
+    tsne = TSNE(
+        n_components=2,
+        random_state=42,
+        perplexity=perplexity(X.shape[0]),
+        max_iter=max_iter,
+        init='pca',
+        learning_rate='auto'
+    )
+    return tsne.fit_transform(X).astype(np.float32)
+
+
+def project_opentsne(X: np.ndarray) -> np.ndarray:
+    """
+    Project the embeddings to 2D using the FFT accelerated t-SNE of openTSNE, initialized with PCA.
+    :param X: The embedding matrix, one row per author.
+    :return: The 2D coordinates.
+    """
+    if X.shape[0] < 4:
+        return project_pca(X)
+    tsne = openTSNE.TSNE(
+        n_components=2,
+        perplexity=perplexity(X.shape[0]),
+        initialization='pca',
+        negative_gradient_method='fft',
+        early_exaggeration_iter=EARLY_EXAGGERATION_ITER,
+        n_iter=N_ITER,
+        n_jobs=-1,
+        random_state=42
+    )
+    return np.asarray(tsne.fit(X), dtype=np.float32)
+
+
+def project_umap(X: np.ndarray) -> np.ndarray:
+    """
+    Project the embeddings to 2D using UMAP.
+    :param X: The embedding matrix, one row per author.
+    :return: The 2D coordinates.
+    """
+    if X.shape[0] < 4:
+        return project_pca(X)
+    reducer = umap.UMAP(
+        n_components=2,
+        n_neighbors=min(15, X.shape[0] - 1),
+        init='pca',
+        random_state=42
+    )
+    return reducer.fit_transform(X).astype(np.float32)
+
+
+def available_layout_methods() -> list:
+    """
+    Get the layout methods whose dependencies are installed.
+    :return: The method names, in order of preference.
+    """
+    installed = dict(opentsne=openTSNE is not None, umap=umap is not None)
+    return [method for method in LAYOUT_METHODS if installed.get(method, True)]
+
+
+def choose_layout_method(n_points: int, budget: float | None = None) -> str:
+    """
+    Choose the preferred layout method expected to finish within the latency budget.
+    :param n_points: Number of points.
+    :param budget: Latency budget in seconds, None for no limit.
+    :return: The method name.
+    """
+    if n_points < 4:
+        return 'pca'
+    for method in available_layout_methods():
+        if budget is None or LAYOUT_SECONDS_PER_POINT[method] * n_points <= budget:
+            return method
+    return 'pca'
+
+
+def project(X: np.ndarray, method: str = 'auto', budget: float | None = None) -> np.ndarray:
+    """
+    Project the embeddings to 2D.
+    :param X: The embedding matrix, one row per author.
+    :param method: One of 'auto', 'opentsne', 'tsne', 'umap' or 'pca'. 'auto' chooses from the number of points and
+    the latency budget.
+    :param budget: Latency budget in seconds, None for no limit. Only used by 'auto'.
+    :return: The 2D coordinates.
+    """
+    if method == 'auto':
+        method = choose_layout_method(n_points=X.shape[0], budget=budget)
+    if method not in available_layout_methods():
+        raise ValueError(f"Layout method {method} is unknown or its dependency is not installed")
+
+    if method == 'opentsne':
+        return project_opentsne(X)
+    if method == 'tsne':
+        # Stay close to the interactive openTSNE settings when picked to meet a budget
+        return project_tsne(X, max_iter=N_ITER if budget is not None else 1000)
+    if method == 'umap':
+        return project_umap(X)
+    return project_pca(X)
+
+
+def layout_settings(app_config: AppConfig) -> dict:
+    """
+    Get the layout method and latency budget configured for the dashboard.
+    :param app_config: The app_config.
+    :return: Keyword arguments of project.
+    """
+    return dict(method=app_config.config.DASHBOARD.get('LAYOUT_METHOD', 'auto'),
+                budget=app_config.config.DASHBOARD.get('LAYOUT_BUDGET', 2.0))
+
+
+class ProjectionStore:
+    """
+    2D co-author coordinates per (author, publication period), stored as one small .npz file per key with the
+    co-author ids sorted next to their coordinates. Every data version has its own directory, so projections of older
+    embeddings are never served and are deleted together with the older cache entries.
+    """
+
+    def __init__(self, path: str, version: str):
+        """
+        :param path: The directory holding the projections.
+        :param version: The data version the projections are computed for.
+        """
+        self.path = path
+        self.version = version
+
+    def file_path(self, author_id: str, period: list) -> str:
+        """
+        Get the file of a projection.
+        :param author_id: The author id.
+        :param period: The first and the last year of the publication period.
+        :return: The file path.
+        """
+        return os.path.join(self.path, self.version, f"{digest([author_id, [int(year) for year in period]])}.npz")
+
+    def save(self, author_id: str, period: list, co_author_ids: np.ndarray, coords: np.ndarray) -> None:
+        """
+        Save a projection, replacing the file atomically so concurrent readers never see a partial one.
+        :param author_id: The author id.
+        :param period: The first and the last year of the publication period.
+        :param co_author_ids: The co-author ids, one per row of the coordinates.
+        :param coords: The 2D coordinates.
+        """
+        co_author_ids = np.asarray(co_author_ids).astype(str)
+        order = np.argsort(co_author_ids)
+        directory = os.path.join(self.path, self.version)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, co_author_ids=co_author_ids[order], coords=np.asarray(coords, dtype=np.float32)[order])
+        os.replace(tmp_path, self.file_path(author_id=author_id, period=period))
+
+    def load(self, author_id: str, period: list, co_author_ids: np.ndarray) -> np.ndarray | None:
+        """
+        Load the coordinates of the given co-authors.
+        :param author_id: The author id.
+        :param period: The first and the last year of the publication period.
+        :param co_author_ids: The co-author ids to get the coordinates for.
+        :return: The coordinates in the order of the co-author ids or None if the projection is missing or was
+        computed for a different set of co-authors.
+        """
+        file_path = self.file_path(author_id=author_id, period=period)
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as projection:
+            stored_ids, coords = projection['co_author_ids'], projection['coords']
+
+        co_author_ids = np.asarray(co_author_ids).astype(str)
+        if len(stored_ids) != len(co_author_ids):
+            return None
+        positions = np.searchsorted(stored_ids, co_author_ids)
+        positions = np.clip(positions, 0, len(stored_ids) - 1)
+        if not np.array_equal(stored_ids[positions], co_author_ids):
+            return None
+        return coords[positions]
+
+    def purge(self) -> int:
+        """
+        Delete the projections of every other data version.
+        :return: The number of deleted files.
+        """
+        deleted = 0
+        if not os.path.isdir(self.path):
+            return deleted
+        for version in os.listdir(self.path):
+            directory = os.path.join(self.path, version)
+            if version == self.version or not os.path.isdir(directory):
+                continue
+            deleted += len(os.listdir(directory))
+            shutil.rmtree(directory, ignore_errors=True)
+        return deleted
+
+
+def projection_store(app_config: AppConfig, version: str | None = None) -> ProjectionStore:
+    """
+    Get the projection store configured for the dashboard.
+    :param app_config: The app_config.
+    :param version: The data version, defaults to the current one.
+    :return: The projection store.
+    """
+    return ProjectionStore(path=app_config.config.DASHBOARD.get('PROJECTION_STORE_PATH', 'data/projections'),
+                           version=version or cache_version(app_config=app_config))
+
+
+def build_projections(app_config: AppConfig,
+                      author_ids: list,
+                      period: list,
+                      workers: int = 4) -> dict:
+    """
+    Compute the co-author projections of many authors in bulk across a process pool and save them to the store.
+    :param app_config: The app_config.
+    :param author_ids: The author ids.
+    :param period: The first and the last year of the publication period.
+    :param workers: Number of processes.
+    :return: Summary of the build.
+    """
+    store = projection_store(app_config=app_config)
+    built, failed = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = dict()
+        for author_id in author_ids:
+            filter_scope = build_filter_scope(params=dict(author_id=[author_id], article_publication_dt=period))
+            co_authors, X = co_author_embeddings(app_config=app_config, filter_scope=filter_scope)
+            # Offline builds are not bound by the interactive latency budget
+            future = executor.submit(project, X, method=layout_settings(app_config=app_config)['method'])
+            futures[future] = (author_id, co_authors['Author Id'].values)
+
+        for future in as_completed(futures):
+            author_id, co_author_ids = futures[future]
+            try:
+                store.save(author_id=author_id, period=period, co_author_ids=co_author_ids, coords=future.result())
+                built += 1
+            except Exception as e:
+                failed += 1
+                app_config.logger.warning(f"Projection of author {author_id} failed: {e}")
+
+    return dict(built=built, failed=failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the co-author projections of the author page.')
+    parser.add_argument('--authors', type=int, default=100, help='Number of top authors to compute projections for.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+
+    author_ids = query_authors(app_config=app_config)['Author Id'].head(args.authors).tolist()
+    print(build_projections(app_config=app_config,
+                            author_ids=author_ids,
+                            period=publication_period(),
+                            workers=args.workers))
+
+
+if __name__ == '__main__':
+    main()
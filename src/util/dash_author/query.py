@@ -1,7 +1,8 @@
 import pandas as pd
 
+from src.util.cache.key import digest, scope_params
 from src.util.dash_common.app_config import AppConfig
-from src.util.dash_common.common import cols_to_title
+from src.util.dash_common.common import cols_to_title, literal, quote
 from src.util.redis import redis_query
 
 
@@ -44,49 +45,176 @@ def query_cards(app_config: AppConfig,
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='author.cards',
+                       params=scope_params(filter_scope))
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
     return data
 
 
-def query_published_articles(app_config: AppConfig,
-                             filter_scope: dict) -> pd.DataFrame:
+# SQL column and kind of every column of the published articles table, used to sort and filter it in the database
+PUBLISHED_ARTICLE_COLUMNS = {
+    'Publication Year': ('publication_year', 'number'),
+    'Research Area': ('research_area', 'text'),
+    'Article Title': ('article_title', 'text'),
+    'Citations': ('citations', 'number'),
+    'Collaboration Novelty Index': ('collaboration_novelty_index', 'number'),
+}
+
+
+def published_articles_sql(filter_scope: dict) -> str:
     """
-    Get the published articles.
+    Get the query of the published articles of an author, one row per article. The articles of the author are made
+    distinct before the join, so filters on the outer query are pushed down into the join.
     :param filter_scope: The filter scope.
-    :param app_config: The app_config.
-    :return: The published articles.
+    :return: The query.
     """
-    query_str = f"""
-        WITH filtered_data AS (SELECT *
-                               FROM fct_collaboration
-                               WHERE {filter_scope['author_id']}
-                                 AND {filter_scope['article_publication_dt']})
-        SELECT DISTINCT a.article_doi,
-                        ra.research_area_name                       AS research_area,
-                        a.article_title,
-                        f.article_citation_count                    AS citations,
-                        f.collaboration_novelty_index,
-                        DATE_PART('year', a.article_publication_dt) AS publication_year
-        FROM filtered_data c
+    return f"""
+        WITH author_articles AS (SELECT DISTINCT article_id
+                                 FROM fct_collaboration
+                                 WHERE {filter_scope['author_id']}
+                                   AND {filter_scope['article_publication_dt']})
+        SELECT a.article_id,
+               a.article_doi,
+               ra.research_area_name                       AS research_area,
+               a.article_title,
+               f.article_citation_count                    AS citations,
+               f.collaboration_novelty_index,
+               DATE_PART('year', a.article_publication_dt) AS publication_year
+        FROM author_articles c
                  INNER JOIN dim_article a
                             ON c.article_id = a.article_id
                  INNER JOIN fct_article f
                             ON c.article_id = f.article_id
                  INNER JOIN dim_research_area ra
                             ON ra.research_area_code = f.research_area_code
-        ORDER BY DATE_PART('year', a.article_publication_dt) DESC
+    """
+
+
+def sort_key_sql(column: str, kind: str) -> str:
+    """
+    Get the sort expression of a column. Missing values are replaced, so row comparisons of the keyset pagination never
+    compare to NULL.
+    :param column: The SQL column.
+    :param kind: 'number' or 'text'.
+    :return: The sort expression.
+    """
+    return f"COALESCE({column}, -1)" if kind == 'number' else f"COALESCE({column}, '')"
+
+
+def query_published_articles_page(app_config: AppConfig,
+                                  filter_scope: dict,
+                                  conditions: list,
+                                  sort_by: list,
+                                  page_current: int,
+                                  page_size: int,
+                                  cursor: dict | None = None) -> tuple:
+    """
+    Get one page of the published articles. Pages next to the previously shown one are read with keyset pagination
+    from the cursor, any other page falls back to OFFSET.
+    :param app_config: The app_config.
+    :param filter_scope: The filter scope.
+    :param conditions: SQL conditions of the table filter.
+    :param sort_by: The sort_by property of the table, only the first column is used.
+    :param page_current: The zero-based page number.
+    :param page_size: Number of rows per page.
+    :param cursor: The cursor returned with the previously shown page.
+    :return: The page and the cursor of the page.
+    """
+    # Sort by the requested column with the article id as the tie breaker, so the order is total
+    column_id = sort_by[0]['column_id'] if sort_by and sort_by[0]['column_id'] in PUBLISHED_ARTICLE_COLUMNS \
+        else 'Publication Year'
+    descending = sort_by[0]['direction'] == 'desc' if sort_by else True
+    column, kind = PUBLISHED_ARTICLE_COLUMNS[column_id]
+    sort_key = sort_key_sql(column=column, kind=kind)
+
+    # The cursor is only valid for the scope, filter and order it was built for
+    scope = digest([scope_params(filter_scope), conditions, column_id, descending, 'article_id'])
+    cursor = cursor if cursor and cursor.get('scope') == scope else None
+
+    conditions = list(conditions)
+    offset, reverse = page_current * page_size, False
+    try:
+        if cursor and cursor['page'] == page_current - 1 and cursor['last']:
+            # Next page: the rows after the last row of the shown page
+            operator = '<' if descending else '>'
+            conditions.append(f"({sort_key}, article_id) {operator} "
+                              f"({literal(cursor['last'][0], kind)}, {quote(str(cursor['last'][1]))})")
+            offset = 0
+        elif cursor and cursor['page'] == page_current + 1 and cursor['first']:
+            # Previous page: the rows before the first row of the shown page, read backwards
+            operator = '>' if descending else '<'
+            conditions.append(f"({sort_key}, article_id) {operator} "
+                              f"({literal(cursor['first'][0], kind)}, {quote(str(cursor['first'][1]))})")
+            offset, reverse = 0, True
+    except (KeyError, IndexError, TypeError, ValueError):
+        # Malformed cursor, read the page with OFFSET
+        pass
+
+    direction = 'DESC' if descending != reverse else 'ASC'
+    # A plain subquery, so the table filter and the keyset condition are applied before the rows are sorted
+    query_str = f"""
+        SELECT article_id,
+               article_doi,
+               research_area,
+               article_title,
+               citations,
+               collaboration_novelty_index,
+               publication_year,
+               {sort_key} AS sort_key
+        FROM ({published_articles_sql(filter_scope=filter_scope)}) articles
+        WHERE {' AND '.join(conditions) if conditions else 'TRUE'}
+        ORDER BY {sort_key} {direction}, article_id {direction}
+        LIMIT {int(page_size)} OFFSET {int(offset)}
     """
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='author.published_articles_page',
+                       params=dict(scope_params(filter_scope),
+                                   conditions=conditions,
+                                   sort=[column_id, descending, reverse],
+                                   page_size=page_size,
+                                   offset=offset))
+    if reverse:
+        data = data.iloc[::-1].reset_index(drop=True)
+
+    page_cursor = dict(scope=scope, page=page_current, first=None, last=None)
+    if len(data) > 0:
+        page_cursor['first'] = [data['sort_key'].iloc[0], data['article_id'].iloc[0]]
+        page_cursor['last'] = [data['sort_key'].iloc[-1], data['article_id'].iloc[-1]]
 
     # Turn column names from snake case to title case and replace underscores with spaces
+    data = data.drop(columns=['sort_key', 'article_id'])
     data.columns = cols_to_title(data.columns)
-    return data
+    return data, page_cursor
+
+
+def query_published_articles_count(app_config: AppConfig,
+                                   filter_scope: dict,
+                                   conditions: list) -> int:
+    """
+    Count the published articles matching the table filter.
+    :param app_config: The app_config.
+    :param filter_scope: The filter scope.
+    :param conditions: SQL conditions of the table filter.
+    :return: The number of articles.
+    """
+    query_str = f"""
+        SELECT COUNT(*) AS articles
+        FROM ({published_articles_sql(filter_scope=filter_scope)}) articles
+        WHERE {' AND '.join(conditions) if conditions else 'TRUE'}
+    """
+
+    # Fetch the data
+    data = redis_query(app_config=app_config,
+                       query_str=query_str,
+                       template_id='author.published_articles_count',
+                       params=dict(scope_params(filter_scope), conditions=conditions))
+    return int(data['articles'].iloc[0])
 
 
 def query_co_author_embeddings(app_config: AppConfig,
@@ -118,7 +246,47 @@ def query_co_author_embeddings(app_config: AppConfig,
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='author.co_author_embeddings',
+                       params=scope_params(filter_scope))
+
+    # Turn column names from snake case to title case and replace underscores with spaces
+    data.columns = cols_to_title(data.columns)
+    return data
+
+
+def query_co_authors(app_config: AppConfig,
+                     filter_scope: dict) -> pd.DataFrame:
+    """
+    Get the co-authors having an embedding, without the embeddings themselves, which are read from the embedding
+    store.
+    :param filter_scope: The filter scope.
+    :param app_config: The app_config.
+    :return: The co-authors.
+    """
+    query_str = f"""
+        WITH filtered_data AS (SELECT *
+                               FROM fct_collaboration
+                               WHERE {filter_scope['author_id']}
+                                    AND {filter_scope['article_publication_dt']}),
+             co_authors AS (SELECT DISTINCT c2.author_id
+                            FROM filtered_data c1
+                                     INNER JOIN fct_collaboration c2
+                                                ON c1.article_id = c2.article_id)
+        SELECT c.author_id,
+               a.author_name
+        FROM co_authors c
+                 INNER JOIN dim_author a
+                            ON a.author_id = c.author_id
+                 INNER JOIN author_embedding e
+                            ON a.author_id = e.author_id
+    """
+
+    # Fetch the data
+    data = redis_query(app_config=app_config,
+                       query_str=query_str,
+                       template_id='author.co_authors',
+                       params=scope_params(filter_scope))
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -151,7 +319,9 @@ def query_articles_by_research_area(app_config: AppConfig,
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='author.articles_by_research_area',
+                       params=dict(scope_params(filter_scope), k=k))
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -184,7 +354,9 @@ def query_articles_by_keyword(app_config: AppConfig,
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='author.articles_by_keyword',
+                       params=dict(scope_params(filter_scope), k=k))
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -206,7 +378,9 @@ def query_recommended_co_authors(app_config: AppConfig, co_author_filter: str) -
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='author.recommended_co_authors',
+                       params=dict(co_author_filter=co_author_filter))
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
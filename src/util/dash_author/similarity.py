@@ -0,0 +1,450 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from src.util.dash_author.embedding import EmbeddingStore, embedding_store
+from src.util.dash_author.query import query_co_authors
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.common import build_filter_scope
+from src.util.dash_common.filter import publication_period
+from src.util.redis import cache_version
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Points to the files of the latest saved index, replaced last so readers never see a partial index
+MANIFEST = 'manifest.json'
+
+# HNSW graph degree and candidate list sizes, recall above 0.95 at k=10 on author embeddings
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF = 64
+
+
+def normalize(X: np.ndarray) -> np.ndarray:
+    """
+    Scale the rows of a matrix to unit length, so the inner product is the cosine similarity.
+    :param X: The matrix.
+    :return: The normalized float32 matrix, zero rows stay zero.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.where(norms > 0, norms, 1)
+
+
+def top_similar(scores: np.ndarray, author_ids: np.ndarray, k: int, exclude: set = frozenset()) -> list:
+    """
+    Get the authors with the highest cosine similarity.
+    :param scores: The cosine similarity of every author.
+    :param author_ids: The author ids, one per score.
+    :param k: Number of authors.
+    :param exclude: Author ids left out of the result.
+    :return: Pairs of author id and cosine similarity, most similar first.
+    """
+    n = len(scores)
+    # Take enough candidates to still have k of them after leaving out the excluded authors
+    n_candidates = min(n, k + len(exclude))
+    if n_candidates <= 0:
+        return list()
+    labels = np.argpartition(-scores, n_candidates - 1)[:n_candidates] if n_candidates < n else np.arange(n)
+    labels = labels[np.argsort(-scores[labels], kind='stable')]
+
+    result = list()
+    for label, similarity in zip(labels.tolist(), scores[labels].tolist()):
+        author_id = str(author_ids[label])
+        if author_id not in exclude:
+            result.append((author_id, similarity))
+            if len(result) == k:
+                break
+    return result
+
+
+class SimilarityIndex:
+    """
+    Cosine similarity search over author embeddings. Uses an HNSW graph when hnswlib is installed, otherwise an exact
+    brute force search over the normalized embedding matrix. Authors are labeled by their position in the index, so
+    new authors are appended without rebuilding the index.
+    """
+
+    def __init__(self, author_ids: np.ndarray, X: np.ndarray, method: str = 'auto', ef: int = HNSW_EF,
+                 capacity: int = 0):
+        """
+        :param author_ids: The author ids, one per row of the embedding matrix.
+        :param X: The embedding matrix.
+        :param method: 'hnsw', 'brute' or 'auto' to use HNSW when hnswlib is installed.
+        :param ef: Size of the HNSW candidate list when querying, higher is slower with better recall.
+        :param capacity: Number of authors to allocate room for up front, e.g. when the rest is added in chunks.
+        """
+        if method == 'auto':
+            method = 'hnsw' if hnswlib is not None else 'brute'
+        if method == 'hnsw' and hnswlib is None:
+            raise ImportError('hnswlib is not installed')
+
+        self.method = method
+        self.ef = ef
+        self.dimensions = X.shape[1]
+        self.author_ids = np.empty(0, dtype=str)
+        self.labels: dict = dict()
+        self.vectors = None
+        self.hnsw = None
+        self.lock = threading.Lock()
+        capacity = max(len(author_ids), capacity, 1)
+        if method == 'hnsw':
+            self.hnsw = hnswlib.Index(space='ip', dim=self.dimensions)
+            self.hnsw.init_index(max_elements=capacity, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        else:
+            self.vectors = np.empty((capacity, self.dimensions), dtype=np.float32)
+        self.add(author_ids=author_ids, X=X)
+
+    def __len__(self) -> int:
+        return len(self.author_ids)
+
+    def add(self, author_ids: np.ndarray, X: np.ndarray) -> int:
+        """
+        Add the embeddings of authors missing from the index.
+        :param author_ids: The author ids, one per row of the embedding matrix.
+        :param X: The embedding matrix.
+        :return: Number of added authors.
+        """
+        author_ids = np.asarray(author_ids).astype(str)
+        new = np.array([author_id not in self.labels for author_id in author_ids], dtype=bool)
+        if not new.any():
+            return 0
+        author_ids, X = author_ids[new], normalize(np.asarray(X)[new])
+
+        with self.lock:
+            labels = np.arange(len(self.author_ids), len(self.author_ids) + len(author_ids))
+            size = int(labels[-1]) + 1
+            if self.hnsw is not None:
+                if self.hnsw.get_max_elements() < size:
+                    # Grow in steps, so adding a few authors at a time does not resize the graph every time
+                    self.hnsw.resize_index(max(size, int(self.hnsw.get_max_elements() * 1.25)))
+                self.hnsw.add_items(X, labels)
+            else:
+                if len(self.vectors) < size:
+                    vectors = np.empty((max(size, int(len(self.vectors) * 1.25)), self.dimensions), dtype=np.float32)
+                    vectors[:len(self.author_ids)] = self.vectors[:len(self.author_ids)]
+                    self.vectors = vectors
+                self.vectors[labels[0]:size] = X
+            self.author_ids = np.concatenate([self.author_ids, author_ids])
+            self.labels.update(zip(author_ids.tolist(), labels.tolist()))
+        return len(author_ids)
+
+    def vector(self, author_id: str) -> np.ndarray | None:
+        """
+        Get the normalized embedding of an author.
+        :param author_id: The author id.
+        :return: The embedding or None if the author is not in the index.
+        """
+        label = self.labels.get(author_id)
+        if label is None:
+            return None
+        return self.vectors_at(labels=np.array([label]))[0]
+
+    def vectors_at(self, labels: np.ndarray) -> np.ndarray:
+        """
+        Get the normalized embeddings of authors by their position in the index.
+        :param labels: The positions.
+        :return: The embedding matrix in the order of the positions.
+        """
+        if self.hnsw is not None:
+            with self.lock:
+                return np.asarray(self.hnsw.get_items(np.asarray(labels).tolist()), dtype=np.float32)
+        return np.asarray(self.vectors[labels])
+
+    def query(self, vector: np.ndarray, k: int, exclude: set = frozenset()) -> list:
+        """
+        Get the most similar authors to an embedding.
+        :param vector: The embedding.
+        :param k: Number of authors.
+        :param exclude: Author ids left out of the result.
+        :return: Pairs of author id and cosine similarity, most similar first.
+        """
+        n = len(self)
+        if n == 0 or k <= 0:
+            return list()
+        vector = normalize(np.asarray(vector).reshape(1, -1))
+        if self.hnsw is None:
+            return top_similar(scores=self.vectors[:n] @ vector[0], author_ids=self.author_ids, k=k, exclude=exclude)
+
+        # Ask for enough neighbours to still have k of them after leaving out the excluded authors
+        n_neighbours = min(n, k + len(exclude))
+        with self.lock:
+            self.hnsw.set_ef(max(self.ef, n_neighbours))
+            labels, distances = self.hnsw.knn_query(vector, k=n_neighbours)
+        result = list()
+        for label, distance in zip(labels[0].tolist(), distances[0].tolist()):
+            author_id = str(self.author_ids[label])
+            if author_id not in exclude:
+                result.append((author_id, 1 - distance))
+                if len(result) == k:
+                    break
+        return result
+
+    def similar_authors(self, author_id: str, k: int, exclude: set = frozenset()) -> list:
+        """
+        Get the most similar authors to an author.
+        :param author_id: The author id.
+        :param k: Number of authors.
+        :param exclude: Author ids left out of the result, the author itself is always left out.
+        :return: Pairs of author id and cosine similarity, most similar first, empty if the author is not in the index.
+        """
+        vector = self.vector(author_id=author_id)
+        if vector is None:
+            return list()
+        return self.query(vector=vector, k=k, exclude=set(exclude) | {author_id})
+
+    def save(self, path: str) -> dict:
+        """
+        Save the index and point the manifest to it, deleting the files of older indexes.
+        :param path: The directory holding the index.
+        :return: The manifest of the index.
+        """
+        os.makedirs(path, exist_ok=True)
+        stamp = f"{time.strftime('%Y%m%d%H%M%S')}-{time.time_ns() % 10 ** 9:09d}"
+        manifest = dict(method=self.method, author_ids=f'author_ids-{stamp}.npy', authors=len(self),
+                        dimensions=self.dimensions)
+        with self.lock:
+            np.save(os.path.join(path, manifest['author_ids']), self.author_ids)
+            if self.hnsw is not None:
+                manifest['hnsw'] = f'hnsw-{stamp}.bin'
+                self.hnsw.save_index(os.path.join(path, manifest['hnsw']))
+            else:
+                manifest['vectors'] = f'vectors-{stamp}.npy'
+                np.save(os.path.join(path, manifest['vectors']), self.vectors[:len(self)])
+
+        fd, tmp_path = tempfile.mkstemp(dir=path, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(path, MANIFEST))
+
+        current = {manifest['author_ids'], manifest.get('vectors'), manifest.get('hnsw')}
+        for file_name in os.listdir(path):
+            if file_name.startswith(('author_ids-', 'vectors-', 'hnsw-')) and file_name not in current:
+                os.remove(os.path.join(path, file_name))
+        return manifest
+
+    @classmethod
+    def load(cls, path: str, ef: int = HNSW_EF) -> 'SimilarityIndex':
+        """
+        Load a saved index.
+        :param path: The directory holding the index.
+        :param ef: Size of the HNSW candidate list when querying.
+        :return: The index.
+        """
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+
+        index = cls.__new__(cls)
+        index.method = manifest['method']
+        index.ef = ef
+        index.dimensions = manifest['dimensions']
+        index.author_ids = np.load(os.path.join(path, manifest['author_ids']))
+        index.labels = {author_id: label for label, author_id in enumerate(index.author_ids.tolist())}
+        index.vectors = None
+        index.hnsw = None
+        index.lock = threading.Lock()
+        if index.method == 'hnsw':
+            if hnswlib is None:
+                raise ImportError('hnswlib is not installed')
+            index.hnsw = hnswlib.Index(space='ip', dim=index.dimensions)
+            index.hnsw.load_index(os.path.join(path, manifest['hnsw']), max_elements=manifest['authors'])
+        else:
+            # Memory mapped, so the pages are shared by every worker, adding authors copies it into memory
+            index.vectors = np.load(os.path.join(path, manifest['vectors']), mmap_mode='r')
+        return index
+
+
+class StoreSearch:
+    """
+    Exact cosine similarity search straight over the memory mapped matrix of the embedding store, used when no index
+    was saved. Nothing is copied into the worker, the rows are read in chunks from the OS page cache.
+    """
+
+    def __init__(self, store: EmbeddingStore, chunk_size: int = 50000):
+        """
+        :param store: The embedding store.
+        :param chunk_size: Number of authors scored at once.
+        """
+        self.store = store
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return len(self.store.author_ids)
+
+    def similar_authors(self, author_id: str, k: int, exclude: set = frozenset()) -> list:
+        """
+        Get the most similar authors to an author.
+        :param author_id: The author id.
+        :param k: Number of authors.
+        :param exclude: Author ids left out of the result, the author itself is always left out.
+        :return: Pairs of author id and cosine similarity, most similar first, empty if the author was not exported.
+        """
+        X = self.store.get(author_ids=[author_id])
+        if X is None or k <= 0:
+            return list()
+        vector = normalize(X)[0]
+        embeddings = self.store.embeddings
+        scores = np.empty(len(embeddings), dtype=np.float32)
+        for start in range(0, len(embeddings), self.chunk_size):
+            scores[start:start + self.chunk_size] = normalize(embeddings[start:start + self.chunk_size]) @ vector
+        return top_similar(scores=scores, author_ids=self.store.author_ids, k=k, exclude=set(exclude) | {author_id})
+
+
+def build_index(store: EmbeddingStore, method: str = 'auto', chunk_size: int = 50000) -> SimilarityIndex:
+    """
+    Build the similarity index over every author of the embedding store.
+    :param store: The embedding store.
+    :param method: 'hnsw', 'brute' or 'auto'.
+    :param chunk_size: Number of authors added at once.
+    :return: The index.
+    """
+    index = SimilarityIndex(author_ids=store.author_ids[:chunk_size], X=store.embeddings[:chunk_size], method=method,
+                            capacity=len(store.author_ids))
+    update_index(index=index, store=store, chunk_size=chunk_size)
+    return index
+
+
+def update_index(index: SimilarityIndex, store: EmbeddingStore, chunk_size: int = 50000) -> int:
+    """
+    Add the authors of the embedding store missing from the index, e.g. after a warehouse load.
+    :param index: The index.
+    :param store: The embedding store.
+    :param chunk_size: Number of authors added at once.
+    :return: Number of added authors.
+    """
+    added = 0
+    for start in range(0, len(store.author_ids), chunk_size):
+        added += index.add(author_ids=store.author_ids[start:start + chunk_size],
+                           X=store.embeddings[start:start + chunk_size])
+    return added
+
+
+def index_matches(index: SimilarityIndex, store: EmbeddingStore, chunk_size: int = 50000) -> bool:
+    """
+    Check whether the authors of the index still have the same embeddings in the embedding store, so the index can be
+    updated by adding the missing authors.
+    :param index: The index.
+    :param store: The embedding store.
+    :param chunk_size: Number of authors compared at once.
+    :return: False if the dimensions changed, authors were removed from the store or their embeddings changed.
+    """
+    if index.dimensions != store.embeddings.shape[1]:
+        return False
+    for start in range(0, len(index), chunk_size):
+        labels = np.arange(start, min(start + chunk_size, len(index)))
+        X = store.get(author_ids=index.author_ids[labels])
+        if X is None or not np.allclose(index.vectors_at(labels=labels), normalize(X), atol=1e-6):
+            return False
+    return True
+
+
+_index: dict = dict(version=None, index=None)
+_index_lock = threading.Lock()
+
+
+def similarity_index_path(app_config: AppConfig) -> str:
+    """
+    Get the directory of the similarity index.
+    :param app_config: The app_config.
+    :return: The directory.
+    """
+    return app_config.config.DASHBOARD.get('SIMILARITY_INDEX_PATH', 'data/similarity')
+
+
+def save_index(store: EmbeddingStore, path: str, method: str = 'auto', rebuild: bool = False) -> tuple:
+    """
+    Add the authors of the embedding store missing from the saved index, or build it from scratch, and save it. The
+    saved index is rebuilt as well if authors were removed from the store or their embeddings changed.
+    :param store: The embedding store.
+    :param path: The directory holding the index.
+    :param method: 'hnsw', 'brute' or 'auto', only used when the index is built from scratch.
+    :param rebuild: Build the index from scratch even if one was saved.
+    :return: The index and the number of added authors.
+    """
+    index = None
+    if not rebuild and os.path.exists(os.path.join(path, MANIFEST)):
+        index = SimilarityIndex.load(path=path)
+        if not index_matches(index=index, store=store):
+            # Stale authors cannot be removed from or replaced in the index, only appended to it
+            method = index.method
+            index = None
+    if index is None:
+        index = build_index(store=store, method=method)
+        added = len(index)
+    else:
+        added = update_index(index=index, store=store)
+    index.save(path=path)
+    return index, added
+
+
+def similarity_index(app_config: AppConfig) -> SimilarityIndex | StoreSearch | None:
+    """
+    Get the saved similarity index, reloaded when the data version changes. The index is only built and saved from the
+    command line, without one the authors of the embedding store are searched exactly.
+    :param app_config: The app_config.
+    :return: The index or None if neither an index nor an embedding store is available.
+    """
+    version = cache_version(app_config=app_config)
+    with _index_lock:
+        if _index['version'] != version:
+            path = similarity_index_path(app_config=app_config)
+            index = None
+            if os.path.exists(os.path.join(path, MANIFEST)):
+                try:
+                    index = SimilarityIndex.load(path=path, ef=app_config.config.DASHBOARD.get('SIMILARITY_EF',
+                                                                                            HNSW_EF))
+                except (ImportError, OSError, ValueError, KeyError, RuntimeError) as e:
+                    app_config.logger.warning(f"Could not load the similarity index: {e}")
+            store = embedding_store(app_config=app_config)
+            if index is None and store is not None:
+                index = StoreSearch(store=store)
+            _index.update(version=version, index=index)
+        return _index['index']
+
+
+def similar_authors(app_config: AppConfig, author_id: str, k: int = 10) -> list:
+    """
+    Get the most similar authors to an author that are not already co-authors.
+    :param app_config: The app_config.
+    :param author_id: The author id.
+    :param k: Number of authors.
+    :return: The ids of the similar authors, most similar first, empty without a similarity index.
+    """
+    index = similarity_index(app_config=app_config)
+    if index is None:
+        return list()
+    co_authors = query_co_authors(app_config=app_config,
+                                  filter_scope=build_filter_scope(params=dict(author_id=[author_id],
+                                                                              article_publication_dt=publication_period())))
+    return [similar_id for similar_id, _ in index.similar_authors(author_id=author_id,
+                                                                   k=k,
+                                                                   exclude=set(co_authors['Author Id'].astype(str)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the author similarity index of the dashboard.')
+    parser.add_argument('command', choices=['build', 'update'],
+                        help='Build the index from scratch or add the authors missing from it.')
+    parser.add_argument('--method', choices=['auto', 'hnsw', 'brute'], default='auto')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+    from src.util.dash_author.embedding import embedding_store_path
+
+    index, added = save_index(store=EmbeddingStore(path=embedding_store_path(app_config=app_config)),
+                              path=similarity_index_path(app_config=app_config),
+                              method=args.method,
+                              rebuild=args.command == 'build')
+    print(f"Added {added} authors, the index holds {len(index)} authors.")
+
+
+if __name__ == '__main__':
+    main()
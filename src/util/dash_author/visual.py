@@ -1,18 +1,21 @@
-import hdbscan
 import numpy as np
 import plotly.express as px
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import requests
 
 from dash import dash_table, dcc, html
-from sklearn.manifold import TSNE
 
+from src.util.dash_author.clustering import clustering_session
+from src.util.dash_author.similarity import similar_authors
 from src.util.dash_author.query import (
-    query_articles_by_keyword, query_articles_by_research_area, query_cards,
-    query_co_author_embeddings, query_published_articles, query_recommended_co_authors
+    PUBLISHED_ARTICLE_COLUMNS, query_articles_by_keyword, query_articles_by_research_area, query_cards,
+    query_published_articles_count, query_published_articles_page, query_recommended_co_authors
 )
+from src.util.cache.key import scope_params
 from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.common import quote, table_filter_conditions
+from src.util.dash_common.transform import markdown_links, round_columns
+from src.util.recommender import RecommenderUnavailable
 
 
 def create_card(value: float,
@@ -54,38 +57,25 @@ def cards_base_metrics(app_config: AppConfig,
 
 
 def published_articles(app_config: AppConfig,
-                       filter_scope: dict):
+                       page_size: int = 10) -> dash_table.DataTable:
     """
-    Get the published articles table.
+    Get the published articles table. The table is paged, sorted and filtered in the database, its rows are filled
+    page by page with published_articles_page.
     :param app_config:
-    :param filter_scope: The filter scope
+    :param page_size: Number of rows per page
     :return:
     """
-
-    published_articles_df = query_published_articles(app_config=app_config,
-                                                     filter_scope=filter_scope)
-
-    # Visualize a table visualization of articles grouped by PUBLICATION_YEAR
-    published_articles_df['Article Title'] = published_articles_df.apply(
-        lambda row: f"[{row['Article Title']}](https://doi.org/{row['Article Doi']})", axis=1
-    )
-    # Format collaboration novelty index to 2 decimal places
-    published_articles_df['Collaboration Novelty Index'] = published_articles_df['Collaboration Novelty Index'].apply(
-        lambda x: round(x, 2))
-    published_articles_df['Citations'] = published_articles_df['Citations'].apply(
-        lambda x: round(x, 5))
-    # Remove DOI column
-    published_articles_df.drop(columns=['Article Doi'], inplace=True)
-
-    # Create the Dash DataTable with the updated data
+    # Create the Dash DataTable, the rows are filled by the page callback
     return dash_table.DataTable(
-        data=published_articles_df.to_dict('records'),
+        id='published-articles-table',
+        data=[],
+        # Column types decide the default operator of the filter, e.g. '=' for numbers and 'contains' for text
         columns=[
-            {"name": "Publication Year", "id": "Publication Year"},
-            {"name": "Research Area", "id": "Research Area"},
-            {"name": "Article Title", "id": "Article Title", "presentation": "markdown"},
-            {"name": "Citations", "id": "Citations"},
-            {"name": "Collaboration Novelty Index", "id": "Collaboration Novelty Index"},
+            {"name": "Publication Year", "id": "Publication Year", "type": "numeric"},
+            {"name": "Research Area", "id": "Research Area", "type": "text"},
+            {"name": "Article Title", "id": "Article Title", "type": "text", "presentation": "markdown"},
+            {"name": "Citations", "id": "Citations", "type": "numeric"},
+            {"name": "Collaboration Novelty Index", "id": "Collaboration Novelty Index", "type": "numeric"},
         ],
         style_table={
             'width': '100%',  # Ensure the table width is 100% of its container
@@ -119,62 +109,100 @@ def published_articles(app_config: AppConfig,
                 'maxWidth': '800px',
             },
         ],
-        tooltip_data=[
-            {
-                column: {'value': str(value), 'type': 'markdown'}
-                for column, value in row.items()
-            } for row in published_articles_df.to_dict('records')
-        ],
+        tooltip_data=[],
         tooltip_duration=None,  # Keeps the tooltip visible as long as the user hovers
-        page_action='native',  # Enable pagination
-        page_size=10,  # Number of rows per page
-        sort_action="native",
-        filter_action="native"
+        page_action='custom',  # Paginate in the database
+        page_current=0,
+        page_size=page_size,  # Number of rows per page
+        sort_action="custom",
+        sort_mode="single",
+        sort_by=[],
+        filter_action="custom",
+        filter_query=''
     )
 
 
+def published_articles_page(app_config: AppConfig,
+                            filter_scope: dict,
+                            page_current: int,
+                            page_size: int,
+                            sort_by: list,
+                            filter_query: str,
+                            cursor: dict | None) -> tuple:
+    """
+    Get one page of the published articles table.
+    :param app_config:
+    :param filter_scope: The filter scope
+    :param page_current: The zero-based page number
+    :param page_size: Number of rows per page
+    :param sort_by: The sort_by property of the table
+    :param filter_query: The filter_query property of the table
+    :param cursor: The cursor of the previously shown page
+    :return: The rows, the tooltips of the rows, the number of pages and the cursor of the page
+    """
+    conditions = table_filter_conditions(filter_query=filter_query, columns=PUBLISHED_ARTICLE_COLUMNS)
+    published_articles_df, page_cursor = query_published_articles_page(app_config=app_config,
+                                                                       filter_scope=filter_scope,
+                                                                       conditions=conditions,
+                                                                       sort_by=sort_by,
+                                                                       page_current=page_current,
+                                                                       page_size=page_size,
+                                                                       cursor=cursor)
+    articles = query_published_articles_count(app_config=app_config,
+                                              filter_scope=filter_scope,
+                                              conditions=conditions)
+
+    # Link the article titles to their DOI
+    published_articles_df['Article Title'] = markdown_links(text=published_articles_df['Article Title'],
+                                                            url_prefix='https://doi.org/',
+                                                            url_suffix=published_articles_df['Article Doi'])
+    # Format collaboration novelty index to 2 decimal places
+    published_articles_df = round_columns(published_articles_df,
+                                          decimals={'Collaboration Novelty Index': 2, 'Citations': 5})
+    # Remove DOI column
+    published_articles_df.drop(columns=['Article Doi'], inplace=True)
+
+    records = published_articles_df.to_dict('records')
+    # Tooltips only for the rows of the page
+    tooltip_data = [
+        {
+            column: {'value': str(value), 'type': 'markdown'}
+            for column, value in row.items()
+        } for row in records
+    ]
+    page_count = max(1, -(-articles // page_size))
+    return records, tooltip_data, page_count, page_cursor
+
+
 def co_author_clustering(app_config: AppConfig,
                          filter_scope: dict,
                          min_samples: int,
-                         min_cluster_size: int) -> dcc.Graph:
+                         min_cluster_size: int,
+                         progress: callable = None) -> dcc.Graph:
     """
     Cluster co-authors using HDBSCAN and visualize the clusters using t-SNE
     :param app_config:
     :param filter_scope: The filter scope
+    :param progress: Callback receiving the progress as a fraction and a message
     :return:
     """
 
-    # Query the co-author embedding data
-    co_author_embedding_df = query_co_author_embeddings(app_config=app_config, filter_scope=filter_scope)
-
-    # Convert the embedding column into a single NumPy array.
-    X = np.array(co_author_embedding_df['Embedding Tensor Data'].tolist())
+    # Reuse the embeddings, the layout and the single linkage trees across slider changes
+    session = clustering_session(app_config=app_config, filter_scope=filter_scope, progress=progress)
+    co_author_embedding_df = session.co_authors.copy()
 
     # HDBSCAN clustering
-    hdb = hdbscan.HDBSCAN(
-        min_cluster_size=min_cluster_size,
-        min_samples=min_samples,
-        gen_min_span_tree=True
-    )
-    labels = hdb.fit_predict(X)
+    if progress is not None:
+        progress(0.8, 'Clustering the co-authors')
+    labels = session.labels(min_samples=min_samples, min_cluster_size=min_cluster_size)
 
     # Assign cluster labels back to the DataFrame
     co_author_embedding_df['cluster'] = labels
     co_author_embedding_df['cluster'] = co_author_embedding_df['cluster'].astype(str)  # Convert to string
 
-    # t-SNE dimensionality reduction (2D)
-    tsne = TSNE(
-        n_components=2,
-        random_state=42,
-        perplexity=30,
-        max_iter=1000,
-        learning_rate='auto'
-    )
-    tsne_result = tsne.fit_transform(X)
-
     # Store TSNE components in the DataFrame
-    co_author_embedding_df['t-SNE x'] = tsne_result[:, 0]
-    co_author_embedding_df['t-SNE y'] = tsne_result[:, 1]
+    co_author_embedding_df['t-SNE x'] = session.layout[:, 0]
+    co_author_embedding_df['t-SNE y'] = session.layout[:, 1]
 
     # Calculate the axis range
     x_min = co_author_embedding_df['t-SNE x'].min()
@@ -275,87 +303,73 @@ def author_recommendations(app_config: AppConfig,
     :param filter_scope: The filter scope
     :return:
     """
-    author_id = filter_scope['author_id']
-    # Get author id in between "author_id in ('" and "')"
-    author_id = author_id.split("'")[1]
+    author_id = scope_params(filter_scope)['author_id'][0]
 
     # Request recommendations from the recommendation engine
-    url = 'http://0.0.0.0:8080/predict/'
-
+    try:
+        recommendations = app_config.recommender.predict(author_id=author_id)
+    except RecommenderUnavailable as e:
+        app_config.logger.warning(str(e))
+        # Fall back to the most similar authors outside the co-author network
+        recommendations = similar_authors(app_config=app_config,
+                                          author_id=author_id,
+                                          k=app_config.config.DASHBOARD.get('SIMILAR_AUTHORS', 10))
+        if not recommendations:
+            return html.P('Recommendation engine is currently down. Please, try again later.')
+
+    co_author_filter = f'author_id IN ({", ".join(quote(recommended_id) for recommended_id in recommendations)})' \
+        if recommendations else 'FALSE'
+    authors_df = query_recommended_co_authors(app_config=app_config, co_author_filter=co_author_filter)
+    authors_df['Index'] = authors_df.index + 1
 
-    # Correctly define headers
-    headers = {
-        'Content-Type': 'application/json'
-    }
+    return dash_table.DataTable(
+        data=authors_df.to_dict('records'),
+        columns=[
+            {"name": "Index", "id": "Index"},
+            {"name": "Author", "id": "Author"}
+        ],
+        style_table={
+            'width': '100%',  # Ensure the table width is 100% of its container
+            'overflowX': 'auto'  # Allow horizontal scrolling if needed
+        },
+        style_cell={
+            'minWidth': '150px',
+            'maxWidth': '80%',
 
-    # Properly serialize data as JSON
-    data = {
-        "author_id": author_id  # Match the example given in the cURL command
-    }
-    try:
-        # Use json parameter for automatic JSON serialization instead of data
-        response = requests.post(url=url, headers=headers, json=data)
-
-        if response.status_code == 200:
-            recommendations = response.json()
-
-            co_author_filter = f'author_id in {tuple(recommendations)}'
-
-            authors_df = query_recommended_co_authors(app_config=app_config, co_author_filter=co_author_filter)
-            print(recommendations)
-            authors_df['Index'] = authors_df.index + 1
-
-            return dash_table.DataTable(
-                data=authors_df.to_dict('records'),
-                columns=[
-                    {"name": "Index", "id": "Index"},
-                    {"name": "Author", "id": "Author"}
-                ],
-                style_table={
-                    'width': '100%',  # Ensure the table width is 100% of its container
-                    'overflowX': 'auto'  # Allow horizontal scrolling if needed
-                },
-                style_cell={
-                    'minWidth': '150px',
-                    'maxWidth': '80%',
-
-                    'fontFamily': 'Open Sans, sans-serif',
-                    'whiteSpace': 'normal',
-                    'backgroundColor': app_config.config.DASHBOARD.COLORS.BACKGROUND_COLOR,  # Set cell background color
-                    'padding': '5px 5px 5px 5px',
-                    'border': 'none',
-                    'borderLeft': '1px solid lightgray',  # Add inner left border between columns
-                    'borderRight': '1px solid lightgray'  # Add inner right border between columns
-                },
-                style_header={
-                    'backgroundColor': app_config.config.DASHBOARD.COLORS.BACKGROUND_COLOR,
-                    'fontWeight': 'bold',
-                    'padding': '5px 5px 5px 5px',
-                    'textAlign': 'left',
-                    'borderBottom': '1px solid lightgray'  # Add a bottom border for the header
-                },
-                style_data_conditional=[
-                    {
-                        'if': {'column_id': 'Article Title'},
-                        'textDecoration': 'none',
-                        'overflow': 'hidden',
-                        'textOverflow': 'ellipsis',
-                        'whiteSpace': 'nowrap',
-                        'maxWidth': '800px',
-                    },
-                ],
-                tooltip_data=[
-                    {
-                        column: {'value': str(value), 'type': 'markdown'}
-                        for column, value in row.items()
-                    } for row in authors_df.to_dict('records')
-                ],
-                tooltip_duration=None,  # Keeps the tooltip visible as long as the user hovers
-                page_action='native',  # Enable pagination
-                page_size=10,  # Number of rows per page
-                sort_action="native",
-                filter_action="native"
-            )
-
-    except requests.exceptions.ConnectionError as e:
-        return html.P('Recommendation engine is currently down. Please, try again later.')
+            'fontFamily': 'Open Sans, sans-serif',
+            'whiteSpace': 'normal',
+            'backgroundColor': app_config.config.DASHBOARD.COLORS.BACKGROUND_COLOR,  # Set cell background color
+            'padding': '5px 5px 5px 5px',
+            'border': 'none',
+            'borderLeft': '1px solid lightgray',  # Add inner left border between columns
+            'borderRight': '1px solid lightgray'  # Add inner right border between columns
+        },
+        style_header={
+            'backgroundColor': app_config.config.DASHBOARD.COLORS.BACKGROUND_COLOR,
+            'fontWeight': 'bold',
+            'padding': '5px 5px 5px 5px',
+            'textAlign': 'left',
+            'borderBottom': '1px solid lightgray'  # Add a bottom border for the header
+        },
+        style_data_conditional=[
+            {
+                'if': {'column_id': 'Article Title'},
+                'textDecoration': 'none',
+                'overflow': 'hidden',
+                'textOverflow': 'ellipsis',
+                'whiteSpace': 'nowrap',
+                'maxWidth': '800px',
+            },
+        ],
+        tooltip_data=[
+            {
+                column: {'value': str(value), 'type': 'markdown'}
+                for column, value in row.items()
+            } for row in authors_df.to_dict('records')
+        ],
+        tooltip_duration=None,  # Keeps the tooltip visible as long as the user hovers
+        page_action='native',  # Enable pagination
+        page_size=10,  # Number of rows per page
+        sort_action="native",
+        filter_action="native"
+    )
@@ -3,7 +3,12 @@ import logging
 import redis
 
 from box import Box
-from src.util.postgres import create_connection, create_sqlalchemy_connection
+from src.util.cache.codec import get_codec
+from src.util.cache.local import LocalCache
+from src.util.cache.version import DataVersion
+from src.util.cache.lock import KeyedLock
+from src.util.postgres import create_sqlalchemy_engine, pool_metrics
+from src.util.recommender import CircuitBreaker, RecommenderClient
 
 
 class AppConfig:
@@ -13,13 +18,52 @@ class AppConfig:
         # Initialize connection app_config
         self.config = Box.from_yaml(filename=self.path_to_config_file)
         self.redis_client = redis.StrictRedis.from_url(self.config.DASHBOARD.REDIS_URL)
-        self.pg_connection = create_sqlalchemy_connection(
+        # Pooled engine, every query checks out its own connection
+        self.pg_engine = create_sqlalchemy_engine(
             username=self.config.POSTGRES.USERNAME,
             password=self.config.POSTGRES.PASSWORD,
             host=self.config.POSTGRES.HOST,
             port=self.config.POSTGRES.PORT,
             database=self.config.POSTGRES.DATABASE,
-            schema=self.config.POSTGRES.SCHEMA
+            schema=self.config.POSTGRES.SCHEMA,
+            pool_size=self.config.POSTGRES.get('POOL_SIZE', 5),
+            max_overflow=self.config.POSTGRES.get('POOL_MAX_OVERFLOW', 10),
+            pool_timeout=self.config.POSTGRES.get('POOL_TIMEOUT', 30),
+            pool_recycle=self.config.POSTGRES.get('POOL_RECYCLE', 1800),
+            pool_pre_ping=self.config.POSTGRES.get('POOL_PRE_PING', True)
+        )
+        self.pg_pool_metrics = pool_metrics(engine=self.pg_engine)
+        # Codec used to serialize query results in Redis
+        self.cache_codec = get_codec(name=self.config.DASHBOARD.get('CACHE_CODEC', 'arrow'),
+                                     compression=self.config.DASHBOARD.get('CACHE_COMPRESSION', 'zstd'))
+        # Bumping the cache schema version makes every cached result unreachable
+        self.cache_version = f"v{self.config.DASHBOARD.get('CACHE_SCHEMA_VERSION', 2)}"
+        # Data version of the warehouse, bumped after every load
+        self.data_version = DataVersion(redis_client=self.redis_client,
+                                        refresh_interval=self.config.DASHBOARD.get('DATA_VERSION_REFRESH', 10))
+        # Entries are versioned, so the TTL only bounds the memory held by unreachable ones. Hot entries are rebuilt
+        # early before they expire (XFetch)
+        self.cache_ttl = self.config.DASHBOARD.get('CACHE_TTL', 7 * 24 * 3600)
+        self.cache_xfetch_beta = self.config.DASHBOARD.get('CACHE_XFETCH_BETA', 1.0)
+        # In-process cache in front of Redis, holding decoded results
+        self.local_cache = LocalCache(max_bytes=self.config.DASHBOARD.get('LOCAL_CACHE_MAX_BYTES', 128 * 1024 * 1024),
+                                      ttl=self.config.DASHBOARD.get('LOCAL_CACHE_TTL', 300))
+        # Lease of the Redis lock held by the worker computing a missing cache entry
+        self.cache_lock_lease = self.config.DASHBOARD.get('CACHE_LOCK_LEASE', 30)
+        # Concurrent cache misses on the same key wait for the first one instead of repeating the query
+        self.query_locks = KeyedLock()
+        # Number of threads used to build independent panels of a page concurrently
+        self.panel_workers = self.config.DASHBOARD.get('PANEL_WORKERS', 7)
+        # Client of the recommendation engine, shared by every request of the worker to reuse its connections
+        self.recommender = RecommenderClient(
+            url=self.config.DASHBOARD.get('RECOMMENDER_URL', 'http://0.0.0.0:8080/predict/'),
+            redis_client=self.redis_client,
+            connect_timeout=self.config.DASHBOARD.get('RECOMMENDER_CONNECT_TIMEOUT', 1.0),
+            read_timeout=self.config.DASHBOARD.get('RECOMMENDER_READ_TIMEOUT', 5.0),
+            retries=self.config.DASHBOARD.get('RECOMMENDER_RETRIES', 2),
+            cache_ttl=self.config.DASHBOARD.get('RECOMMENDER_CACHE_TTL', 300),
+            breaker=CircuitBreaker(failure_threshold=self.config.DASHBOARD.get('RECOMMENDER_BREAKER_THRESHOLD', 5),
+                                   reset_timeout=self.config.DASHBOARD.get('RECOMMENDER_BREAKER_RESET', 30))
         )
 
         self.verbose = verbose
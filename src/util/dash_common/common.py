@@ -1,9 +1,101 @@
 import json
+import math
+import re
 from json import JSONDecodeError
 
 from dash import dcc
 
 from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.transform import dropdown_options
+
+
+class FilterScope(dict):
+    """
+    SQL conditions per filter name, e.g. {'institution_id': "institution_id IN ('UL')"}. The structured filter values
+    the conditions were built from are kept in params and identify the scope in cache keys.
+    """
+
+    def __init__(self, conditions: dict, params: dict):
+        super().__init__(conditions)
+        self.params = params
+
+
+def quote(value: str) -> str:
+    """
+    Quote a value as an SQL string literal.
+    :param value: The value.
+    :return: The quoted value.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def literal(value, kind: str) -> str:
+    """
+    Turn a value into an SQL literal of the given kind.
+    :param value: The value.
+    :param kind: 'number' or 'text'.
+    :return: The literal.
+    :raises ValueError: If a number is not a finite number.
+    """
+    if kind == 'number':
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(f"{value} is not a finite number")
+        return repr(number)
+    return quote(value)
+
+
+# Relational operators of the DataTable filter syntax
+TABLE_FILTER_OPERATORS = {
+    '=': '=', 'eq': '=',
+    '!=': '<>', 'ne': '<>',
+    '<': '<', 'lt': '<',
+    '<=': '<=', 'le': '<=',
+    '>': '>', 'gt': '>',
+    '>=': '>=', 'ge': '>=',
+}
+TABLE_FILTER_CLAUSE = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s+"
+    r"(?P<operator>[is]?(?:contains|datestartswith|eq|ne|lt|le|gt|ge)|!=|<=|>=|=|<|>)\s+"
+    r"(?P<value>.+)$"
+)
+
+
+def table_filter_conditions(filter_query: str | None, columns: dict) -> list:
+    """
+    Translate the filter query of a DataTable into SQL conditions. Clauses on unknown columns, with unsupported
+    operators or with values of the wrong kind are ignored.
+    :param filter_query: The filter query, e.g. '{Citations} >= 10 && {Research Area} contains "Bio"'.
+    :param columns: The SQL column and its kind ('number' or 'text') per table column id.
+    :return: The SQL conditions.
+    """
+    conditions = list()
+    for clause in (filter_query or '').split(' && '):
+        match = TABLE_FILTER_CLAUSE.match(clause.strip())
+        if match is None or match['column'] not in columns:
+            continue
+        column, kind = columns[match['column']]
+        operator = match['operator']
+        # Case sensitivity prefixes, e.g. icontains, are ignored
+        if operator[0] in 'is' and len(operator) > 2:
+            operator = operator[1:]
+        value = match['value'].strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+
+        try:
+            if operator in ('contains', 'datestartswith'):
+                # Match the text representation, escaping the wildcards of the value
+                pattern = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                pattern = f'%{pattern}%' if operator == 'contains' else f'{pattern}%'
+                conditions.append(f"CAST({column} AS TEXT) ILIKE {quote(pattern)}")
+            else:
+                operator = TABLE_FILTER_OPERATORS[operator]
+                conditions.append(f"{column} {operator} {literal(value=value, kind=kind)}")
+        except (KeyError, ValueError):
+            continue
+
+    return conditions
 
 
 def parse_filter(filter: list, filter_name: str) -> list | None:
@@ -11,10 +103,10 @@ def parse_filter(filter: list, filter_name: str) -> list | None:
     Parse the filter value from the list of filters.
     :param filters: List of filters.
     :param filter_name: Name of the filter to parse.
-    :return: The filter value.
+    :return: The filter values, sorted and without duplicates.
     """
     try:
-        values = list()
+        values = set()
         for f in filter:
             if f is None:
                 continue
@@ -22,33 +114,48 @@ def parse_filter(filter: list, filter_name: str) -> list | None:
                 continue
             # Parse the filter value
             filter_dict = json.loads(f)
-            values.append("'" + filter_dict['filter-value'] + "'")
-        return values
+            values.add(filter_dict['filter-value'])
+        return sorted(values)
     except JSONDecodeError:
         return None
 
 
+def build_filter_scope(params: dict) -> FilterScope:
+    """
+    Build the filter scope from the structured filter values.
+    :param params: The filter values per filter name. The publication date filter holds a [start year, end year]
+    range, every other filter holds a list of values where an empty list does not filter.
+    :return: The filter scope.
+    """
+    conditions = dict()
+    for filter_name, value in params.items():
+        if filter_name == 'article_publication_dt':
+            conditions[filter_name] = f'EXTRACT(YEAR FROM article_publication_dt) BETWEEN {int(value[0])} AND {int(value[1])}'
+        else:
+            conditions[filter_name] = f'{filter_name} IN ({", ".join(quote(v) for v in value)})' if value else 'TRUE'
+
+    return FilterScope(conditions=conditions, params=params)
+
+
 def parse_filters(filters: list,
-                  filter_ids: list) -> dict:
+                  filter_ids: list) -> FilterScope:
     """
     Parse the filter values from the list of filters.
     :param filters: List of filters.
     :param filter_ids: List of filter ids.
     :return: The filter values.
     """
-    filter_scope = dict()
+    params = dict()
     for id, value in zip(filter_ids, filters):
         if id['index'] == 'article_publication_dt':
-            filter_scope[
-                'article_publication_dt'] = f'EXTRACT(YEAR FROM article_publication_dt) BETWEEN {value[0]} AND {value[1]}'
+            params['article_publication_dt'] = [int(value[0]), int(value[1])]
         else:
             filter_name = id['index']
             if type(value) != list:
                 value = [value]
-            filter_value = parse_filter(filter=value, filter_name=filter_name)
-            filter_scope[filter_name] = f'{filter_name} IN ({", ".join(filter_value)})' if filter_value else 'TRUE'
+            params[filter_name] = parse_filter(filter=value, filter_name=filter_name) or []
 
-    return filter_scope
+    return build_filter_scope(params=params)
 
 
 def cols_to_title(df_cols: list) -> list:
@@ -66,10 +173,12 @@ def get_dropdown_filter(app_config: AppConfig,
                         query_filter_func: callable,
                         filter_value_name: str = None,
                         select_first_by_default: bool = False,
-                        multi: bool = True) -> dcc.Dropdown:
+                        multi: bool = True,
+                        max_options: int | None = None) -> dcc.Dropdown:
     """
     Get the filter for the page.
     :param multi: Whether the dropdown is multi-select.
+    :param max_options: Maximum number of options embedded in the layout, the others are searched on the server.
     :param app_config: The app_config.
     :param filter_name: The name of the filter.
     :param page_name: The name of the page.
@@ -80,6 +189,8 @@ def get_dropdown_filter(app_config: AppConfig,
 
     # Fetch filter data using the filter_institutions function
     df = query_filter_func(app_config=app_config)
+    if max_options is not None:
+        df = df.head(max_options)
     filter_name_lower = filter_name.lower().replace(' ', '_')
 
     if filter_value_name is None:
@@ -87,11 +198,10 @@ def get_dropdown_filter(app_config: AppConfig,
     filter_name_value_lower = filter_value_name.lower().replace(' ', '_')
     # Check if df is not empty and create dropdown options
     if not df.empty:
-        options = [
-            {'label': row[filter_name],
-             'value': json.dumps({'filter-name': filter_name_value_lower, 'filter-value': row[filter_value_name]})}
-            for index, row in df.iterrows()
-        ]
+        options = dropdown_options(df=df,
+                                   label_column=filter_name,
+                                   value_column=filter_value_name,
+                                   filter_name=filter_name_value_lower)
         # Set the first institution as the default value
         default_value = '/' if not select_first_by_default else options[0]['value']
     else:
@@ -3,12 +3,14 @@ from datetime import datetime
 from dash import dcc
 
 from src.util.dash_common.app_config import AppConfig
-from src.util.dash_common.common import get_dropdown_filter
+from src.util.dash_common.common import get_dropdown_filter, parse_filter
 from src.util.dash_common.query import (
     query_institutions,
     query_authors,
     query_research_areas
 )
+from src.util.dash_common.search import author_index, search_authors
+from src.util.dash_common.transform import dropdown_options
 
 
 def filter_institution(app_config: AppConfig, page_name: str) -> dcc.Dropdown:
@@ -27,7 +29,8 @@ def filter_institution(app_config: AppConfig, page_name: str) -> dcc.Dropdown:
 
 def filter_author(app_config: AppConfig, page_name: str) -> dcc.Dropdown:
     """
-    Get the author filter
+    Get the author filter. Only the most prolific authors are embedded in the layout, the others are found with
+    search_author_options as the user types.
     :param page_name: The name of the page.
     :param app_config: The app_config.
     :return: The author filter.
@@ -39,7 +42,30 @@ def filter_author(app_config: AppConfig, page_name: str) -> dcc.Dropdown:
                                query_filter_func=query_authors,
                                filter_value_name='Author Id',
                                select_first_by_default=True,
-                               multi=False)
+                               multi=False,
+                               max_options=app_config.config.DASHBOARD.get('AUTHOR_SEARCH_LIMIT', 20))
+
+
+def search_author_options(app_config: AppConfig, search_value: str, selected: str | None = None) -> list:
+    """
+    Get the author filter options matching the text typed by the user.
+    :param app_config: The app_config.
+    :param search_value: The text typed by the user.
+    :param selected: The value of the selected option, kept in the options so the dropdown does not lose it.
+    :return: The dropdown options.
+    """
+    matches = search_authors(app_config=app_config,
+                             search_value=search_value,
+                             k=app_config.config.DASHBOARD.get('AUTHOR_SEARCH_LIMIT', 20))
+    options = dropdown_options(df=matches, label_column='Author', value_column='Author Id', filter_name='author_id')
+
+    author_ids = parse_filter(filter=[selected], filter_name='author_id') if selected else None
+    if author_ids and author_ids[0] not in set(matches['Author Id']):
+        authors, _ = author_index(app_config=app_config)
+        selected_author = authors[authors['Author Id'] == author_ids[0]]
+        options = dropdown_options(df=selected_author, label_column='Author', value_column='Author Id',
+                                   filter_name='author_id') + options
+    return options
 
 
 def filter_research_area(app_config: AppConfig, page_name: str) -> dcc.Dropdown:
@@ -57,6 +83,14 @@ def filter_research_area(app_config: AppConfig, page_name: str) -> dcc.Dropdown:
                                query_filter_func=query_research_areas)
 
 
+def publication_period() -> list:
+    """
+    Get the default publication period.
+    :return: The first and the last year of the period.
+    """
+    return [2000, datetime.now().year]
+
+
 def filter_publication_date(page_name: str) -> dcc.RangeSlider:
     """
     Get the publication date filter
@@ -64,8 +98,7 @@ def filter_publication_date(page_name: str) -> dcc.RangeSlider:
     :param app_config: The app_config.
     :return: The publication date filter.
     """
-    min_year = 2000
-    max_year = datetime.now().year
+    min_year, max_year = publication_period()
 
     return dcc.RangeSlider(
         id={'type': f'filter-{page_name}', 'index': 'article_publication_dt'},
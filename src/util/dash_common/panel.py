@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import dash_bootstrap_components as dbc
+from dash import html
+
+from src.util.dash_common.app_config import AppConfig
+from src.util.jobs import DONE, FAILED
+
+
+def error_card(title: str) -> dbc.Card:
+    """
+    Create a card shown in place of a panel that failed to load.
+    :param title: The title of the panel that failed.
+    :return: The error card.
+    """
+    return dbc.Card(
+        dbc.CardBody([
+            html.P(f"{title} is currently unavailable. Please, try again later.",
+                   className="card-text text-center font-italic")
+        ]),
+        className="card-custom"
+    )
+
+
+def progress_card(message: str, progress: float) -> dbc.Card:
+    """
+    Create a card shown in place of a panel while its job is running.
+    :param message: The progress message.
+    :param progress: The progress as a fraction.
+    :return: The progress card.
+    """
+    return dbc.Card(
+        dbc.CardBody([
+            html.P(message, className="card-text text-center font-italic"),
+            dbc.Progress(value=max(progress, 0.05) * 100, striped=True, animated=True)
+        ]),
+        className="card-custom"
+    )
+
+
+def job_panel(title: str, state: dict) -> tuple:
+    """
+    Turn the state of a job into the outputs of a polling panel callback.
+    :param title: The title of the panel.
+    :param state: The job state returned by submit or status.
+    :return: The panel, the job id to keep polling (None once finished) and whether polling is disabled.
+    """
+    if state['status'] == DONE:
+        return state['result'], None, True
+    if state['status'] == FAILED:
+        return error_card(title=title), None, True
+    return progress_card(message=state['message'], progress=state['progress']), state['id'], False
+
+
+def run_panel(app_config: AppConfig,
+              panel_func: callable,
+              **kwargs):
+    """
+    Build a single panel and replace it with an error card if it fails.
+    :param app_config: The app_config.
+    :param panel_func: The function building the panel.
+    :param kwargs: Keyword arguments passed to the panel function.
+    :return: The panel or an error card.
+    """
+    try:
+        return panel_func(app_config=app_config, **kwargs)
+    except Exception as e:
+        app_config.logger.exception(f"Failed to build panel {panel_func.__name__}: {e}")
+        return error_card(title=panel_func.__name__.replace('_', ' ').capitalize())
+
+
+def run_panels(app_config: AppConfig,
+               panel_funcs: list,
+               **kwargs) -> list:
+    """
+    Build independent panels concurrently on a bounded thread pool. Each panel waits on its own query, so the page
+    latency is roughly the one of the slowest panel instead of the sum of all of them.
+    :param app_config: The app_config.
+    :param panel_funcs: The functions building the panels.
+    :param kwargs: Keyword arguments passed to every panel function.
+    :return: The panels in the same order as the panel functions.
+    """
+    max_workers = min(len(panel_funcs), app_config.panel_workers)
+    if max_workers <= 1:
+        return [run_panel(app_config=app_config, panel_func=panel_func, **kwargs) for panel_func in panel_funcs]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='panel') as executor:
+        futures = [executor.submit(run_panel, app_config=app_config, panel_func=panel_func, **kwargs)
+                   for panel_func in panel_funcs]
+        # Collect the results in layout order
+        return [future.result() for future in futures]
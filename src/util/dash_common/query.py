@@ -20,7 +20,9 @@ def query_research_areas(app_config: AppConfig) -> pd.DataFrame:
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='common.research_areas',
+                       params=dict())
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -42,7 +44,9 @@ def query_institutions(app_config: AppConfig) -> pd.DataFrame:
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='common.institutions',
+                       params=dict())
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -70,7 +74,9 @@ def query_authors(app_config: AppConfig) -> pd.DataFrame:
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='common.authors',
+                       params=dict())
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -0,0 +1,106 @@
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.query import query_authors
+from src.util.redis import cache_version
+
+TOKEN = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize a text for searching: case folded and without accents.
+    :param text: The text.
+    :return: The normalized text.
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class PrefixIndex:
+    """
+    In-memory index matching the words of a query against the prefixes of the words of labels, e.g. 'jo sm' matches
+    'John Smith'. The words are kept in one sorted array, so a prefix lookup is two binary searches. Labels are
+    expected in order of relevance and matches are returned in that order.
+    """
+
+    def __init__(self, labels: list):
+        """
+        :param labels: The labels, most relevant first.
+        """
+        tokens, rows = list(), list()
+        for row, label in enumerate(labels):
+            for token in set(TOKEN.findall(normalize(label))):
+                tokens.append(token)
+                rows.append(row)
+
+        tokens = np.array(tokens, dtype=str)
+        order = np.argsort(tokens, kind='stable')
+        self.tokens = tokens[order]
+        self.rows = np.array(rows, dtype=np.int64)[order]
+
+    def rows_with_prefix(self, prefix: str) -> np.ndarray:
+        """
+        Get the labels having a word starting with a prefix.
+        :param prefix: The normalized prefix.
+        :return: The sorted positions of the labels.
+        """
+        start = np.searchsorted(self.tokens, prefix, side='left')
+        end = np.searchsorted(self.tokens, prefix + '\U0010ffff', side='left')
+        return np.unique(self.rows[start:end])
+
+    def search(self, query: str, k: int) -> np.ndarray:
+        """
+        Get the most relevant labels matching every word of a query.
+        :param query: The query.
+        :param k: Maximum number of matches.
+        :return: The positions of the matching labels, most relevant first.
+        """
+        terms = TOKEN.findall(normalize(query))
+        if not terms:
+            return np.empty(0, dtype=np.int64)
+
+        # Intersect starting from the most selective word
+        matches = sorted((self.rows_with_prefix(term) for term in terms), key=len)
+        rows = matches[0]
+        for other in matches[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows[:k]
+
+
+_author_index: tuple | None = None
+_author_index_lock = threading.Lock()
+
+
+def author_index(app_config: AppConfig) -> tuple:
+    """
+    Get the authors and their search index, rebuilt when the data version changes.
+    :param app_config: The app_config.
+    :return: The authors, ordered by their number of articles, and the index over their labels.
+    """
+    global _author_index
+    version = cache_version(app_config=app_config)
+    with _author_index_lock:
+        if _author_index is None or _author_index[0] != version:
+            authors = query_authors(app_config=app_config).reset_index(drop=True)
+            _author_index = (version, authors, PrefixIndex(labels=authors['Author'].tolist()))
+        return _author_index[1], _author_index[2]
+
+
+def search_authors(app_config: AppConfig, search_value: str, k: int = 20) -> pd.DataFrame:
+    """
+    Search authors by name or id.
+    :param app_config: The app_config.
+    :param search_value: The text typed by the user.
+    :param k: Maximum number of matches.
+    :return: The matching authors, most prolific first.
+    """
+    authors, index = author_index(app_config=app_config)
+    return authors.iloc[index.search(query=search_value, k=k)]
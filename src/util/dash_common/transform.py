@@ -0,0 +1,67 @@
+import json
+
+import pandas as pd
+
+
+def json_strings(values: pd.Series) -> pd.Series:
+    """
+    Encode values as JSON strings column-wise, with the same output as json.dumps per value.
+    :param values: The values.
+    :return: The JSON encoded values.
+    """
+    if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+        return pd.Series([json.dumps(value) for value in values.tolist()], index=values.index, dtype=object)
+
+    nulls = values.isna()
+    # Missing values are encoded one by one like json.dumps does, e.g. None as null and NaN as NaN
+    null_strings = pd.Series([json.dumps(None if value is pd.NA else value) for value in values[nulls].tolist()],
+                             index=values.index[nulls], dtype=object)
+    values = values.astype(str)
+    escaped = values.str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False)
+    # Control and non-ASCII characters are rare, escape those values one by one like json.dumps does
+    special = escaped.str.contains(r'[^\x20-\x7e]', regex=True).fillna(False).astype(bool) & ~nulls
+    if special.any():
+        escaped = escaped.where(~special, values[special].map(json.dumps).str[1:-1])
+    strings = '"' + escaped + '"'
+    if nulls.any():
+        strings = strings.astype(object).where(~nulls, null_strings)
+    return strings
+
+
+def dropdown_options(df: pd.DataFrame,
+                     label_column: str,
+                     value_column: str,
+                     filter_name: str) -> list:
+    """
+    Create the options of a filter dropdown. The value of every option is the JSON encoded filter name and value.
+    :param df: The filter data.
+    :param label_column: The column shown in the dropdown.
+    :param value_column: The column holding the filter values.
+    :param filter_name: The name of the filter.
+    :return: The dropdown options.
+    """
+    values = '{"filter-name": ' + json.dumps(filter_name) + ', "filter-value": ' + \
+             json_strings(df[value_column]) + '}'
+    return [{'label': label, 'value': value}
+            for label, value in zip(df[label_column].tolist(), values.tolist())]
+
+
+def markdown_links(text: pd.Series, url_prefix: str, url_suffix: pd.Series) -> pd.Series:
+    """
+    Create markdown links column-wise.
+    :param text: The link texts.
+    :param url_prefix: The part of the URL shared by every link, e.g. 'https://doi.org/'.
+    :param url_suffix: The part of the URL specific to every link, e.g. the DOI.
+    :return: The markdown links.
+    """
+    return '[' + text.astype(str) + '](' + url_prefix + url_suffix.astype(str) + ')'
+
+
+def round_columns(df: pd.DataFrame, decimals: dict) -> pd.DataFrame:
+    """
+    Round whole columns.
+    :param df: The data.
+    :param decimals: Number of decimals per column.
+    :return: The data with the columns rounded.
+    """
+    return df.round({column: digits for column, digits in decimals.items() if column in df.columns})
@@ -0,0 +1,127 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.util.cache.key import scope_params
+from src.util.dash_author import query as author_query
+from src.util.dash_author.embedding import embedding_store
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_common.common import build_filter_scope
+from src.util.dash_common.filter import publication_period
+from src.util.dash_common.query import query_authors, query_institutions, query_research_areas
+from src.util.dash_overview import query as overview_query
+from src.util.dash_overview.bitmap import disable_bitmaps
+
+# Number of entries shown in the author research interest breakdown
+TOP_K = 10
+
+
+def overview_scopes(app_config: AppConfig) -> list:
+    """
+    Get the overview filter scopes to warm: the default scope and every single institution and research area scope.
+    :param app_config: The app_config.
+    :return: The filter scopes.
+    """
+    period = publication_period()
+    institutions = query_institutions(app_config=app_config)['Institution Id'].tolist()
+    research_areas = query_research_areas(app_config=app_config)['Research Area Code'].tolist()
+
+    scopes = [dict(article_publication_dt=period, institution_id=[], research_area_code=[])]
+    scopes += [dict(article_publication_dt=period, institution_id=[institution_id], research_area_code=[])
+               for institution_id in institutions]
+    scopes += [dict(article_publication_dt=period, institution_id=[], research_area_code=[research_area_code])
+               for research_area_code in research_areas]
+    return [build_filter_scope(params=params) for params in scopes]
+
+
+def author_scopes(app_config: AppConfig, top_n: int) -> list:
+    """
+    Get the author filter scopes to warm: the default period for the most prolific authors.
+    :param app_config: The app_config.
+    :param top_n: Number of authors.
+    :return: The filter scopes.
+    """
+    period = publication_period()
+    # Authors are sorted by the number of articles
+    author_ids = query_authors(app_config=app_config)['Author Id'].head(top_n).tolist()
+    return [build_filter_scope(params=dict(author_id=[author_id], article_publication_dt=period))
+            for author_id in author_ids]
+
+
+def warmup_tasks(app_config: AppConfig, top_n_authors: int) -> list:
+    """
+    Enumerate the queries to warm.
+    :param app_config: The app_config.
+    :param top_n_authors: Number of authors to warm the author page for.
+    :return: List of (query function, keyword arguments) pairs.
+    """
+    # Embeddings of exported authors are read from the embedding store
+    co_author_query = author_query.query_co_authors if embedding_store(app_config=app_config) is not None \
+        else author_query.query_co_author_embeddings
+
+    tasks = list()
+    for filter_scope in overview_scopes(app_config=app_config):
+        tasks += [
+            (overview_query.query_overview_aggregate, dict(filter_scope=filter_scope)),
+            (overview_query.query_collaboration_novelty_index_distribution, dict(filter_scope=filter_scope)),
+        ]
+    for filter_scope in author_scopes(app_config=app_config, top_n=top_n_authors):
+        tasks += [
+            (author_query.query_cards, dict(filter_scope=filter_scope)),
+            (author_query.query_published_articles_page,
+             dict(filter_scope=filter_scope, conditions=[], sort_by=[], page_current=0, page_size=10)),
+            (author_query.query_published_articles_count, dict(filter_scope=filter_scope, conditions=[])),
+            (co_author_query, dict(filter_scope=filter_scope)),
+            (author_query.query_articles_by_research_area, dict(filter_scope=filter_scope, k=TOP_K)),
+            (author_query.query_articles_by_keyword, dict(filter_scope=filter_scope, k=TOP_K)),
+        ]
+    return tasks
+
+
+def warmup(app_config: AppConfig, top_n_authors: int = 50, concurrency: int = 4) -> dict:
+    """
+    Fill the cache with the results of the default and most popular filter combinations of every page.
+    :param app_config: The app_config.
+    :param top_n_authors: Number of authors to warm the author page for.
+    :param concurrency: Maximum number of queries running at the same time.
+    :return: Summary of the warmup.
+    """
+    start = time.perf_counter()
+    tasks = warmup_tasks(app_config=app_config, top_n_authors=top_n_authors)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='warmup') as executor:
+        futures = {executor.submit(func, app_config=app_config, **kwargs): func.__name__ for func, kwargs in tasks}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                app_config.logger.warning(f"Warmup of {futures[future]} failed: {e}")
+
+    # The recommendations are cached in Redis too, so the web workers reuse them
+    author_ids = [scope_params(filter_scope)['author_id'][0]
+                  for filter_scope in author_scopes(app_config=app_config, top_n=top_n_authors)]
+    recommendations = app_config.recommender.predict_many(author_ids=author_ids, concurrency=concurrency)
+
+    return dict(queries=len(tasks),
+                failed=failed,
+                recommendations=len(recommendations),
+                seconds=round(time.perf_counter() - start, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm the dashboard cache.')
+    parser.add_argument('--authors', type=int, default=50, help='Number of top authors to warm the author page for.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of concurrent queries.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+
+    # The process exits after the warmup, the web workers build the bitmaps
+    disable_bitmaps()
+    print(warmup(app_config=app_config, top_n_authors=args.authors, concurrency=args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
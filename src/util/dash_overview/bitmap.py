@@ -0,0 +1,310 @@
+import json
+import threading
+import time
+
+import pandas as pd
+import redis
+
+from src.util.cache.key import CACHE_PREFIX
+from src.util.dash_common.app_config import AppConfig
+from src.util.dash_overview.rollup import (
+    ARTICLE_METRICS, GROUPING_INSTITUTION, GROUPING_TOTAL, GROUPING_YEAR
+)
+from src.util.postgres import query
+from src.util.redis import cache_version, release
+
+try:
+    from pyroaring import BitMap
+except ImportError:
+    BitMap = None
+
+# Conditions of the article metrics, the same as in OVERVIEW_METRICS_SQL
+ARTICLE_METRIC_CONDITIONS = {
+    'articles': "TRUE",
+    'single_author_publications': "is_single_author_collaboration",
+    'internal_collaborations': "is_internal_collaboration",
+    'external_collaborations': "is_external_collaboration",
+    'eutopian_collaborations': "is_eutopia_collaboration",
+    'collaborations': "is_external_collaboration OR is_internal_collaboration",
+    'multi_author_articles': "NOT is_single_author_collaboration",
+    'new_author_collaborations': "NOT is_single_author_collaboration AND has_new_author_collaboration",
+    'new_institution_collaborations': "NOT is_single_author_collaboration AND has_new_institution_collaboration",
+    'existing_collaborations': """NOT is_single_author_collaboration
+                                  AND NOT has_new_author_collaboration
+                                  AND NOT has_new_institution_collaboration"""
+}
+CELL = ['year', 'institution_id', 'research_area_code']
+BITMAP_METRICS = ['authors'] + ARTICLE_METRICS
+# Filters the bitmaps can answer, next to the publication year range
+BITMAP_FILTERS = {'article_publication_dt', 'institution_id', 'research_area_code'}
+
+ARTICLE_FLAGS_SQL = f"""
+    SELECT DATE_PART('year', article_publication_dt) AS year,
+           institution_id,
+           research_area_code,
+           article_id,
+           {', '.join(f"COALESCE(BOOL_OR({condition}), FALSE) AS {metric}"
+                      for metric, condition in ARTICLE_METRIC_CONDITIONS.items())}
+    FROM fct_collaboration
+    WHERE article_publication_dt IS NOT NULL
+    GROUP BY DATE_PART('year', article_publication_dt), institution_id, research_area_code, article_id
+"""
+AUTHORS_SQL = """
+    SELECT DISTINCT DATE_PART('year', article_publication_dt) AS year,
+                    institution_id,
+                    research_area_code,
+                    author_id
+    FROM fct_collaboration
+    WHERE article_publication_dt IS NOT NULL
+"""
+
+# Seconds before a failed build is retried, doubled after every failure up to the maximum
+RETRY_BACKOFF = 30
+MAX_RETRY_BACKOFF = 600
+
+
+def cell_key(key: tuple) -> tuple:
+    """
+    Get the key of a cell with missing institutions and research areas as None, so they compare equal.
+    :param key: The year, institution id and research area code.
+    :return: The cell key.
+    """
+    year, institution_id, research_area_code = key
+    return (float(year),
+            None if pd.isna(institution_id) else institution_id,
+            None if pd.isna(research_area_code) else research_area_code)
+
+
+def group_bitmaps(df: pd.DataFrame, id_column: str, metrics: list) -> dict:
+    """
+    Collect the ids of every cell into bitmaps.
+    :param df: One row per cell and id, with a boolean column per metric.
+    :param id_column: The column holding the ids.
+    :param metrics: The metric columns.
+    :return: The bitmaps of every metric per cell key.
+    """
+    # Dense integer ids, the order of the original ids does not matter for counting. Missing ids are not counted
+    codes = pd.factorize(df[id_column])[0]
+    flags = {metric: df[metric].to_numpy(dtype=bool) & (codes >= 0) for metric in metrics}
+    codes = codes.astype('uint32')
+
+    cells = dict()
+    for key, positions in df.groupby(CELL, sort=False, dropna=False).indices.items():
+        cell_codes = codes[positions]
+        cells[cell_key(key)] = {metric: BitMap(cell_codes[flags[metric][positions]]) for metric in metrics}
+    return cells
+
+
+class OverviewBitmaps:
+    """
+    In-memory index of the collaboration table with a bitmap of article ids per year, institution, research area and
+    metric, and a bitmap of author ids per year, institution and research area. Articles and authors shared between
+    institutions or research areas are counted once, so distinct counts over any union of cells are exact, unlike
+    the sums of the rollup views.
+    """
+
+    def __init__(self, articles: pd.DataFrame, authors: pd.DataFrame):
+        """
+        :param articles: One row per cell and article with a flag per article metric, see ARTICLE_FLAGS_SQL.
+        :param authors: One row per cell and author, see AUTHORS_SQL.
+        """
+        articles = articles.dropna(subset=['year'])
+        authors = authors.dropna(subset=['year']).assign(authors=True)
+        self.cells = group_bitmaps(df=articles, id_column='article_id', metrics=ARTICLE_METRICS)
+        for key, bitmaps in group_bitmaps(df=authors, id_column='author_id', metrics=['authors']).items():
+            self.cells.setdefault(key, {metric: BitMap() for metric in ARTICLE_METRICS}).update(bitmaps)
+
+    @staticmethod
+    def counts(cells: list) -> dict:
+        """
+        Count the distinct articles and authors of a union of cells.
+        :param cells: The bitmaps of the cells.
+        :return: The number of distinct ids per metric.
+        """
+        return {metric: len(BitMap.union(*[cell.get(metric, BitMap()) for cell in cells]))
+                if cells else 0
+                for metric in ['articles', 'authors'] + ARTICLE_METRICS[1:]}
+
+    def aggregate(self, params: dict) -> pd.DataFrame:
+        """
+        Get the fused overview aggregate, with the same rows as the scan of the collaboration table.
+        :param params: The structured filter values.
+        :return: The fused overview aggregate.
+        """
+        start_year, end_year = [int(year) for year in params['article_publication_dt']]
+        institutions = set(params.get('institution_id') or [])
+        research_areas = set(params.get('research_area_code') or [])
+
+        by_year, by_institution, total = dict(), dict(), list()
+        for (year, institution_id, research_area_code), bitmaps in self.cells.items():
+            if not start_year <= year <= end_year \
+                    or institutions and institution_id not in institutions \
+                    or research_areas and research_area_code not in research_areas:
+                continue
+            by_year.setdefault(year, []).append(bitmaps)
+            by_institution.setdefault(institution_id, []).append(bitmaps)
+            total.append(bitmaps)
+
+        rows = [dict(grouping_id=GROUPING_YEAR, year=year, institution=None, **self.counts(cells))
+                for year, cells in by_year.items()]
+        rows += [dict(grouping_id=GROUPING_INSTITUTION, year=None, institution=institution_id, **self.counts(cells))
+                 for institution_id, cells in by_institution.items()]
+        rows.append(dict(grouping_id=GROUPING_TOTAL, year=None, institution=None, **self.counts(total)))
+        return pd.DataFrame(rows).astype({'year': float})
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the bitmaps, to share them between workers.
+        :return: The length of the header, a JSON header with the cell keys and bitmap sizes, and the bitmaps.
+        """
+        header, payload = list(), list()
+        for key, bitmaps in self.cells.items():
+            blobs = [bitmaps.get(metric, BitMap()).serialize() for metric in BITMAP_METRICS]
+            header.append([list(key), [len(blob) for blob in blobs]])
+            payload += blobs
+        header = json.dumps(header).encode('utf-8')
+        return len(header).to_bytes(8, 'little') + header + b''.join(payload)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'OverviewBitmaps':
+        """
+        Deserialize the bitmaps.
+        :param data: The serialized bitmaps, see to_bytes.
+        :return: The bitmaps.
+        """
+        header_size = int.from_bytes(data[:8], 'little')
+        offset = 8 + header_size
+        index = cls.__new__(cls)
+        index.cells = dict()
+        for key, sizes in json.loads(data[8:offset]):
+            bitmaps = dict()
+            for metric, size in zip(BITMAP_METRICS, sizes):
+                bitmaps[metric] = BitMap.deserialize(data[offset:offset + size])
+                offset += size
+            index.cells[tuple(key)] = bitmaps
+        return index
+
+
+_bitmaps: dict = dict(version=None, index=None, building=None, failures=0, retry_at=0.0, disabled=False)
+_bitmaps_lock = threading.Lock()
+
+
+def disable_bitmaps() -> None:
+    """
+    Answer the overview from SQL in this process. Used by short-lived processes like the warmup, which would exit
+    before a build finished and leave the other workers waiting for its lock.
+    """
+    with _bitmaps_lock:
+        _bitmaps['disabled'] = True
+
+
+def query_bitmaps(app_config: AppConfig) -> OverviewBitmaps:
+    """
+    Build the bitmaps from the collaboration table.
+    :param app_config: The app_config.
+    :return: The bitmaps.
+    """
+    return OverviewBitmaps(articles=query(conn=app_config.pg_engine, query_str=ARTICLE_FLAGS_SQL, bulk=True),
+                           authors=query(conn=app_config.pg_engine, query_str=AUTHORS_SQL, bulk=True))
+
+
+def shared_bitmaps(app_config: AppConfig, version: str) -> OverviewBitmaps:
+    """
+    Get the bitmaps of a data version, built from the warehouse by a single worker and shared with the others through
+    Redis. Workers coordinate through a Redis lock and fall back to building the bitmaps themselves without Redis.
+    :param app_config: The app_config.
+    :param version: The data version.
+    :return: The bitmaps.
+    """
+    key = f'{CACHE_PREFIX}:{version}:overview.bitmaps:all'
+    lease = app_config.config.DASHBOARD.get('BITMAP_BUILD_LEASE', 600)
+    try:
+        payload = app_config.redis_client.get(key)
+        if payload:
+            return OverviewBitmaps.from_bytes(payload)
+
+        lock = app_config.redis_client.lock(f'{key}:lock', timeout=lease)
+        while not lock.acquire(blocking=False):
+            # Another worker is building the bitmaps, wait for it
+            deadline = time.monotonic() + lease
+            while time.monotonic() < deadline and lock.locked():
+                time.sleep(1)
+            payload = app_config.redis_client.get(key)
+            if payload:
+                return OverviewBitmaps.from_bytes(payload)
+            # The other worker failed or its lease expired, a single waiter takes the lock over
+        payload = app_config.redis_client.get(key)
+        if payload:
+            release(lock)
+            return OverviewBitmaps.from_bytes(payload)
+    except redis.ConnectionError:
+        return query_bitmaps(app_config=app_config)
+
+    try:
+        index = query_bitmaps(app_config=app_config)
+        try:
+            app_config.redis_client.set(key, index.to_bytes(), ex=app_config.cache_ttl)
+        except redis.ConnectionError:
+            pass
+        return index
+    finally:
+        release(lock)
+
+
+def build_bitmaps(app_config: AppConfig, version: str) -> None:
+    """
+    Build the bitmaps of a data version and publish them once they are complete.
+    :param app_config: The app_config.
+    :param version: The data version.
+    """
+    start = time.perf_counter()
+    index = None
+    try:
+        index = shared_bitmaps(app_config=app_config, version=version)
+        app_config.logger.info(f"Loaded the overview bitmaps of {len(index.cells)} cells "
+                               f"in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        app_config.logger.warning(f"Could not build the overview bitmaps: {e}")
+
+    with _bitmaps_lock:
+        failures = 0
+        if index is None:
+            failures = _bitmaps['failures'] + 1 if _bitmaps['version'] == version else 1
+        # The overview falls back to SQL until a failed build is retried
+        _bitmaps.update(version=version,
+                        index=index,
+                        failures=failures,
+                        retry_at=time.monotonic() + min(RETRY_BACKOFF * 2 ** (failures - 1), MAX_RETRY_BACKOFF))
+        if _bitmaps['building'] == version:
+            _bitmaps['building'] = None
+
+
+def overview_bitmaps(app_config: AppConfig) -> OverviewBitmaps | None:
+    """
+    Get the bitmaps of the current data version. They are built in a background thread on first use, rebuilt when
+    the data version changes and retried with a backoff if the build failed.
+    :param app_config: The app_config.
+    :return: The bitmaps, None while they are built, if they are disabled or pyroaring is not installed.
+    """
+    if BitMap is None or _bitmaps['disabled'] or not app_config.config.DASHBOARD.get('USE_BITMAPS', True):
+        return None
+    version = cache_version(app_config=app_config)
+    with _bitmaps_lock:
+        if _bitmaps['version'] == version \
+                and (_bitmaps['index'] is not None or time.monotonic() < _bitmaps['retry_at']):
+            return _bitmaps['index']
+        if _bitmaps['building'] != version:
+            _bitmaps['building'] = version
+            threading.Thread(target=build_bitmaps, args=(app_config, version), name='overview-bitmaps',
+                             daemon=True).start()
+        return None
+
+
+def bitmap_scope(params: dict) -> bool:
+    """
+    Check whether the bitmaps can answer a filter scope.
+    :param params: The structured filter values.
+    :return: True if only the publication years, institutions and research areas are filtered.
+    """
+    return isinstance(params.get('article_publication_dt'), list) and \
+        all(name in BITMAP_FILTERS or not value for name, value in params.items())
@@ -1,67 +1,198 @@
 import pandas as pd
 
+from src.util.cache.key import scope_params
 from src.util.dash_common.app_config import AppConfig
-from src.util.dash_common.common import cols_to_title
+from src.util.dash_common.common import cols_to_title, quote
+from src.util.dash_overview.bitmap import bitmap_scope, overview_bitmaps
+from src.util.dash_overview.rollup import (
+    ARTICLE_METRICS, AUTHOR_ROLLUP_VIEW, GROUPING_INSTITUTION, GROUPING_TOTAL, GROUPING_YEAR, OVERVIEW_METRICS_SQL,
+    ROLLUP_VIEW, rollup_scope, rollups_available
+)
 from src.util.redis import redis_query
 
 
-def query_cards(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
+def rollup_aggregate_sql(filter_scope: dict) -> str:
     """
-    Get the dash_overview cards.
+    Get the query reading the fused overview aggregate from the rollup views.
+    :param filter_scope: The filter scope, with at most one institution and one research area.
+    :return: The query.
+    """
+    params = scope_params(filter_scope)
+    start_year, end_year = [int(year) for year in params['article_publication_dt']]
+    institutions = params.get('institution_id') or []
+    research_areas = params.get('research_area_code') or []
+
+    # Rows of the selected research area, or the rows of all research areas
+    area_condition = f"NOT all_research_areas AND research_area_code = {quote(research_areas[0])}" \
+        if research_areas else "all_research_areas"
+    # Rows of the selected institution, or the rows of every single institution
+    institution_condition = f"NOT all_institutions AND institution_id = {quote(institutions[0])}" \
+        if institutions else "NOT all_institutions"
+    # Rows of the whole scope
+    scope_condition = institution_condition if institutions else "all_institutions"
+
+    sums = ', '.join(f"CAST(COALESCE(SUM({metric}), 0) AS BIGINT) AS {metric}" for metric in ARTICLE_METRICS)
+    # Every metric but the number of articles, which comes first followed by the number of authors
+    other_metrics = ARTICLE_METRICS[1:]
+    return f"""
+        WITH rollup AS (SELECT *
+                        FROM {ROLLUP_VIEW}
+                        WHERE year BETWEEN {start_year} AND {end_year}
+                          AND {area_condition}),
+             author_rollup AS (SELECT *
+                               FROM {AUTHOR_ROLLUP_VIEW}
+                               WHERE year BETWEEN {start_year} AND {end_year}
+                                 AND {area_condition}),
+             by_institution AS (SELECT institution_id AS institution, {sums}
+                                FROM rollup
+                                WHERE {institution_condition}
+                                GROUP BY institution_id),
+             institution_authors AS (SELECT institution_id AS institution, COUNT(DISTINCT author_id) AS authors
+                                     FROM author_rollup
+                                     WHERE {institution_condition}
+                                     GROUP BY institution_id),
+             total AS (SELECT {sums}
+                       FROM rollup
+                       WHERE {scope_condition}),
+             total_authors AS (SELECT COUNT(DISTINCT author_id) AS authors
+                               FROM author_rollup
+                               WHERE {scope_condition})
+        SELECT {GROUPING_YEAR} AS grouping_id,
+               year,
+               CAST(NULL AS TEXT) AS institution,
+               articles,
+               authors,
+               {', '.join(other_metrics)}
+        FROM rollup
+        WHERE {scope_condition}
+        UNION ALL
+        SELECT {GROUPING_INSTITUTION},
+               CAST(NULL AS DOUBLE PRECISION),
+               i.institution,
+               i.articles,
+               COALESCE(a.authors, 0),
+               {', '.join(f"i.{metric}" for metric in other_metrics)}
+        FROM by_institution i
+                 LEFT JOIN institution_authors a USING (institution)
+        UNION ALL
+        SELECT {GROUPING_TOTAL},
+               CAST(NULL AS DOUBLE PRECISION),
+               CAST(NULL AS TEXT),
+               t.articles,
+               ta.authors,
+               {', '.join(f"t.{metric}" for metric in other_metrics)}
+        FROM total t
+                 CROSS JOIN total_authors ta
+    """
+
+
+def query_overview_aggregate(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
+    """
+    Get every overview metric for the filter scope in a single scan of the collaboration table. The in-memory bitmaps
+    answer any combination of years, institutions and research areas once they are built, otherwise the rollup views
+    answer the filter scopes with at most one institution and research area. The result contains one row per year,
+    one row per institution and a grand total row, distinguished by the grouping id.
     :param app_config: The app_config.
-    :return: The dash_overview cards.
+    :param filter_scope: The filter scope.
+    :return: The fused overview aggregate.
     """
+    if bitmap_scope(params=scope_params(filter_scope)):
+        bitmaps = overview_bitmaps(app_config=app_config)
+        if bitmaps is not None:
+            return bitmaps.aggregate(params=scope_params(filter_scope))
+
+    if rollup_scope(filter_scope=filter_scope) and rollups_available(app_config=app_config):
+        # Same result as the scan, so it shares its cache entries
+        return redis_query(app_config=app_config,
+                           query_str=rollup_aggregate_sql(filter_scope=filter_scope),
+                           template_id='overview.aggregate',
+                           params=scope_params(filter_scope))
 
     query_str = f"""
-    SELECT COUNT(DISTINCT article_id)                                                   AS articles,
-           COUNT(DISTINCT author_id)                                                    AS authors,
-           COUNT(DISTINCT CASE WHEN is_single_author_collaboration THEN article_id END) AS single_author_publications,
-           COUNT(DISTINCT CASE WHEN is_internal_collaboration THEN article_id END)      AS internal_collaborations,
-           COUNT(DISTINCT CASE WHEN is_external_collaboration THEN article_id END)      AS external_collaborations,
-           COUNT(DISTINCT CASE WHEN is_eutopia_collaboration THEN article_id END)       AS eutopian_collaborations
-    FROM fct_collaboration
-    WHERE {filter_scope['article_publication_dt']}
-    AND {filter_scope['institution_id']}
-    AND {filter_scope['research_area_code']}
+        SELECT GROUPING(DATE_PART('year', article_publication_dt), institution_id)            AS grouping_id,
+               DATE_PART('year', article_publication_dt)                                    AS year,
+               institution_id                                                               AS institution,
+               {OVERVIEW_METRICS_SQL}
+        FROM fct_collaboration
+        WHERE {filter_scope['article_publication_dt']}
+            AND {filter_scope['institution_id']}
+            AND {filter_scope['research_area_code']}
+        GROUP BY GROUPING SETS ((DATE_PART('year', article_publication_dt)), (institution_id), ())
     """
 
     # Fetch the data
-    data = redis_query(app_config=app_config,
-                       query_str=query_str)
+    return redis_query(app_config=app_config,
+                       query_str=query_str,
+                       template_id='overview.aggregate',
+                       params=scope_params(filter_scope))
+
+
+def aggregate_by_year(app_config: AppConfig, filter_scope: dict, columns: list) -> pd.DataFrame:
+    """
+    Get the yearly rows of the fused overview aggregate.
+    :param app_config: The app_config.
+    :param filter_scope: The filter scope.
+    :param columns: The metric columns to keep next to the year.
+    :return: The yearly metrics sorted by year.
+    """
+    data = query_overview_aggregate(app_config=app_config, filter_scope=filter_scope)
+    data = data.loc[data['grouping_id'] == GROUPING_YEAR, ['year'] + columns]
+    data = data.sort_values(by='year', ascending=True).reset_index(drop=True)
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
     return data
 
 
-def query_trend_eutopia_collaboration(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
+def aggregate_total(app_config: AppConfig, filter_scope: dict, columns: list) -> pd.DataFrame:
     """
-    Get the trend of Eutopia collaborations.
+    Get the grand total row of the fused overview aggregate.
     :param app_config: The app_config.
-    :return: The trend of Eutopia collaborations.
+    :param filter_scope: The filter scope.
+    :param columns: The metric columns to keep.
+    :return: A single row DataFrame with the metrics.
     """
+    data = query_overview_aggregate(app_config=app_config, filter_scope=filter_scope)
+    data = data.loc[data['grouping_id'] == GROUPING_TOTAL, columns].reset_index(drop=True)
+    if data.empty:
+        # No rows match the filter scope
+        data = pd.DataFrame([{column: 0 for column in columns}])
+    return data
 
-    query_str = f"""
-        SELECT DATE_PART('year', article_publication_dt)                              AS year,
-               COUNT(DISTINCT CASE WHEN is_eutopia_collaboration THEN article_id END) AS eutopian_collaborations
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1
-        ORDER BY 1 ASC
+
+def query_cards(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
+    """
+    Get the dash_overview cards.
+    :param app_config: The app_config.
+    :return: The dash_overview cards.
     """
 
-    # Fetch the data
-    data = redis_query(app_config=app_config,
-                       query_str=query_str)
+    data = aggregate_total(app_config=app_config,
+                           filter_scope=filter_scope,
+                           columns=['articles',
+                                    'authors',
+                                    'single_author_publications',
+                                    'internal_collaborations',
+                                    'external_collaborations',
+                                    'eutopian_collaborations'])
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
-
     return data
 
 
+def query_trend_eutopia_collaboration(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
+    """
+    Get the trend of Eutopia collaborations.
+    :param app_config: The app_config.
+    :return: The trend of Eutopia collaborations.
+    """
+
+    return aggregate_by_year(app_config=app_config,
+                             filter_scope=filter_scope,
+                             columns=['eutopian_collaborations'])
+
+
 def query_breakdown_publications_by_institution(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
     """
     Get the breakdown of publications by institution.
@@ -69,20 +200,9 @@ def query_breakdown_publications_by_institution(app_config: AppConfig, filter_sc
     :return: The breakdown of publications by institution.
     """
 
-    query_str = f"""
-        SELECT institution_id              AS institution,
-               COUNT(DISTINCT article_id) AS articles
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1
-        ORDER BY 2 ASC
-    """
-
-    # Fetch the data
-    data = redis_query(app_config=app_config,
-                       query_str=query_str)
+    data = query_overview_aggregate(app_config=app_config, filter_scope=filter_scope)
+    data = data.loc[data['grouping_id'] == GROUPING_INSTITUTION, ['institution', 'articles']]
+    data = data.sort_values(by='articles', ascending=True).reset_index(drop=True)
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
@@ -97,27 +217,11 @@ def query_trend_articles_by_collaboration_type(app_config: AppConfig, filter_sco
     :return: The trend of publications by collaboration type.
     """
 
-    query_str = f"""
-        SELECT DATE_PART('year', article_publication_dt)                                    AS year,
-               COUNT(DISTINCT CASE WHEN is_internal_collaboration THEN article_id END)      AS internal_collaborations,
-               COUNT(DISTINCT CASE WHEN is_external_collaboration THEN article_id END)      AS external_collaborations,
-               COUNT(DISTINCT CASE WHEN is_single_author_collaboration THEN article_id END) AS single_author_publications
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1
-        ORDER BY 1 ASC
-    """
-
-    # Fetch the data
-    data = redis_query(app_config=app_config,
-                       query_str=query_str)
-
-    # Turn column names from snake case to title case and replace underscores with spaces
-    data.columns = cols_to_title(data.columns)
-
-    return data
+    return aggregate_by_year(app_config=app_config,
+                             filter_scope=filter_scope,
+                             columns=['internal_collaborations',
+                                      'external_collaborations',
+                                      'single_author_publications'])
 
 
 def query_eutopia_collaboration_funnel(app_config: AppConfig, filter_scope: dict) -> pd.DataFrame:
@@ -127,53 +231,22 @@ def query_eutopia_collaboration_funnel(app_config: AppConfig, filter_scope: dict
     :return: The funnel of Eutopia collaborations.
     """
 
-    query_str = f"""
-         SELECT 'Total Articles'           AS stage
-             , 1                          AS stage_index
-             , COUNT(DISTINCT article_id) AS count
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1, 2
-        UNION ALL
-        SELECT 'Collaborations'                                                                                     AS stage
-             , 2                                                                                                    AS stage_index
-             , COUNT(DISTINCT CASE WHEN is_external_collaboration or is_internal_collaboration THEN article_id END) AS count
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1, 2
-        UNION ALL
-        SELECT 'External Collaborations'                                               AS stage
-             , 3                                                                       AS stage_index
-             , COUNT(DISTINCT CASE WHEN is_external_collaboration THEN article_id END) AS count
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1, 2
-        UNION ALL
-        SELECT 'Eutopia Collaborations'                                               AS stage
-             , 4                                                                      AS stage_index
-             , COUNT(DISTINCT CASE WHEN is_eutopia_collaboration THEN article_id END) AS count
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        GROUP BY 1, 2
-    """
-
-    # Fetch the data
-    data = redis_query(app_config=app_config,
-                       query_str=query_str)
-
-    # Turn column names from snake case to title case and replace underscores with spaces
-    data.columns = cols_to_title(data.columns)
-
-    # Sort by index
-    data = data.sort_values(by='Stage Index')
+    stages = {
+        'articles': 'Total Articles',
+        'collaborations': 'Collaborations',
+        'external_collaborations': 'External Collaborations',
+        'eutopian_collaborations': 'Eutopia Collaborations'
+    }
+    total = aggregate_total(app_config=app_config,
+                            filter_scope=filter_scope,
+                            columns=list(stages.keys()))
+
+    # Turn the total row into one row per funnel stage, sorted by index
+    data = pd.DataFrame({
+        'Stage': list(stages.values()),
+        'Stage Index': range(1, len(stages) + 1),
+        'Count': total.iloc[0].values
+    })
 
     return data
 
@@ -185,32 +258,15 @@ def query_trend_new_collaborations(app_config: AppConfig, filter_scope: dict) ->
     :return: The trend of new collaborations.
     """
 
-    query_str = f"""        
-        SELECT DATE_PART('year', article_publication_dt)                                       AS year,
-           COUNT(DISTINCT CASE
-                              WHEN has_new_author_collaboration
-                                  THEN article_id END)                                          AS new_author_collaborations,
-           COUNT(DISTINCT CASE
-                              WHEN has_new_institution_collaboration
-                                  THEN article_id END)                                          AS new_institution_collaborations,
-           COUNT(DISTINCT CASE
-                              WHEN NOT has_new_author_collaboration
-                                  AND NOT has_new_institution_collaboration THEN article_id END) AS existing_collaborations
-        FROM fct_collaboration
-        WHERE {filter_scope['article_publication_dt']}
-            AND {filter_scope['institution_id']}
-            AND {filter_scope['research_area_code']}
-        AND NOT is_single_author_collaboration
-        GROUP BY 1
-        ORDER BY 1 ASC
-    """
-
-    # Fetch the data
-    data = redis_query(app_config=app_config,
-                       query_str=query_str)
+    data = aggregate_by_year(app_config=app_config,
+                             filter_scope=filter_scope,
+                             columns=['multi_author_articles',
+                                      'new_author_collaborations',
+                                      'new_institution_collaborations',
+                                      'existing_collaborations'])
 
-    # Turn column names from snake case to title case and replace underscores with spaces
-    data.columns = cols_to_title(data.columns)
+    # Only keep the years with at least one collaboration, single author publications are not collaborations
+    data = data[data['Multi Author Articles'] > 0].drop(columns=['Multi Author Articles']).reset_index(drop=True)
 
     return data
 
@@ -236,7 +292,9 @@ def query_collaboration_novelty_index_distribution(app_config: AppConfig, filter
 
     # Fetch the data
     data = redis_query(app_config=app_config,
-                       query_str=query_str)
+                       query_str=query_str,
+                       template_id='overview.collaboration_novelty_index_distribution',
+                       params=scope_params(filter_scope))
 
     # Turn column names from snake case to title case and replace underscores with spaces
     data.columns = cols_to_title(data.columns)
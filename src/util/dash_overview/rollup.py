@@ -0,0 +1,183 @@
+import argparse
+import threading
+
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.util.cache.key import scope_params
+from src.util.dash_common.app_config import AppConfig
+from src.util.redis import cache_version
+
+# Metrics of the fused overview aggregate, shared with the rollup views. Every metric except the authors counts
+# articles, which have a single publication year, so their yearly counts add up over a range of years
+OVERVIEW_METRICS_SQL = """COUNT(DISTINCT article_id)                                                   AS articles,
+               COUNT(DISTINCT author_id)                                                    AS authors,
+               COUNT(DISTINCT CASE WHEN is_single_author_collaboration THEN article_id END) AS single_author_publications,
+               COUNT(DISTINCT CASE WHEN is_internal_collaboration THEN article_id END)      AS internal_collaborations,
+               COUNT(DISTINCT CASE WHEN is_external_collaboration THEN article_id END)      AS external_collaborations,
+               COUNT(DISTINCT CASE WHEN is_eutopia_collaboration THEN article_id END)       AS eutopian_collaborations,
+               COUNT(DISTINCT CASE
+                                  WHEN is_external_collaboration OR is_internal_collaboration
+                                      THEN article_id END)                                  AS collaborations,
+               COUNT(DISTINCT CASE
+                                  WHEN NOT is_single_author_collaboration
+                                      THEN article_id END)                                  AS multi_author_articles,
+               COUNT(DISTINCT CASE
+                                  WHEN NOT is_single_author_collaboration
+                                      AND has_new_author_collaboration
+                                      THEN article_id END)                                  AS new_author_collaborations,
+               COUNT(DISTINCT CASE
+                                  WHEN NOT is_single_author_collaboration
+                                      AND has_new_institution_collaboration
+                                      THEN article_id END)                                  AS new_institution_collaborations,
+               COUNT(DISTINCT CASE
+                                  WHEN NOT is_single_author_collaboration
+                                      AND NOT has_new_author_collaboration
+                                      AND NOT has_new_institution_collaboration
+                                      THEN article_id END)                                  AS existing_collaborations"""
+ARTICLE_METRICS = [
+    'articles',
+    'single_author_publications',
+    'internal_collaborations',
+    'external_collaborations',
+    'eutopian_collaborations',
+    'collaborations',
+    'multi_author_articles',
+    'new_author_collaborations',
+    'new_institution_collaborations',
+    'existing_collaborations'
+]
+
+# Grouping ids returned by GROUPING(year, institution_id) in the fused overview aggregate
+GROUPING_YEAR = 1
+GROUPING_INSTITUTION = 2
+GROUPING_TOTAL = 3
+
+# Overview metrics per year for every institution and research area, for all institutions and for all research areas
+ROLLUP_VIEW = 'mv_overview_rollup'
+# Distinct authors with the same groupings, the number of authors over a range of years cannot be summed up per year
+AUTHOR_ROLLUP_VIEW = 'mv_overview_author_rollup'
+
+ROLLUP_DDL = [
+    f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {ROLLUP_VIEW} AS
+    SELECT DATE_PART('year', article_publication_dt)                                    AS year,
+           institution_id,
+           research_area_code,
+           GROUPING(institution_id) = 1                                                 AS all_institutions,
+           GROUPING(research_area_code) = 1                                             AS all_research_areas,
+           {OVERVIEW_METRICS_SQL}
+    FROM fct_collaboration
+    GROUP BY DATE_PART('year', article_publication_dt), CUBE (institution_id, research_area_code)
+    """,
+    f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {ROLLUP_VIEW}_key
+        ON {ROLLUP_VIEW} (all_institutions, all_research_areas, institution_id, research_area_code, year)
+    """,
+    f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {AUTHOR_ROLLUP_VIEW} AS
+    SELECT DATE_PART('year', article_publication_dt) AS year,
+           institution_id,
+           research_area_code,
+           GROUPING(institution_id) = 1              AS all_institutions,
+           GROUPING(research_area_code) = 1          AS all_research_areas,
+           author_id
+    FROM fct_collaboration
+    GROUP BY DATE_PART('year', article_publication_dt), author_id, CUBE (institution_id, research_area_code)
+    """,
+    f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {AUTHOR_ROLLUP_VIEW}_key
+        ON {AUTHOR_ROLLUP_VIEW} (all_institutions, all_research_areas, institution_id, research_area_code, year,
+                                 author_id)
+    """
+]
+
+_available: dict = dict()
+_available_lock = threading.Lock()
+
+
+def create_rollups(engine: Engine) -> None:
+    """
+    Create the rollup views and their indexes, unless they exist.
+    :param engine: SQLAlchemy engine
+    """
+    with engine.begin() as conn:
+        for statement in ROLLUP_DDL:
+            conn.execute(text(statement))
+
+
+def refresh_rollups(engine: Engine, concurrently: bool = True) -> None:
+    """
+    Recompute the rollup views, to be run after every warehouse load before the data version is bumped.
+    :param engine: SQLAlchemy engine
+    :param concurrently: Keep the views readable during the refresh.
+    """
+    with engine.begin() as conn:
+        for view in [ROLLUP_VIEW, AUTHOR_ROLLUP_VIEW]:
+            conn.execute(text(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view}"))
+
+
+def rollups_exist(engine: Engine) -> bool:
+    """
+    Check whether the rollup views exist.
+    :param engine: SQLAlchemy engine
+    :return: True if both views exist.
+    """
+    try:
+        with engine.connect() as conn:
+            return bool(conn.execute(text(
+                f"SELECT to_regclass('{ROLLUP_VIEW}') IS NOT NULL AND to_regclass('{AUTHOR_ROLLUP_VIEW}') IS NOT NULL"
+            )).scalar())
+    except SQLAlchemyError:
+        return False
+
+
+def rollups_available(app_config: AppConfig) -> bool:
+    """
+    Check whether the overview queries may read from the rollup views. The check runs once per data version.
+    :param app_config: The app_config.
+    :return: True if the rollups are enabled and exist.
+    """
+    if not app_config.config.DASHBOARD.get('USE_ROLLUPS', True):
+        return False
+    version = cache_version(app_config=app_config)
+    with _available_lock:
+        if version not in _available:
+            _available.clear()
+            _available[version] = rollups_exist(engine=app_config.pg_engine)
+        return _available[version]
+
+
+def rollup_scope(filter_scope: dict) -> bool:
+    """
+    Check whether the rollups can answer a filter scope. Distinct counts of several institutions or research areas
+    cannot be combined from the counts of each of them, so at most one of each may be selected.
+    :param filter_scope: The filter scope.
+    :return: True if the rollups can answer the filter scope.
+    """
+    params = scope_params(filter_scope)
+    if not isinstance(params.get('article_publication_dt'), list):
+        return False
+    return all(isinstance(params.get(name, []), list) and len(params.get(name, [])) <= 1
+               for name in ['institution_id', 'research_area_code'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the rollup views of the overview page.')
+    parser.add_argument('command', choices=['create', 'refresh'])
+    parser.add_argument('--blocking', action='store_true',
+                        help='Refresh without CONCURRENTLY, faster but blocks readers.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+
+    if args.command == 'create':
+        create_rollups(engine=app_config.pg_engine)
+        print('Rollup views created.')
+    else:
+        refresh_rollups(engine=app_config.pg_engine, concurrently=not args.blocking)
+        print('Rollup views refreshed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import importlib
+import json
+import os
+import socket
+import threading
+
+import plotly.utils
+import redis
+
+from src.util.cache.key import digest
+from src.util.dash_common.app_config import AppConfig
+from src.util.redis import cache_version
+
+JOB_PREFIX = 'dashboard_jobs'
+JOB_QUEUE = f'{JOB_PREFIX}:queue'
+# Set by every running worker, jobs run in the web worker itself while no worker is alive
+WORKER_HEARTBEAT = f'{JOB_PREFIX}:worker_alive'
+HEARTBEAT_TTL = 15
+
+# Modules registering the jobs run by the workers
+JOB_MODULES = ['src.util.dash_author.jobs']
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+# Failed jobs are kept shortly, so pollers see the failure before the job can be retried
+FAILED_TTL = 60
+
+_jobs: dict = dict()
+
+
+def job(name: str):
+    """
+    Register a function as a job. The function receives the app_config, a progress callback and the job parameters as
+    keyword arguments and returns a JSON serializable result, Dash components and Plotly figures included.
+    :param name: The job name, e.g. 'author.co_author_clustering'.
+    :return: The decorator.
+    """
+    def decorator(func):
+        _jobs[name] = func
+        return func
+    return decorator
+
+
+def job_key(job_id: str) -> str:
+    """
+    Get the Redis hash holding the state of a job.
+    :param job_id: The job id.
+    :return: The Redis key.
+    """
+    return f'{JOB_PREFIX}:{job_id}'
+
+
+def job_id(app_config: AppConfig, name: str, params: dict) -> str:
+    """
+    Get the id of a job. Identical jobs share their id, so they are only computed once per data version.
+    :param app_config: The app_config.
+    :param name: The job name.
+    :param params: The job parameters.
+    :return: The job id.
+    """
+    return f'{name}:{cache_version(app_config=app_config)}:{digest(params)}'
+
+
+def job_timeout(app_config: AppConfig) -> int:
+    """
+    Get the number of seconds after which a job without progress is considered lost and can be submitted again.
+    :param app_config: The app_config.
+    :return: The timeout in seconds.
+    """
+    return app_config.config.DASHBOARD.get('JOB_TIMEOUT', 300)
+
+
+def decode_state(state: dict) -> dict:
+    """
+    Decode the Redis hash of a job.
+    :param state: The raw hash.
+    :return: The status, progress, message and result of the job.
+    """
+    state = {key.decode('utf-8'): value.decode('utf-8') for key, value in state.items()}
+    return dict(status=state.get('status', QUEUED),
+                progress=float(state.get('progress', 0)),
+                message=state.get('message', ''),
+                result=json.loads(state['result']) if 'result' in state else None)
+
+
+def run_job(app_config: AppConfig, name: str, params: dict, progress: callable = None):
+    """
+    Run a job in the current thread.
+    :param app_config: The app_config.
+    :param name: The job name.
+    :param params: The job parameters.
+    :param progress: Callback receiving the progress as a fraction and a message.
+    :return: The result of the job.
+    """
+    return _jobs[name](app_config=app_config, progress=progress or (lambda fraction, message: None), **params)
+
+
+def submit(app_config: AppConfig, name: str, params: dict) -> dict:
+    """
+    Submit a job, unless an identical job is already queued, running or done.
+    :param app_config: The app_config.
+    :param name: The job name.
+    :param params: The job parameters.
+    :return: The job state with its id. Jobs run right away when Redis is unavailable or no worker is alive.
+    """
+    current_id = job_id(app_config=app_config, name=name, params=params)
+    key = job_key(current_id)
+    try:
+        state = app_config.redis_client.hgetall(key)
+        if state:
+            return dict(id=current_id, **decode_state(state))
+
+        if not app_config.redis_client.exists(WORKER_HEARTBEAT):
+            # No worker to hand the job to
+            return dict(id=current_id, **run_inline(app_config=app_config, name=name, params=params, key=key))
+
+        # Only the first submitter enqueues the job
+        if app_config.redis_client.hsetnx(key, 'status', QUEUED):
+            pipe = app_config.redis_client.pipeline()
+            pipe.hset(key, mapping=dict(name=name, params=json.dumps(params), progress=0, message='Queued'))
+            pipe.expire(key, job_timeout(app_config=app_config))
+            pipe.lpush(JOB_QUEUE, current_id)
+            pipe.execute()
+        return dict(id=current_id, status=QUEUED, progress=0.0, message='Queued', result=None)
+    except redis.ConnectionError:
+        return dict(id=current_id, **run_inline(app_config=app_config, name=name, params=params))
+
+
+def status(app_config: AppConfig, current_id: str) -> dict:
+    """
+    Get the state of a job.
+    :param app_config: The app_config.
+    :param current_id: The job id.
+    :return: The job state, failed if the job is unknown or expired.
+    """
+    try:
+        state = app_config.redis_client.hgetall(job_key(current_id))
+    except redis.ConnectionError:
+        state = None
+    if not state:
+        return dict(id=current_id, status=FAILED, progress=0.0, message='The job was lost', result=None)
+    return dict(id=current_id, **decode_state(state))
+
+
+def store_result(app_config: AppConfig, key: str, result) -> None:
+    """
+    Store the result of a finished job, so identical jobs reuse it.
+    :param app_config: The app_config.
+    :param key: The Redis hash of the job.
+    :param result: The result.
+    """
+    pipe = app_config.redis_client.pipeline()
+    pipe.hset(key, mapping=dict(status=DONE,
+                                progress=1,
+                                message='Done',
+                                result=json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder)))
+    pipe.expire(key, app_config.cache_ttl)
+    pipe.execute()
+
+
+def run_inline(app_config: AppConfig, name: str, params: dict, key: str | None = None) -> dict:
+    """
+    Run a job in the calling thread.
+    :param app_config: The app_config.
+    :param name: The job name.
+    :param params: The job parameters.
+    :param key: The Redis hash to store the result in, None to skip storing it.
+    :return: The job state.
+    """
+    try:
+        result = run_job(app_config=app_config, name=name, params=params)
+    except Exception as e:
+        app_config.logger.exception(f"Job {name} failed: {e}")
+        return dict(status=FAILED, progress=0.0, message=str(e), result=None)
+
+    if key is not None:
+        try:
+            store_result(app_config=app_config, key=key, result=result)
+        except redis.ConnectionError:
+            pass
+    return dict(status=DONE, progress=1.0, message='Done', result=result)
+
+
+def process(app_config: AppConfig, current_id: str) -> None:
+    """
+    Process a job taken from the queue.
+    :param app_config: The app_config.
+    :param current_id: The job id.
+    """
+    key = job_key(current_id)
+    state = {k.decode('utf-8'): v.decode('utf-8') for k, v in app_config.redis_client.hgetall(key).items()}
+    if state.get('status') != QUEUED:
+        # Expired or already taken by another worker
+        return
+
+    timeout = job_timeout(app_config=app_config)
+
+    def progress(fraction: float, message: str) -> None:
+        pipe = app_config.redis_client.pipeline()
+        pipe.hset(key, mapping=dict(progress=fraction, message=message))
+        pipe.expire(key, timeout)
+        pipe.execute()
+
+    app_config.redis_client.hset(key, 'status', RUNNING)
+    progress(0, 'Running')
+    try:
+        result = run_job(app_config=app_config, name=state['name'], params=json.loads(state['params']),
+                         progress=progress)
+        store_result(app_config=app_config, key=key, result=result)
+    except Exception as e:
+        app_config.logger.exception(f"Job {current_id} failed: {e}")
+        pipe = app_config.redis_client.pipeline()
+        pipe.hset(key, mapping=dict(status=FAILED, message=str(e)))
+        pipe.expire(key, FAILED_TTL)
+        pipe.execute()
+
+
+def work(app_config: AppConfig, stop: threading.Event) -> None:
+    """
+    Take jobs from the queue until stopped.
+    :param app_config: The app_config.
+    :param stop: Event stopping the worker.
+    """
+    while not stop.is_set():
+        try:
+            app_config.redis_client.set(WORKER_HEARTBEAT, f'{socket.gethostname()}:{os.getpid()}', ex=HEARTBEAT_TTL)
+            item = app_config.redis_client.brpop([JOB_QUEUE], timeout=HEARTBEAT_TTL // 3)
+        except redis.ConnectionError as e:
+            app_config.logger.warning(f"Job worker lost the connection to Redis: {e}")
+            stop.wait(HEARTBEAT_TTL // 3)
+            continue
+        if item is not None:
+            process(app_config=app_config, current_id=item[1].decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the background jobs of the dashboard.')
+    parser.add_argument('--threads', type=int, default=2, help='Number of jobs processed at the same time.')
+    args = parser.parse_args()
+
+    from src.util.dash_common.app_config import app_config
+    from src.util.dash_overview.bitmap import disable_bitmaps
+
+    # The jobs do not need the overview bitmaps, a crashed job worker must not leave their lock behind
+    disable_bitmaps()
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=work, args=(app_config, stop), name=f'job-{i}', daemon=True)
+               for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+
+
+if __name__ == '__main__':
+    main()
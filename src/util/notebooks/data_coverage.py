@@ -1,7 +1,16 @@
+from statistics import NormalDist
+from typing import Iterable
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from ..postgres import query
+
+# Column types whose values can equal a string default value
+STRING_TYPES = ('text', 'character varying', 'character', 'name')
+
 
 def column_coverage(series: pd.Series, default_value: object) -> float:
     """
@@ -25,28 +34,238 @@ def column_coverage(series: pd.Series, default_value: object) -> float:
     return coverage
 
 
-def table_health(df: pd.DataFrame, default_value: str) -> pd.DataFrame:
+def column_coverage_counts(series: pd.Series, default_value: object) -> dict:
+    """
+    Count the values of a column needed to calculate its coverage, so the counts of several batches of a table can be
+    added up.
+    :param series: Pandas Series
+    :param default_value: Default value to be considered as missing
+    :return: Number of rows, of non-default values and of True values, the latter None unless the column is boolean
+    """
+    if default_value is None:
+        non_default = int(series.notna().sum())
+    else:
+        non_default = int((series != default_value).sum())
+    is_boolean = series.dtype == 'boolean' or series.dtype == 'bool'
+    return dict(rows=series.shape[0],
+                non_default=non_default,
+                true=int(series.sum()) if is_boolean else None)
+
+
+def table_health(df: pd.DataFrame | Iterable[pd.DataFrame], default_value: str) -> pd.DataFrame:
     """
     Calculate the health metrics of a DataFrame.
-    :param df: Pandas DataFrame
+    :param df: Pandas DataFrame or an iterable of DataFrame batches of the same table, e.g. from query_iter, which are
+    consumed one at a time
     :param default_value: Default value to be considered as missing
     :return: Health metrics of the DataFrame
     """
+    batches = [df] if isinstance(df, pd.DataFrame) else df
+
+    # Counts per column added up over the batches
+    counts = dict()
+    for batch in batches:
+        if batch.shape[0] == 0:
+            continue
+        for column in batch.columns:
+            batch_counts = column_coverage_counts(series=batch[column], default_value=default_value)
+            column_counts = counts.setdefault(column, dict(rows=0, non_default=0, true=0))
+            column_counts['rows'] += batch_counts['rows']
+            column_counts['non_default'] += batch_counts['non_default']
+            # A column is only boolean if it is boolean in every batch, as it would be in the whole table
+            if column_counts['true'] is not None and batch_counts['true'] is not None:
+                column_counts['true'] += batch_counts['true']
+            else:
+                column_counts['true'] = None
+
     # list to store the health metrics of the DataFrame
     list_table__health = []
-    # Iterate over the columns of the DataFrame
-    for column in df.columns:
-        # Calculate the coverage of the column
-        coverage = column_coverage(series=df[column], default_value=default_value)
+    for column, column_counts in counts.items():
+        # Boolean columns are covered by their True values, other columns by their non-default values
+        covered = column_counts['non_default'] if column_counts['true'] is None else column_counts['true']
 
         # Append the health metrics to the DataFrame
         list_table__health.append(
             dict(column_name=column,
-                 coverage=coverage)
+                 coverage=covered / column_counts['rows'] * 100)
+        )
+
+    # Return the health metrics as a DataFrame sorted by coverage
+    return pd.DataFrame(list_table__health, columns=['column_name', 'coverage']).sort_values(by='coverage',
+                                                                                            ascending=False)
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quote a Postgres identifier.
+    :param name: Table or column name
+    :return: The quoted identifier
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_columns(conn, table_name: str) -> pd.DataFrame:
+    """
+    Get the columns of a table in the current schema.
+    :param conn: Postgres connection
+    :param table_name: Name of the table
+    :return: The column names and data types in table order
+    """
+    query_str = f"""
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = '{table_name.replace("'", "''")}'
+        ORDER BY ordinal_position
+    """
+    return query(conn=conn, query_str=query_str, bulk=False)
+
+
+def coverage_sql(table_name: str,
+                 columns: pd.DataFrame,
+                 default_value: str | None,
+                 sample_percent: float | None = None,
+                 seed: int | None = None) -> str:
+    """
+    Generate the statement counting, in a single scan of a table, the values every column needs for its coverage.
+    :param table_name: Name of the table
+    :param columns: The column names and data types, see table_columns
+    :param default_value: Default value to be considered as missing
+    :param sample_percent: Percentage of the table pages to sample with TABLESAMPLE SYSTEM, None to scan every row
+    :param seed: Seed of the sample, None for a different sample every time
+    :return: The statement, grouped by table page when sampling
+    """
+    counts = ['COUNT(*) AS n_rows']
+    for i, (column_name, data_type) in enumerate(zip(columns['column_name'], columns['data_type'])):
+        column = quote_identifier(column_name)
+        counts.append(f'COUNT({column}) AS c{i}_non_null')
+        if data_type == 'boolean':
+            counts.append(f'COUNT(*) FILTER (WHERE {column}) AS c{i}_true')
+        if default_value is not None and data_type in STRING_TYPES:
+            counts.append(f"COUNT(*) FILTER (WHERE {column} = '{default_value.replace(chr(39), chr(39) * 2)}') "
+                          f"AS c{i}_default")
+
+    if sample_percent is None:
+        return f"SELECT {', '.join(counts)} FROM {quote_identifier(table_name)}"
+
+    # Pages are sampled as a whole, so the counts per page are needed for the confidence intervals
+    repeatable = f' REPEATABLE ({int(seed)})' if seed is not None else ''
+    return f"""
+        SELECT (ctid::text::point)[0] AS page, {', '.join(counts)}
+        FROM {quote_identifier(table_name)} TABLESAMPLE SYSTEM ({float(sample_percent)}){repeatable}
+        GROUP BY 1
+    """
+
+
+def covered_counts(counts: pd.DataFrame, i: int, data_type: str, default_value: str | None) -> pd.Series:
+    """
+    Get the covered values of a column with the same rules as table_health: boolean columns without missing values
+    are covered by their True values, other columns by their values that are not missing or, given a default value,
+    not equal to it.
+    :param counts: The counts of coverage_sql, one row per table page when sampling
+    :param i: Position of the column
+    :param data_type: Data type of the column
+    :param default_value: Default value to be considered as missing
+    :return: Number of covered values per row of the counts
+    """
+    if data_type == 'boolean' and counts[f'c{i}_non_null'].sum() == counts['n_rows'].sum():
+        return counts[f'c{i}_true']
+    if default_value is None:
+        return counts[f'c{i}_non_null']
+    if data_type in STRING_TYPES:
+        return counts['n_rows'] - counts[f'c{i}_default']
+    return counts['n_rows']
+
+
+def ratio_interval(covered: np.ndarray, n_rows: np.ndarray, confidence: float) -> tuple:
+    """
+    Get the confidence interval of a coverage estimated from sampled table pages. Rows of one page tend to be alike,
+    so the variance is estimated from the pages, as in cluster sampling, instead of from the rows.
+    :param covered: Number of covered values per sampled page
+    :param n_rows: Number of rows per sampled page
+    :param confidence: Confidence level, e.g. 0.95
+    :return: The lower and the upper bound of the coverage as fractions
+    """
+    total = n_rows.sum()
+    ratio = covered.sum() / total
+    n_pages = len(n_rows)
+    if n_pages < 2:
+        return 0.0, 1.0
+    variance = n_pages / (n_pages - 1) * np.sum((covered - ratio * n_rows) ** 2) / total ** 2
+    margin = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(variance)
+    return max(0.0, ratio - margin), min(1.0, ratio + margin)
+
+
+def table_health_sql(conn,
+                     table_name: str,
+                     default_value: str | None,
+                     sample_percent: float | None = None,
+                     confidence: float = 0.95,
+                     seed: int | None = None) -> pd.DataFrame:
+    """
+    Calculate the health metrics of a table in Postgres, without fetching its rows.
+    :param conn: Postgres connection
+    :param table_name: Name of the table
+    :param default_value: Default value to be considered as missing
+    :param sample_percent: Percentage of the table pages to sample, None to scan the whole table
+    :param confidence: Confidence level of the coverage intervals when sampling
+    :param seed: Seed of the sample, None for a different sample every time
+    :return: Health metrics of the table, with the same coverage as table_health, the percentage of non-null values
+    and the confidence interval of the coverage, which is exact without sampling
+    """
+    columns = table_columns(conn=conn, table_name=table_name)
+    counts = query(conn=conn, query_str=coverage_sql(table_name=table_name,
+                                                     columns=columns,
+                                                     default_value=default_value,
+                                                     sample_percent=sample_percent,
+                                                     seed=seed))
+    n_rows = counts['n_rows'].to_numpy(dtype=float)
+    total = n_rows.sum()
+
+    list_table__health = []
+    for i, (column_name, data_type) in enumerate(zip(columns['column_name'], columns['data_type'])):
+        covered = covered_counts(counts=counts, i=i, data_type=data_type, default_value=default_value) \
+            .to_numpy(dtype=float)
+        coverage = covered.sum() / total if total else np.nan
+        low, high = (coverage, coverage) if sample_percent is None or not total \
+            else ratio_interval(covered=covered, n_rows=n_rows, confidence=confidence)
+        list_table__health.append(
+            dict(column_name=column_name,
+                 coverage=coverage * 100,
+                 non_null=counts[f'c{i}_non_null'].sum() / total * 100 if total else np.nan,
+                 coverage_low=low * 100,
+                 coverage_high=high * 100)
         )
 
     # Return the health metrics as a DataFrame sorted by coverage
-    return pd.DataFrame(list_table__health).sort_values(by='coverage', ascending=False)
+    return pd.DataFrame(list_table__health,
+                        columns=['column_name', 'coverage', 'non_null', 'coverage_low', 'coverage_high']) \
+        .sort_values(by='coverage', ascending=False)
+
+
+def warehouse_health(conn,
+                     table_names: list,
+                     default_value: str | None,
+                     sample_percent: float | None = None,
+                     confidence: float = 0.95,
+                     seed: int | None = None) -> pd.DataFrame:
+    """
+    Calculate the health metrics of several tables in Postgres, one statement per table.
+    :param conn: Postgres connection
+    :param table_names: Names of the tables
+    :param default_value: Default value to be considered as missing
+    :param sample_percent: Percentage of the table pages to sample, None to scan the whole tables
+    :param confidence: Confidence level of the coverage intervals when sampling
+    :param seed: Seed of the sample, None for a different sample every time
+    :return: Health metrics of every table
+    """
+    return pd.concat([table_health_sql(conn=conn,
+                                       table_name=table_name,
+                                       default_value=default_value,
+                                       sample_percent=sample_percent,
+                                       confidence=confidence,
+                                       seed=seed).assign(table_name=table_name)
+                      for table_name in table_names], ignore_index=True)
 
 
 # Define the color mapping based on coverage
@@ -64,10 +283,13 @@ def get_color_label(coverage):
         return 'bad'
 
 
-def plot_health_metrics(df_source: pd.DataFrame, table_name: str, default_value: str, palette: dict):
+def plot_health_metrics(df_source: pd.DataFrame | Iterable[pd.DataFrame],
+                        table_name: str,
+                        default_value: str,
+                        palette: dict):
     """
     Plot the health metrics of a DataFrame.
-    :param df_source: Pandas DataFrame to be analyzed
+    :param df_source: Pandas DataFrame to be analyzed or an iterable of its batches, e.g. from query_iter
     :param table_name: Name of the table
     :param default_value: Default value to be considered as missing
     :param palette: Color palette
@@ -75,12 +297,22 @@ def plot_health_metrics(df_source: pd.DataFrame, table_name: str, default_value:
     # Calculate the health metrics of the table
     df_health = table_health(df=df_source,
                              default_value=default_value)
+    plot_table_health(df_health=df_health, table_name=table_name, palette=palette)
 
+
+def plot_table_health(df_health: pd.DataFrame, table_name: str, palette: dict):
+    """
+    Plot the health metrics of a table, e.g. from table_health or table_health_sql.
+    :param df_health: Health metrics of the table
+    :param table_name: Name of the table
+    :param palette: Color palette
+    """
     # Visualize the health metrics using a bar chart with the coverage on the y-axis.
     # We use 'good' color for coverage above 90%, 'warning' color for coverage between 70% and 90%
     # and 'bad' color for coverage below 70%.
 
     # Apply the function to create a new column for color labels
+    df_health = df_health.copy()
     df_health['color_label'] = df_health['coverage'].apply(get_color_label)
 
     # Create the bar plot with data labels with hue based on the color labels
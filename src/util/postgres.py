@@ -1,8 +1,19 @@
+import io
+import re
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Iterator
+
 import polars as pl
 import pandas as pd
 import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import sqlalchemy
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import create_engine, Engine, text
 
 
 def create_connection(username: str,
@@ -64,53 +75,341 @@ def create_sqlalchemy_engine(username: str,
                              host: str,
                              port: str,
                              database: str,
-                             schema: str) -> Engine:
+                             schema: str,
+                             pool_size: int = 5,
+                             max_overflow: int = 10,
+                             pool_timeout: float = 30,
+                             pool_recycle: int = 1800,
+                             pool_pre_ping: bool = True) -> Engine:
     """
-    Create a connection to Postgres using SQLAlchemy
+    Create a pooled engine for Postgres using SQLAlchemy. Connections are checked out of the pool per query, so the
+    engine can be shared between threads.
     :param username: Postgres username
     :param password: Postgres password
     :param host: Postgres host
     :param port: Postgres port
     :param database: Postgres database
     :param schema: Postgres schema
-    :return: SQLAlchemy connection
+    :param pool_size: Number of connections kept open in the pool
+    :param max_overflow: Number of connections opened on top of the pool size under load
+    :param pool_timeout: Seconds to wait for a connection before giving up
+    :param pool_recycle: Seconds after which a connection is replaced
+    :param pool_pre_ping: Whether to test connections on checkout and replace dropped ones
+    :return: SQLAlchemy engine
     """
     # Define the connection string
     conn_string = f'postgresql://{username}:{password}@{host}:{port}/{database}'
     # Create the connection
     engine = create_engine(
         conn_string,
-        connect_args={'options': '-csearch_path={}'.format(schema)})
+        connect_args={'options': '-csearch_path={}'.format(schema)},
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping)
     # Return the connection
     return engine
 
 
-def query(conn: psycopg2.extensions.connection | sqlalchemy.engine.base.Connection, query_str: str) -> pd.DataFrame:
+class PoolMetrics:
     """
-    Query Postgres.
+    Checkout statistics of a connection pool.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_checkout(self, wait: float) -> None:
+        """
+        Record a connection checkout.
+        :param wait: Seconds spent waiting for the connection.
+        """
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        """
+        Get the current pool metrics.
+        :return: The pool metrics.
+        """
+        pool = self.engine.pool
+        with self.lock:
+            return dict(
+                pool_size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=pool.overflow(),
+                checkouts=self.checkouts,
+                avg_wait_ms=self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0,
+                max_wait_ms=self.max_wait * 1000
+            )
+
+
+_pool_metrics: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_pool_metrics_lock = threading.Lock()
+
+
+def pool_metrics(engine: Engine) -> PoolMetrics:
+    """
+    Get the pool metrics of an engine.
+    :param engine: SQLAlchemy engine
+    :return: The pool metrics
+    """
+    with _pool_metrics_lock:
+        if engine not in _pool_metrics:
+            _pool_metrics[engine] = PoolMetrics(engine=engine)
+        return _pool_metrics[engine]
+
+
+@contextmanager
+def pooled_connection(engine: Engine):
+    """
+    Check out a connection from the pool for the duration of the block.
+    :param engine: SQLAlchemy engine
+    :return: SQLAlchemy connection
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        pool_metrics(engine).record_checkout(wait=time.perf_counter() - start)
+        yield conn
+
+
+# Estimated number of rows above which query results are fetched with COPY instead of row by row
+BULK_FETCH_MIN_ROWS = 50000
+QUERY_STATEMENT = re.compile(r'(SELECT|WITH)\b', re.IGNORECASE)
+
+# Arrow types of the Postgres type OIDs the bulk fetch can parse from CSV, with the same pandas dtypes as read_sql
+BULK_FETCH_TYPES = {
+    16: pa.bool_(),  # bool
+    20: pa.int64(),  # int8
+    21: pa.int64(),  # int2
+    23: pa.int64(),  # int4
+    26: pa.int64(),  # oid
+    700: pa.float64(),  # float4
+    701: pa.float64(),  # float8
+    1700: pa.float64(),  # numeric
+    18: pa.string(),  # char
+    19: pa.string(),  # name
+    25: pa.string(),  # text
+    1042: pa.string(),  # bpchar
+    1043: pa.string(),  # varchar
+    1082: pa.date32(),  # date
+    1114: pa.timestamp('us'),  # timestamp
+}
+
+
+def dbapi_connection(conn: psycopg2.extensions.connection | sqlalchemy.engine.base.Connection):
+    """
+    Get the psycopg2 connection behind a connection.
     :param conn: Postgres connection
+    :return: The psycopg2 connection or None if the connection does not use psycopg2
+    """
+    if isinstance(conn, psycopg2.extensions.connection):
+        return conn
+    if isinstance(conn, sqlalchemy.engine.base.Connection) and conn.dialect.driver == 'psycopg2':
+        return conn.connection.dbapi_connection
+    return None
+
+
+def estimated_rows(raw_conn: psycopg2.extensions.connection, query_str: str) -> float:
+    """
+    Get the number of rows the planner expects a query to return, without running it.
+    :param raw_conn: psycopg2 connection
+    :param query_str: SQL query
+    :return: The estimated number of rows
+    """
+    with raw_conn.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {query_str}')
+        return cursor.fetchone()[0][0]['Plan']['Plan Rows']
+
+
+def query_arrow(raw_conn: psycopg2.extensions.connection, query_str: str) -> pa.Table | None:
+    """
+    Fetch the result of a query in bulk: COPY writes it as CSV, which Arrow parses with the column types of the
+    query, in parallel and without creating a Python object per value.
+    :param raw_conn: psycopg2 connection
     :param query_str: SQL query
+    :return: Arrow table with the data or None if a column type or value cannot be parsed from CSV, e.g. arrays or
+    infinite timestamps
+    """
+    with raw_conn.cursor() as cursor:
+        # Only the column names and types, no rows
+        cursor.execute(f'SELECT * FROM ({query_str}) AS q LIMIT 0')
+        names = [column.name for column in cursor.description]
+        type_codes = [column.type_code for column in cursor.description]
+        if len(set(names)) != len(names) or any(type_code not in BULK_FETCH_TYPES for type_code in type_codes):
+            return None
+
+        buffer = io.BytesIO()
+        cursor.copy_expert(f'COPY ({query_str}) TO STDOUT WITH (FORMAT CSV)', buffer)
+
+    buffer.seek(0)
+    try:
+        return pa_csv.read_csv(
+            buffer,
+            read_options=pa_csv.ReadOptions(column_names=names),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            # COPY writes NULL as an empty field and empty strings as a quoted empty field
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: BULK_FETCH_TYPES[type_code] for name, type_code in zip(names, type_codes)},
+                null_values=[''],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+                true_values=['t'],
+                false_values=['f']))
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Values Arrow cannot parse, e.g. infinity or BC timestamps, are left to read_sql
+        return None
+
+
+def fetch_bulk(conn: psycopg2.extensions.connection | sqlalchemy.engine.base.Connection,
+               query_str: str,
+               bulk: bool | None) -> pa.Table | None:
+    """
+    Fetch the result of a query in bulk if it is large enough.
+    :param conn: Postgres connection
+    :param query_str: SQL query
+    :param bulk: True to always fetch in bulk, False to never, None to fetch in bulk when the planner expects at least
+    BULK_FETCH_MIN_ROWS rows
+    :return: Arrow table with the data or None if the query is fetched row by row
+    """
+    raw_conn = dbapi_connection(conn)
+    query_str = query_str.strip().rstrip(';')
+    # COPY and EXPLAIN only take queries
+    if bulk is False or raw_conn is None or not QUERY_STATEMENT.match(query_str):
+        return None
+    if bulk is None and estimated_rows(raw_conn=raw_conn, query_str=query_str) < BULK_FETCH_MIN_ROWS:
+        return None
+    return query_arrow(raw_conn=raw_conn, query_str=query_str)
+
+
+def query(conn: psycopg2.extensions.connection | sqlalchemy.engine.base.Connection | Engine,
+          query_str: str,
+          bulk: bool | None = None) -> pd.DataFrame:
+    """
+    Query Postgres.
+    :param conn: Postgres connection or a pooled engine to check out a connection from
+    :param query_str: SQL query
+    :param bulk: Fetch the data with COPY, True to always, False to never, None for large results only
     :return: Pandas DataFrame with the data
     """
+    if isinstance(conn, Engine):
+        with pooled_connection(engine=conn) as pooled_conn:
+            return query(conn=pooled_conn, query_str=query_str, bulk=bulk)
+
+    table = fetch_bulk(conn=conn, query_str=query_str, bulk=bulk)
+    if table is not None:
+        try:
+            return table.to_pandas(coerce_temporal_nanoseconds=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Timestamps out of the nanosecond range of pandas, read_sql keeps them as objects
+            pass
+
     # Fetch the data
     df = pd.read_sql(query_str, conn)
     # Return the DataFrame
     return df
 
 
-def query_polars(conn: sqlalchemy.engine.base.Connection, query_str: str) -> pl.DataFrame:
+def query_polars(conn: sqlalchemy.engine.base.Connection | Engine,
+                 query_str: str,
+                 bulk: bool | None = None) -> pl.DataFrame:
     """
     Query Postgres.
-    :param conn: Postgres connection
+    :param conn: Postgres connection or a pooled engine to check out a connection from
     :param query_str: SQL query
+    :param bulk: Fetch the data with COPY, True to always, False to never, None for large results only
     :return: Polars DataFrame with the data
     """
+    if isinstance(conn, Engine):
+        with pooled_connection(engine=conn) as pooled_conn:
+            return query_polars(conn=pooled_conn, query_str=query_str, bulk=bulk)
+
+    table = fetch_bulk(conn=conn, query_str=query_str, bulk=bulk)
+    if table is not None:
+        return pl.from_arrow(table)
+
     # Fetch the data
     df = pl.read_database(query_str, conn)
     # Return the DataFrame
     return df
 
 
+def query_iter(conn: psycopg2.extensions.connection | sqlalchemy.engine.base.Connection | Engine,
+               query_str: str,
+               batch_size: int = 50000,
+               arrow: bool = False) -> Iterator[pd.DataFrame | pa.RecordBatch]:
+    """
+    Query Postgres in batches through a server-side cursor, so only one batch of the result is held in memory.
+    :param conn: Postgres connection or a pooled engine to check out a connection from
+    :param query_str: SQL query
+    :param batch_size: Number of rows per batch
+    :param arrow: Yield Arrow record batches instead of Pandas DataFrames
+    :return: Iterator over the batches
+    """
+    if isinstance(conn, Engine):
+        with pooled_connection(engine=conn) as pooled_conn:
+            yield from query_iter(conn=pooled_conn, query_str=query_str, batch_size=batch_size, arrow=arrow)
+        return
+
+    if isinstance(conn, psycopg2.extensions.connection):
+        # Named cursors are server-side, autocommit connections need them to outlive the implicit transaction
+        cursor = conn.cursor(name=f'query_iter_{uuid.uuid4().hex}', withhold=conn.autocommit)
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(query_str)
+            yield from to_batches(fetch=lambda: cursor.fetchmany(batch_size), cursor=cursor, arrow=arrow)
+        finally:
+            cursor.close()
+        return
+
+    result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(text(query_str))
+    try:
+        yield from to_batches(fetch=lambda: result.fetchmany(batch_size), cursor=result.cursor, arrow=arrow)
+    finally:
+        result.close()
+
+
+def to_batches(fetch, cursor, arrow: bool) -> Iterator[pd.DataFrame | pa.RecordBatch]:
+    """
+    Turn fetched rows into batches.
+    :param fetch: Function returning the next rows, an empty list once all rows are fetched
+    :param cursor: The DB-API cursor of the query, for the column names and types
+    :param arrow: Yield Arrow record batches instead of Pandas DataFrames
+    :return: Iterator over the batches, with numeric values converted to floats like read_sql does
+    """
+    schema = None
+    for rows in iter(fetch, []):
+        # Server-side cursors only describe the columns once the first rows are fetched
+        df = pd.DataFrame.from_records(rows, columns=[column[0] for column in cursor.description], coerce_float=True)
+        if not arrow:
+            yield df
+            continue
+        if schema is None:
+            schema = arrow_schema(description=cursor.description, df=df)
+        yield pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def arrow_schema(description: list, df: pd.DataFrame) -> pa.Schema:
+    """
+    Get the Arrow schema shared by all batches of a query, so they can be combined into one table even if a column
+    has only nulls or integers in one of the batches.
+    :param description: The cursor description of the query
+    :param df: The first batch, for the types of the columns the bulk fetch cannot parse
+    :return: The schema, with the types of the bulk fetch where the column type is one of them
+    """
+    inferred = pa.Schema.from_pandas(df, preserve_index=False)
+    return pa.schema([pa.field(field.name, BULK_FETCH_TYPES.get(column[1], field.type))
+                      for column, field in zip(description, inferred)])
+
+
 def use_schema(conn: psycopg2.extensions.connection, schema: str) -> None:
     """
     Set the schema for the connection
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.util.cache.local import LocalCache
+
+RECOMMENDER_PREFIX = 'recommender_cache'
+
+
+class RecommenderUnavailable(Exception):
+    """
+    Raised when the recommendation engine cannot be reached, fails or the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing service for a while. After a number of consecutive failures the breaker opens and calls
+    fail fast, once the reset timeout passes a single trial call is let through to probe the service.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        :param failure_threshold: Number of consecutive failures opening the breaker.
+        :param reset_timeout: Seconds the breaker stays open before a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go through.
+        :return: True if the breaker is closed or a trial call is due.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        """
+        Close the breaker after a successful call.
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        """
+        Count a failed call, opening the breaker once the threshold is reached or the trial call failed.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def state(self) -> str:
+        """
+        Get the state of the breaker.
+        :return: 'closed', 'open' or 'half-open'.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if self.trial_running else 'open'
+
+
+class RecommenderClient:
+    """
+    Client of the recommendation engine, with a pooled HTTP session, strict timeouts, retries with backoff, a circuit
+    breaker and a short-lived cache of the recommendations per author, kept in-process and in Redis so every worker and
+    the warmup share it.
+    """
+
+    def __init__(self,
+                 url: str,
+                 redis_client: redis.Redis | None = None,
+                 connect_timeout: float = 1.0,
+                 read_timeout: float = 5.0,
+                 retries: int = 2,
+                 pool_size: int = 10,
+                 cache_ttl: float = 300,
+                 breaker: CircuitBreaker | None = None):
+        """
+        :param url: The predict endpoint of the recommendation engine.
+        :param redis_client: The Redis client, None to only cache in-process.
+        :param connect_timeout: Seconds to wait for the connection.
+        :param read_timeout: Seconds to wait for the response.
+        :param retries: Number of retries of failed calls.
+        :param pool_size: Number of kept alive connections.
+        :param cache_ttl: Seconds the recommendations of an author are reused.
+        :param breaker: The circuit breaker, defaults to one with the default thresholds.
+        """
+        self.url = url
+        self.redis_client = redis_client
+        self.cache_ttl = cache_ttl
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = LocalCache(max_bytes=16 * 1024 * 1024, ttl=cache_ttl)
+
+        # Predictions are read-only, so retrying a POST is safe
+        retry = Retry(total=retries,
+                      backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({'POST'}),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    def predict(self, author_id: str) -> list:
+        """
+        Get the recommended new collaborators of an author.
+        :param author_id: The author id.
+        :return: The ids of the recommended authors.
+        """
+        recommendations = self.cached(author_id=author_id)
+        if recommendations is not None:
+            return recommendations
+
+        if not self.breaker.allow():
+            raise RecommenderUnavailable('Recommendation engine is failing, skipping the call')
+
+        try:
+            response = self.session.post(url=self.url, json={'author_id': author_id}, timeout=self.timeout)
+            response.raise_for_status()
+            recommendations = [str(recommended_id) for recommended_id in response.json()]
+        except (requests.RequestException, ValueError, TypeError) as e:
+            self.breaker.record_failure()
+            raise RecommenderUnavailable(f'Recommendation engine request failed: {e}') from e
+
+        self.breaker.record_success()
+        self.store(author_id=author_id, recommendations=recommendations)
+        return recommendations
+
+    def cached(self, author_id: str) -> list | None:
+        """
+        Get the cached recommendations of an author.
+        :param author_id: The author id.
+        :return: The ids of the recommended authors or None if they are not cached.
+        """
+        recommendations = self.cache.get(author_id)
+        if recommendations is not None:
+            return list(recommendations)
+        if self.redis_client is None:
+            return None
+
+        try:
+            payload = self.redis_client.get(f'{RECOMMENDER_PREFIX}:{author_id}')
+        except redis.ConnectionError:
+            return None
+        if payload is None:
+            return None
+        recommendations = json.loads(payload)
+        self.cache.put(author_id, tuple(recommendations), size=64 * (len(recommendations) + 1))
+        return recommendations
+
+    def store(self, author_id: str, recommendations: list) -> None:
+        """
+        Cache the recommendations of an author.
+        :param author_id: The author id.
+        :param recommendations: The ids of the recommended authors.
+        """
+        self.cache.put(author_id, tuple(recommendations), size=64 * (len(recommendations) + 1))
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.set(f'{RECOMMENDER_PREFIX}:{author_id}', json.dumps(recommendations),
+                                  ex=int(self.cache_ttl))
+        except redis.ConnectionError:
+            pass
+
+    def predict_many(self, author_ids: list, concurrency: int = 4) -> dict:
+        """
+        Get the recommendations of many authors, e.g. to warm the cache. Authors whose request failed are left out.
+        :param author_ids: The author ids.
+        :param concurrency: Maximum number of requests running at the same time.
+        :return: The ids of the recommended authors per author id.
+        """
+        def predict_or_none(author_id: str):
+            try:
+                return self.predict(author_id=author_id)
+            except RecommenderUnavailable:
+                return None
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='recommender') as executor:
+            results = executor.map(predict_or_none, author_ids)
+            return {author_id: result for author_id, result in zip(author_ids, results) if result is not None}
+
+    def close(self) -> None:
+        """
+        Close the pooled connections.
+        """
+        self.session.close()
@@ -1,49 +1,357 @@
-import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import redis
+import redis.lock
 
+from src.util.cache.codec import decode, encode
+from src.util.cache.key import INVALIDATION_CHANNEL, query_cache_key, template_cache_key, template_pattern
+from src.util.cache.local import frame_size
 from src.util.dash_common.app_config import AppConfig
 from src.util.postgres import query
 
+# Background threads rebuilding hot keys before they expire
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+_refreshing: set = set()
+_refreshing_lock = threading.Lock()
+
+_listener_started = False
+_listener_lock = threading.Lock()
+
+# Hit and miss counters of the Redis tier, the in-process tier keeps its own
+_redis_stats = dict(hits=0, misses=0)
+_redis_stats_lock = threading.Lock()
+
+
+def count_redis(hit: bool) -> None:
+    """
+    Count a Redis cache lookup.
+    :param hit: Whether the lookup was a hit.
+    """
+    with _redis_stats_lock:
+        _redis_stats['hits' if hit else 'misses'] += 1
+
+
+def cache_stats(app_config: AppConfig) -> dict:
+    """
+    Get the hit and miss counters of both cache tiers in this worker.
+    :param app_config: The app_config.
+    :return: The statistics per tier.
+    """
+    with _redis_stats_lock:
+        redis_stats = dict(_redis_stats)
+    return dict(local=app_config.local_cache.stats(), redis=redis_stats)
+
+
+def cache_locally(app_config: AppConfig,
+                  cache_key: str,
+                  results: pd.DataFrame,
+                  ttl: float | None = None) -> pd.DataFrame:
+    """
+    Keep a decoded result in the in-process cache.
+    :param app_config: The app_config.
+    :param cache_key: The cache key.
+    :param results: The data.
+    :param ttl: Remaining time to live of the entry in Redis, the local entry never outlives it.
+    :return: A copy of the data that the caller is free to modify.
+    """
+    local_ttl = app_config.local_cache.ttl
+    if ttl is not None and not math.isinf(ttl):
+        local_ttl = ttl if local_ttl is None else min(local_ttl, ttl)
+    app_config.local_cache.put(cache_key, results, size=frame_size(results), ttl=local_ttl)
+    return results.copy()
+
+
+def listen_for_invalidations(app_config: AppConfig) -> None:
+    """
+    Drop entries from the in-process cache whenever any worker publishes an invalidation. Runs forever and reconnects
+    when Redis goes away.
+    :param app_config: The app_config.
+    """
+    while True:
+        try:
+            pubsub = app_config.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Entries might have been invalidated while we were not listening
+            app_config.local_cache.invalidate()
+            for message in pubsub.listen():
+                key = message['data'].decode('utf-8')
+                if key == '*':
+                    # Everything is dropped when the data version is bumped
+                    app_config.data_version.reset()
+                app_config.local_cache.invalidate(key=None if key == '*' else key)
+        except redis.ConnectionError as e:
+            if app_config.verbose:
+                app_config.logger.debug(f"Redis connection error in invalidation listener: {e}")
+            time.sleep(5)
+
+
+def start_invalidation_listener(app_config: AppConfig) -> None:
+    """
+    Start the invalidation listener of this worker, once.
+    :param app_config: The app_config.
+    """
+    global _listener_started
+    with _listener_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+    threading.Thread(target=listen_for_invalidations,
+                     kwargs=dict(app_config=app_config),
+                     name='cache-invalidation',
+                     daemon=True).start()
+
+
+def cache_version(app_config: AppConfig) -> str:
+    """
+    Get the version stamped on the cache keys, made of the cache schema version and the data version. Entries stay
+    valid for as long as the version is unchanged and become unreachable as soon as a new warehouse load bumps it.
+    :param app_config: The app_config.
+    :return: The cache version.
+    """
+    return f"{app_config.cache_version}.{app_config.data_version.get()}"
+
+
+def invalidate(app_config: AppConfig,
+               cache_key: str | None = None) -> None:
+    """
+    Invalidate a cached result in Redis and in the in-process cache of every worker.
+    :param app_config: The app_config.
+    :param cache_key: The cache key, None drops every in-process entry and keeps Redis untouched.
+    """
+    app_config.local_cache.invalidate(key=cache_key)
+    if cache_key is not None:
+        app_config.redis_client.delete(cache_key, f"{cache_key}:delta")
+    app_config.redis_client.publish(INVALIDATION_CHANNEL, '*' if cache_key is None else cache_key)
+
+
+def fetch_cached(app_config: AppConfig,
+                 cache_key: str) -> tuple[bytes | None, float, float]:
+    """
+    Fetch a cached result together with its remaining time to live and the time it took to compute.
+    :param app_config: The app_config.
+    :param cache_key: The cache key.
+    :return: The cached payload (or None), the remaining TTL in seconds and the compute time in seconds.
+    """
+    pipeline = app_config.redis_client.pipeline(transaction=False)
+    pipeline.get(cache_key)
+    pipeline.pttl(cache_key)
+    pipeline.get(f"{cache_key}:delta")
+    payload, ttl_ms, delta = pipeline.execute()
+    return payload, ttl_ms / 1000 if ttl_ms and ttl_ms > 0 else math.inf, float(delta) if delta else 0.0
+
+
+def compute_and_store(app_config: AppConfig,
+                      cache_key: str,
+                      query_str: str) -> pd.DataFrame:
+    """
+    Query Postgres and cache the result together with the time it took to compute.
+    :param app_config: The app_config.
+    :param cache_key: The cache key.
+    :param query_str: The query.
+    :return: The data.
+    """
+    start = time.perf_counter()
+    # Dashboard queries are small aggregates, so skip the planner estimate of the bulk fetch
+    results = query(
+        conn=app_config.pg_engine,
+        query_str=query_str,
+        bulk=False
+    )
+    delta = time.perf_counter() - start
+
+    # Cache the result for future use
+    pipeline = app_config.redis_client.pipeline(transaction=False)
+    pipeline.set(cache_key, encode(app_config.cache_codec, results), ex=app_config.cache_ttl)
+    pipeline.set(f"{cache_key}:delta", delta, ex=app_config.cache_ttl)
+    pipeline.execute()
+    return results
+
+
+def should_refresh_early(ttl: float, delta: float, beta: float) -> bool:
+    """
+    Decide whether to recompute a cached result before it expires (XFetch). The probability grows as the entry gets
+    closer to its expiry and with the time it takes to recompute, so hot keys are rebuilt by a single request ahead of
+    time instead of by every request at once after they expire.
+    :param ttl: Remaining time to live in seconds.
+    :param delta: Time it took to compute the result in seconds.
+    :param beta: Eagerness of the early refresh, 1.0 is the recommended default.
+    :return: Whether to refresh the result now.
+    """
+    if delta <= 0 or math.isinf(ttl):
+        return False
+    return -delta * beta * math.log(1.0 - random.random()) >= ttl
+
+
+def release(lock: redis.lock.Lock) -> None:
+    """
+    Release a Redis lock, ignoring locks whose lease already expired.
+    :param lock: The Redis lock.
+    """
+    try:
+        lock.release()
+    except redis.exceptions.LockError:
+        pass
+
+
+def refresh(app_config: AppConfig,
+            cache_key: str,
+            query_str: str) -> None:
+    """
+    Recompute a cached result if no other worker is already doing it.
+    :param app_config: The app_config.
+    :param cache_key: The cache key.
+    :param query_str: The query.
+    """
+    try:
+        lock = app_config.redis_client.lock(f"{cache_key}:lock", timeout=app_config.cache_lock_lease)
+        if lock.acquire(blocking=False):
+            try:
+                compute_and_store(app_config=app_config, cache_key=cache_key, query_str=query_str)
+                # Let every worker drop its local copy of the old result
+                app_config.redis_client.publish(INVALIDATION_CHANNEL, cache_key)
+            finally:
+                release(lock)
+    except Exception as e:
+        app_config.logger.warning(f"Background refresh failed for {cache_key}: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(cache_key)
+
+
+def refresh_in_background(app_config: AppConfig,
+                          cache_key: str,
+                          query_str: str) -> None:
+    """
+    Schedule a background refresh of a cached result, unless one is already scheduled in this process.
+    :param app_config: The app_config.
+    :param cache_key: The cache key.
+    :param query_str: The query.
+    """
+    with _refreshing_lock:
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+    _refresh_executor.submit(refresh, app_config=app_config, cache_key=cache_key, query_str=query_str)
+
+
+def invalidate_template(app_config: AppConfig,
+                        template_id: str) -> int:
+    """
+    Invalidate every cached result of a query template, in Redis and in the in-process cache of every worker.
+    :param app_config: The app_config.
+    :param template_id: The id of the query template.
+    :return: The number of deleted Redis keys.
+    """
+    deleted = 0
+    keys = list()
+    for key in app_config.redis_client.scan_iter(match=template_pattern(template_id=template_id), count=1000):
+        keys.append(key)
+        if len(keys) == 1000:
+            deleted += app_config.redis_client.delete(*keys)
+            keys = list()
+    if keys:
+        deleted += app_config.redis_client.delete(*keys)
+    invalidate(app_config=app_config)
+    return deleted
+
+
+def single_flight(app_config: AppConfig,
+                  cache_key: str,
+                  query_str: str) -> pd.DataFrame:
+    """
+    Compute a missing result once across threads and gunicorn workers. Threads of the same worker wait on an
+    in-process lock, workers coordinate through a Redis lock with a short lease. Waiters block until the result
+    shows up in the cache and only compute it themselves if the lease expires without it.
+    :param app_config: The app_config.
+    :param cache_key: The cache key.
+    :param query_str: The query.
+    :return: The data.
+    """
+    with app_config.query_locks.acquire(cache_key):
+        # Another thread might have cached the result while we were waiting for the lock
+        cached_result = app_config.redis_client.get(cache_key)
+        if cached_result:
+            return decode(cached_result)
+
+        lock = app_config.redis_client.lock(f"{cache_key}:lock", timeout=app_config.cache_lock_lease)
+        if lock.acquire(blocking=False):
+            try:
+                return compute_and_store(app_config=app_config, cache_key=cache_key, query_str=query_str)
+            finally:
+                release(lock)
+
+        # Another worker is computing the result, wait for it
+        deadline = time.monotonic() + app_config.cache_lock_lease
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            cached_result = app_config.redis_client.get(cache_key)
+            if cached_result:
+                return decode(cached_result)
+            if not lock.locked():
+                break
+
+        # The other worker failed or its lease expired
+        return compute_and_store(app_config=app_config, cache_key=cache_key, query_str=query_str)
+
 
 def redis_query(app_config: AppConfig,
-                query_str: str) -> pd.DataFrame:
+                query_str: str,
+                template_id: str | None = None,
+                params: dict | None = None) -> pd.DataFrame:
     """
-    Fetch the data from Postgres and cache the result.
+    Fetch the data from Postgres and cache the result, first in the in-process cache and then in Redis.
     :param app_config: The app_config.
     :param query_str: The query.
+    :param template_id: The id of the query template, used together with the parameters as the cache key. Without
+    it, the cache key is derived from the query itself.
+    :param params: The parameters the query was built from, e.g. the structured filter scope.
     :return: The data.
     """
+    if template_id is None:
+        cache_key: str = query_cache_key(query_str=query_str, version=cache_version(app_config=app_config))
+    else:
+        cache_key: str = template_cache_key(template_id=template_id,
+                                            params=params or dict(),
+                                            version=cache_version(app_config=app_config))
+    # Check if the query result is already in the in-process cache
+    results = app_config.local_cache.get(cache_key)
+    if results is not None:
+        return results.copy()
+
     # Check if the query result is already in the cache
-    cache_key: str = f"postgres_cache:{query_str}"
-    results: pd.DataFrame | None = None
     try:
-        cached_result: str = app_config.redis_client.get(cache_key)
+        start_invalidation_listener(app_config=app_config)
+        cached_result, ttl, delta = fetch_cached(app_config=app_config, cache_key=cache_key)
 
         if cached_result:
+            count_redis(hit=True)
             if app_config.verbose:
                 app_config.logger.debug(f"Cache hit for query: {query_str}")
+            # Rebuild hot keys in the background before they expire
+            if should_refresh_early(ttl=ttl, delta=delta, beta=app_config.cache_xfetch_beta):
+                refresh_in_background(app_config=app_config, cache_key=cache_key, query_str=query_str)
             # Return cached result if available
-            return pd.DataFrame(json.loads(cached_result))
+            return cache_locally(app_config=app_config,
+                                 cache_key=cache_key,
+                                 results=decode(cached_result),
+                                 ttl=ttl)
 
-        else:
-            if app_config.verbose:
-                app_config.logger.debug(f"Cache miss for query: {query_str}")
-            # Otherwise, query Postgres
-            results = query(
-                conn=app_config.pg_connection,
-                query_str=query_str
-            )
-
-            # Cache the result for future use
-            app_config.redis_client.set(cache_key, json.dumps(results.to_dict('records')), ex=3600)  # Cache for 1 hour
+        count_redis(hit=False)
+        if app_config.verbose:
+            app_config.logger.debug(f"Cache miss for query: {query_str}")
+        results = single_flight(app_config=app_config, cache_key=cache_key, query_str=query_str)
+        return cache_locally(app_config=app_config, cache_key=cache_key, results=results)
     except redis.ConnectionError as e:
         if app_config.verbose:
             app_config.logger.debug(f"Redis connection error: {e}")
-            # Otherwise, query Postgres
-            results = query(
-                conn=app_config.pg_connection,
-                query_str=query_str
-            )
-    return results
+        # Otherwise, query Postgres
+        return query(
+            conn=app_config.pg_engine,
+            query_str=query_str,
+            bulk=False
+        )